@@ -38,13 +38,18 @@ llm = ChatOllama(
 # --- Nodes ---
 
 def call_pricing_tool(state: AgentState):
+    if state.get('pricing_data'):
+        # Already priced by the caller (e.g. in the API's pricing worker pool)
+        pricing_data = state['pricing_data']
+        return {"metadata": {"pricing_latency": 0.0, "model_version": pricing_data.get('model_version')}}
+
     start_time = time.time()
     profile = state['profile']
     pricing_data = run_pricing_model(profile)
     latency = (time.time() - start_time) * 1000
     return {
         "pricing_data": pricing_data,
-        "metadata": {"pricing_latency": latency}
+        "metadata": {"pricing_latency": latency, "model_version": pricing_data.get('model_version')}
     }
 
 def call_guideline_tool(state: AgentState):
@@ -160,11 +165,11 @@ builder.add_edge("explainer", END)
 
 graph = builder.compile()
 
-def run_agent(profile: dict, query: str = "Please explain my insurance premium.", use_baseline: bool = False):
+def run_agent(profile: dict, query: str = "Please explain my insurance premium.", use_baseline: bool = False, pricing_data: dict = None):
     initial_state = {
         "messages": [],
         "profile": profile,
-        "pricing_data": {},
+        "pricing_data": pricing_data or {},
         "guidelines": "",
         "similar_quotes": "",
         "explanation": "",
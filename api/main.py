@@ -1,7 +1,16 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from agent.graph import run_agent
+from mcp_server.server import run_pricing_model_batch
+from pricing_model.predict import log_shap_results
+from pricing_model.worker_pool import get_pricing_pool
+from observability.telemetry import get_telemetry_sink
+from observability.latency_rollups import get_latency_rollups, STAGES
+from rag.embedding_cache import get_embedding_function
+from contextlib import asynccontextmanager
 import uvicorn
+import asyncio
 import sys
 import os
 import time
@@ -10,7 +19,39 @@ import uuid
 # Ensure parent directory is in path for imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-app = FastAPI(title="Insurance-Pricing-Copilot-RAG-MCP-AgenticAI API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Spawn and warm the pricing workers before taking traffic (no-op when PRICING_WORKERS=0)
+    pricing_pool = get_pricing_pool()
+    if pricing_pool is not None:
+        await asyncio.to_thread(pricing_pool.start)
+    # Start the telemetry writer thread (None when TELEMETRY_ENABLED=false)
+    telemetry = get_telemetry_sink()
+    yield
+    if pricing_pool is not None:
+        pricing_pool.shutdown()
+    if telemetry is not None:
+        # Flushes whatever is still buffered before the process exits
+        telemetry.close()
+
+app = FastAPI(title="Insurance-Pricing-Copilot-RAG-MCP-AgenticAI API", lifespan=lifespan)
+
+# Upper bound on profiles per /quote/batch request to keep payloads and SHAP memory bounded
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "50000"))
+
+def record_telemetry(request_id: str, endpoint: str, status: str, start_time: float, metadata: dict = None, input_data=None):
+    telemetry = get_telemetry_sink()
+    if telemetry is None:
+        return
+    metadata = metadata or {}
+    telemetry.record(
+        request_id, endpoint, status, (time.time() - start_time) * 1000,
+        pricing_ms=metadata.get('pricing_latency'),
+        guidelines_ms=metadata.get('guidelines_latency'),
+        similarity_ms=metadata.get('similarity_latency'),
+        llm_ms=metadata.get('llm_latency'),
+        input_data=input_data
+    )
 
 class QuoteProfile(BaseModel):
     age: int
@@ -19,6 +60,11 @@ class QuoteProfile(BaseModel):
     claims_count: int
     ncb_years: int
 
+class QuoteBatchRequest(BaseModel):
+    # Enforced during validation: FastAPI has already parsed the JSON body, but an oversized
+    # batch is rejected (422, "too_long") before any of its profiles are validated
+    profiles: List[QuoteProfile] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
 @app.get("/")
 def read_root():
     return {"status": "online", "message": "Insurance Pricing Copilot API is ready."}
@@ -28,20 +74,109 @@ async def explain_premium(profile: QuoteProfile):
     request_id = str(uuid.uuid4())
     start_time = time.time()
     profile_dict = profile.model_dump()
+    status, metadata = "error", {}
     
     try:
-        # Run agent
-        result = run_agent(profile_dict)
+        pricing_data = None
+        pricing_pool = get_pricing_pool()
+        if pricing_pool is not None:
+            # Price in a worker process; the agent then skips its own pricing step
+            pricing_start = time.time()
+            pricing_data = await pricing_pool.price_one(profile_dict)
+            pricing_latency = (time.time() - pricing_start) * 1000
+            log_shap_results([pricing_data])
+        
+        # Run agent off the event loop (LLM and retrieval calls block)
+        result = await asyncio.to_thread(run_agent, profile_dict, pricing_data=pricing_data)
+        metadata = result['metadata']
+        if pricing_data is not None:
+            metadata['pricing_latency'] = pricing_latency
         total_latency = (time.time() - start_time) * 1000
+        status = "success"
         
         return {
             "explanation": result['explanation'],
             "request_id": request_id,
             "latency_ms": total_latency,
+            "model_version": result['metadata'].get('model_version'),
             "metrics": result['metadata']
         }
+    except asyncio.TimeoutError:
+        status = "timeout"
+        raise HTTPException(status_code=504, detail="Pricing timed out.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        record_telemetry(request_id, "/explain", status, start_time, metadata, profile_dict)
+
+@app.post("/quote/batch")
+async def quote_batch(batch: QuoteBatchRequest):
+    """Premium and SHAP values for 1 to MAX_BATCH_SIZE profiles; larger or empty batches get a 422."""
+    request_id = str(uuid.uuid4())
+    start_time = time.time()
+    profiles = [p.model_dump() for p in batch.profiles]
+    status = "error"
+    
+    try:
+        # Vectorized pricing is CPU-bound; keep the event loop free while it runs
+        results = await asyncio.to_thread(run_pricing_model_batch, profiles)
+        total_latency = (time.time() - start_time) * 1000
+        status = "success"
+        
+        return {
+            "quotes": [
+                {"predicted_premium": r['predicted_premium'], "shap_values": r['shap_values']}
+                for r in results
+            ],
+            "base_value": results[0]['base_value'],
+            "model_version": results[0]['model_version'],
+            "request_id": request_id,
+            "count": len(results),
+            "latency_ms": total_latency
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Pricing is the whole request here; the profiles themselves aren't stored
+        record_telemetry(request_id, "/quote/batch", status, start_time,
+                         {'pricing_latency': (time.time() - start_time) * 1000}, {"profiles": len(profiles)})
+
+@app.get("/admin/latency")
+def latency_percentiles(stage: str = "total", window_seconds: int = 3600, interval_seconds: int = 300,
+                        endpoint: Optional[str] = None, quantiles: str = "0.5,0.95,0.99"):
+    """Latency percentiles per interval and over the whole window, served from the rollup sketches."""
+    rollups = get_latency_rollups()
+    if rollups is None:
+        raise HTTPException(status_code=404, detail="Latency rollups are disabled (LATENCY_ROLLUPS=false).")
+    if stage not in STAGES:
+        raise HTTPException(status_code=400, detail=f"stage must be one of {list(STAGES)}.")
+    if window_seconds <= 0 or interval_seconds <= 0:
+        raise HTTPException(status_code=400, detail="window_seconds and interval_seconds must be positive.")
+    try:
+        qs = tuple(float(q) for q in quantiles.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="quantiles must be comma-separated numbers in [0, 1].")
+    if not all(0 <= q <= 1 for q in qs):
+        raise HTTPException(status_code=400, detail="quantiles must be comma-separated numbers in [0, 1].")
+
+    end = time.time()
+    start = end - window_seconds
+    telemetry = get_telemetry_sink()
+    return {
+        "stage": stage,
+        "endpoint": endpoint,
+        "window_seconds": window_seconds,
+        "interval_seconds": interval_seconds,
+        "resolution_seconds": rollups.resolution_for(interval_seconds),
+        "summary": rollups.summary(stage, start, end, endpoint, qs),
+        "series": rollups.series(stage, start, end, interval_seconds, endpoint, qs),
+        "telemetry": telemetry.stats() if telemetry is not None else None
+    }
+
+@app.get("/admin/embedding-cache")
+def embedding_cache_stats():
+    """Hit rate of the guideline embedding cache since this process started."""
+    return get_embedding_function().stats()
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,49 @@
+"""
+Benchmark: rows/sec of the vectorized batch pricing path against the per-row paths.
+
+Usage: python benchmarks/bench_batch_pricing.py --rows 5000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pricing_model.predict import predict_premium, predict_premium_batch
+from pipelines.optimized_pipeline import run_pricing_optimized, run_pricing_optimized_batch
+from benchmarks.common import random_profiles
+
+def rows_per_sec(func, profiles: list) -> float:
+    start = time.perf_counter()
+    func(profiles)
+    return len(profiles) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000, help="Profiles priced by the batch paths")
+    parser.add_argument('--per-row-rows', type=int, default=200, help="Profiles priced by the (slow) per-row paths")
+    args = parser.parse_args()
+
+    profiles = random_profiles(args.rows)
+    per_row_profiles = profiles[:args.per_row_rows]
+
+    # Warm caches so we measure steady-state serving cost
+    run_pricing_optimized(profiles[0])
+
+    results = {
+        "predict_premium (per row)": rows_per_sec(lambda ps: [predict_premium(p) for p in ps], per_row_profiles),
+        "run_pricing_optimized (per row, cached)": rows_per_sec(lambda ps: [run_pricing_optimized(p) for p in ps], per_row_profiles),
+        "predict_premium_batch": rows_per_sec(predict_premium_batch, profiles),
+        "run_pricing_optimized_batch (cached)": rows_per_sec(run_pricing_optimized_batch, profiles),
+    }
+
+    print("\n" + "="*60)
+    print("          BATCH PRICING THROUGHPUT")
+    print("="*60)
+    for name, rps in results.items():
+        print(f"{name:<42} {rps:>12,.0f} rows/s")
+    print("="*60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark: similar-quotes context for the explanation prompt, raw rows vs cohort summary.
+
+Builds a synthetic quotes table, then for random profiles compares what
+get_similar_quotes would paste into the prompt: the original SQL BETWEEN rows as
+df.to_markdown(), the KD-tree top-5 table, and the cohort summary. Reports prompt
+size (characters and approximate tokens) and per-call latency, the cost of the
+initial cohort build and of folding in appended quotes, and the summary quantiles'
+worst relative error against exact per-cohort percentiles.
+
+Tokens are estimated with a Llama-3-like split (words, digit runs of up to three,
+single punctuation marks), since no tokenizer model ships with the repo.
+
+Usage: python benchmarks/bench_cohort_stats.py --rows 1000000 --queries 2000
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from tabulate import tabulate
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server.quote_index import QuoteIndex, RATING_FACTORS
+from mcp_server.cohort_stats import CohortStats, cohort_bands, COHORT_FACTORS, COHORT_QUANTILES
+from benchmarks.common import random_profiles, synthetic_quotes_db
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+def approx_tokens(text: str) -> int:
+    return len(TOKEN_PATTERN.findall(text))
+
+def legacy_markdown(conn, profile: dict, limit: int = 5) -> str:
+    # The original tool: banded SQL filter, DataFrame, to_markdown()
+    age, vg = profile['age'], profile['vehicle_group']
+    df = pd.read_sql_query(f"""
+    SELECT * FROM quotes
+    WHERE age BETWEEN {age-2} AND {age+2}
+    AND vehicle_group BETWEEN {vg-3} AND {vg+3}
+    LIMIT {limit}
+    """, conn)
+    return df.to_markdown()
+
+def neighbours_table(index: QuoteIndex, profile: dict, limit: int = 5) -> str:
+    columns = RATING_FACTORS + ['premium', 'distance']
+    return tabulate([[n[c] for c in columns] for n in index.query(profile, k=limit)], headers=columns, tablefmt="pipe")
+
+def measure(func, profiles: list) -> tuple:
+    timings, chars, tokens = [], [], []
+    for profile in profiles:
+        start = time.perf_counter()
+        text = func(profile)
+        timings.append((time.perf_counter() - start) * 1e6)
+        chars.append(len(text))
+        tokens.append(approx_tokens(text))
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99)), float(np.mean(chars)), float(np.mean(tokens))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Quotes in the synthetic table")
+    parser.add_argument('--queries', type=int, default=2000, help="Profiles looked up per approach")
+    parser.add_argument('--append', type=int, default=20_000, help="Quotes appended before the incremental refresh")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "quotes.db")
+        synthetic_quotes_db(db_path, args.rows)
+        profiles = random_profiles(args.queries, seed=1)
+
+        stats = CohortStats(db_path, refresh_seconds=3600)
+        start = time.perf_counter()
+        stats.refresh()
+        build_s = time.perf_counter() - start
+        index = QuoteIndex(db_path, refresh_seconds=3600)
+        index.refresh()
+
+        conn = sqlite3.connect(db_path)
+        results = {
+            "SQL rows -> to_markdown (orig)": measure(lambda p: legacy_markdown(conn, p), profiles),
+            "KD-tree top-5 table": measure(lambda p: neighbours_table(index, p), profiles),
+            "cohort summary": measure(stats.summary, profiles)
+        }
+
+        # Exactness of the stored quantiles, per full cohort
+        columns = [f for f, _ in COHORT_FACTORS]
+        data = np.asarray(conn.execute(f"SELECT {', '.join(columns)}, premium FROM quotes").fetchall(), dtype=np.float64)
+        keys = cohort_bands(data[:, :-1])
+        worst = 0.0
+        for key, (count, _) in stats._summaries.items():
+            if len(key) < len(COHORT_FACTORS) or count < stats.min_quotes:
+                continue
+            premiums = data[(keys == key).all(axis=1), -1]
+            exact = np.quantile(premiums, COHORT_QUANTILES, method='lower')
+            sketch_values = [float(v.replace(',', '')) for v in re.findall(r"(?:p\d+|median) £([\d,.]+)", stats._summaries[key][1])]
+            worst = max(worst, float(np.max(np.abs(np.array(sketch_values) - exact) / exact)))
+
+        conn.execute(f"INSERT INTO quotes SELECT * FROM quotes LIMIT {args.append}")
+        conn.commit()
+        conn.close()
+        start = time.perf_counter()
+        stats.refresh(force=True)
+        refresh_s = time.perf_counter() - start
+
+    print("\n" + "="*80)
+    print("              SIMILAR QUOTES PROMPT CONTEXT")
+    print("="*80)
+    print(f"Quotes: {args.rows:,}   cohort build: {build_s:.2f}s   "
+          f"fold {args.append:,} appended quotes: {refresh_s * 1000:.0f}ms")
+    print(f"Worst cohort quantile error vs exact: {worst * 100:.2f}%")
+    print(f"{'context':<32} {'p50':>10} {'p99':>10} {'chars':>8} {'~tokens':>8}")
+    for name, (p50, p99, chars, tokens) in results.items():
+        print(f"{name:<32} {p50:>8.1f}us {p99:>8.1f}us {chars:>8.0f} {tokens:>8.0f}")
+    print("="*80)
+
+if __name__ == "__main__":
+    main()
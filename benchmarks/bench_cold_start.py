@@ -0,0 +1,79 @@
+"""
+Benchmark: cold-start time-to-first-quote for each model artifact format.
+
+Each run is a fresh interpreter (empty module cache, as on a new API replica) that
+imports the pricing module, loads the active registry version and prices one profile.
+The OS page cache stays warm between runs, as it would for replicas on the same node.
+
+Usage: python benchmarks/bench_cold_start.py --runs 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import time
+import sys
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Runs inside the child; prints one JSON line of timings
+CHILD = """
+import sys, time, json
+start = time.perf_counter()
+sys.path.insert(0, '.')
+from pricing_model.predict import predict_premium
+imported = time.perf_counter()
+result = predict_premium({'age': 25, 'postcode_risk': 0.5, 'vehicle_group': 15, 'claims_count': 1, 'ncb_years': 3})
+quoted = time.perf_counter()
+print(json.dumps({
+    'import_s': imported - start,
+    'first_quote_s': quoted - start,
+    'premium': result['predicted_premium'],
+    'lightgbm_imported': 'lightgbm' in sys.modules
+}))
+"""
+
+CONFIGS = {
+    "pickle + lightgbm engine": {"MODEL_FORMAT": "pickle", "PRICING_ENGINE": "lightgbm"},
+    "pickle + numpy engine": {"MODEL_FORMAT": "pickle", "PRICING_ENGINE": "numpy"},
+    "arrays + lightgbm engine": {"MODEL_FORMAT": "arrays", "PRICING_ENGINE": "lightgbm"},
+    "arrays + numpy engine": {"MODEL_FORMAT": "arrays", "PRICING_ENGINE": "numpy"},
+}
+
+def run_once(overrides: dict) -> dict:
+    # The grid is independent of the artifact format; leave it out so only model loading is compared
+    env = dict(os.environ, MODEL_POLL_INTERVAL="0", PRICING_GRID="off", **overrides)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    timings['process_s'] = wall
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help="Fresh processes per format")
+    args = parser.parse_args()
+
+    results = {}
+    for name, overrides in CONFIGS.items():
+        runs = [run_once(overrides) for _ in range(args.runs)]
+        results[name] = runs
+
+    premiums = {run['premium'] for runs in results.values() for run in runs}
+
+    print("\n" + "="*60)
+    print("          COLD START: TIME TO FIRST QUOTE")
+    print("="*60)
+    print(f"Runs per format: {args.runs} (median shown)")
+    print(f"Premium identical across formats: {len(premiums) == 1}")
+    for name, runs in results.items():
+        first_quote = np.median([r['first_quote_s'] for r in runs]) * 1000
+        process = np.median([r['process_s'] for r in runs]) * 1000
+        lightgbm = "yes" if runs[0]['lightgbm_imported'] else "no"
+        print(f"{name:<26} first quote {first_quote:>7.0f}ms   process {process:>7.0f}ms   lightgbm loaded: {lightgbm}")
+    print("="*60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark: evaluating the pricing model over a large portfolio, in memory vs streaming.
+
+Generates a synthetic quotes table and its Parquet copy, then evaluates the current
+pricing_model/model.pkl on it in fresh processes (so peak RSS is per run): the
+in-memory path (load everything, predict in one shot, scatter every point) and the
+streaming path (rowid chunks, mergeable metrics, 2D histogram + reservoir sample)
+with one and several worker processes. Plots are rendered to a scratch directory.
+
+Usage: python benchmarks/bench_evaluation.py --rows 10000000 --workers 1 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import synthetic_quotes_db
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+IN_MEMORY = """
+df = read_quotes(features + ['premium'], dataset_dir=DATASET, sync=False).to_pandas()
+y, y_pred = df['premium'], model.predict(df[features])
+metrics = {'mae': mean_absolute_error(y, y_pred), 'rmse': float(np.sqrt(mean_squared_error(y, y_pred))), 'r2': r2_score(y, y_pred)}
+plt.figure(figsize=(8, 8))
+plt.scatter(y, y_pred, alpha=0.5)
+plt.savefig('evaluation/plots/predicted_vs_actual.png')
+plt.close()
+"""
+
+STREAMING = """
+running, hist, edges, (_, y_s, p_s) = evaluate_streaming(MODEL, DATASET, N_ROWS, workers={workers})
+plot_predicted_vs_actual_density(hist, edges, running.n)
+plot_residual_sample(y_s, p_s, running.n)
+metrics = running.result()
+"""
+
+# Same imports and model load before the clock starts; VmHWM as in bench_quotes_dataset.py
+RUNNER = """
+import os, sys, time, json, pickle
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+sys.path.insert(0, {root!r})
+from database.quotes_dataset import read_quotes
+from pricing_model.predict import get_booster
+from pricing_model.evaluate_model import evaluate_streaming, plot_predicted_vs_actual_density, plot_residual_sample
+MODEL, DATASET, N_ROWS = {model!r}, {dataset!r}, {n_rows}
+with open(MODEL, 'rb') as f:
+    model_data = pickle.load(f)
+model, features = get_booster(model_data), model_data['features']
+os.chdir({tmp!r})
+os.makedirs('evaluation/plots', exist_ok=True)
+start = time.time()
+{body}
+wall_s = time.time() - start
+hwm_kb = next(int(line.split()[1]) for line in open('/proc/self/status') if line.startswith('VmHWM'))
+print(json.dumps({{'wall_s': wall_s, 'peak_rss_mb': hwm_kb / 1024, **{{k: float(v) for k, v in metrics.items()}}}}))
+"""
+
+def run(body: str, tmp: str, dataset_dir: str, n_rows: int) -> dict:
+    code = RUNNER.format(root=ROOT, model=os.path.join(ROOT, 'pricing_model', 'model.pkl'),
+                         dataset=dataset_dir, n_rows=n_rows, tmp=tmp, body=body)
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000_000, help="Quotes in the synthetic table")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4], help="Streaming worker counts to compare")
+    parser.add_argument('--skip-in-memory', action='store_true', help="Only run the streaming path")
+    args = parser.parse_args()
+
+    from database.quotes_dataset import sync_quotes
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "quotes.db")
+        dataset_dir = os.path.join(tmp, "quotes_parquet")
+        synthetic_quotes_db(db_path, args.rows)
+        n_rows = sync_quotes(db_path, dataset_dir)['exported_through']
+
+        baseline = run("metrics = {}", tmp, dataset_dir, n_rows)
+        results = {}
+        if not args.skip_in_memory:
+            results["in-memory (scatter all)"] = run(IN_MEMORY, tmp, dataset_dir, n_rows)
+        for workers in args.workers:
+            results[f"streaming, {workers} worker(s)"] = run(STREAMING.format(workers=workers), tmp, dataset_dir, n_rows)
+
+    print("\n" + "="*80)
+    print("              MODEL EVALUATION: IN-MEMORY VS STREAMING")
+    print("="*80)
+    print(f"Quotes: {args.rows:,}   peak RSS below is on top of {baseline['peak_rss_mb']:.0f}MB for the interpreter and model")
+    print(f"{'mode':<26} {'wall':>9} {'peak RSS':>10} {'MAE':>10} {'RMSE':>10} {'R2':>8}")
+    for name, r in results.items():
+        print(f"{name:<26} {r['wall_s']:>8.1f}s {r['peak_rss_mb'] - baseline['peak_rss_mb']:>8.0f}MB "
+              f"{r['mae']:>10.4f} {r['rmse']:>10.4f} {r['r2']:>8.5f}")
+    print("="*80)
+
+if __name__ == "__main__":
+    main()
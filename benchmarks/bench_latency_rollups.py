@@ -0,0 +1,95 @@
+"""
+Benchmark: "p99 LLM latency per 5 minutes over the last week", rollups vs raw rows.
+
+Fills a scratch telemetry table with a week of synthetic requests, builds the
+rollups from it, then answers the query both ways: merging the stored sketches,
+and scanning the raw rows into NumPy percentiles. Reports query time and the
+sketches' worst relative error against the exact percentiles.
+
+Usage: python benchmarks/bench_latency_rollups.py --requests 1000000
+"""
+import argparse
+import calendar
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database.store import get_store
+from observability.latency_rollups import LatencyRollups
+from observability.telemetry import INSERT_TELEMETRY, format_timestamp
+
+WEEK = 7 * 86400
+INTERVAL = 300
+
+def raw_series(store, start: float, end: float, quantiles: tuple) -> dict:
+    rows = store.fetch_array(
+        "SELECT (julianday(timestamp) - 2440587.5) * 86400.0, llm_latency_ms FROM telemetry "
+        "WHERE timestamp >= ? AND timestamp < ? AND llm_latency_ms IS NOT NULL",
+        (format_timestamp(start), format_timestamp(end)), n_columns=2
+    )
+    groups = (rows[:, 0] // INTERVAL).astype(np.int64) * INTERVAL
+    order = np.argsort(groups, kind='stable')
+    groups, values = groups[order], rows[order, 1]
+    bounds = np.flatnonzero(np.diff(groups)) + 1
+    return {
+        int(g[0]): np.quantile(v, quantiles, method='lower')
+        for g, v in zip(np.split(groups, bounds), np.split(values, bounds))
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1_000_000, help="Synthetic telemetry rows over the week")
+    args = parser.parse_args()
+    quantiles = (0.5, 0.99)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "quotes.db")
+        store = get_store(db_path)
+        rng = np.random.default_rng(0)
+        end = float(int(time.time()) // 3600 * 3600)
+        start = end - WEEK
+        ts = np.sort(rng.uniform(start, end, args.requests))
+        llm = rng.lognormal(np.log(700), 0.4, args.requests)
+        pricing = rng.lognormal(np.log(4), 0.5, args.requests)
+        for lo in range(0, args.requests, 100_000):
+            hi = min(lo + 100_000, args.requests)
+            store.executemany(INSERT_TELEMETRY, (
+                (format_timestamp(t), None, "/explain", p + l + 50, p, 40.0, 0.5, l, "success", None)
+                for t, p, l in zip(ts[lo:hi].tolist(), pricing[lo:hi].tolist(), llm[lo:hi].tolist())
+            ))
+
+        rollups = LatencyRollups(db_path)
+        t0 = time.perf_counter()
+        rollups.rebuild()
+        build_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        series = rollups.series('llm', start, end, INTERVAL, quantiles=quantiles)
+        rollup_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        exact = raw_series(store, start, end, quantiles)
+        raw_ms = (time.perf_counter() - t0) * 1000
+        n_sketches = store.scalar("SELECT COUNT(*) FROM latency_rollups")
+
+    errors = {q: 0.0 for q in quantiles}
+    for row in series:
+        group = calendar.timegm(time.strptime(row['bucket_start'], '%Y-%m-%dT%H:%M:%SZ'))
+        for q, true in zip(quantiles, exact[group]):
+            errors[q] = max(errors[q], abs(row[f"p{q * 100:g}_ms"] - true) / true)
+
+    print("\n" + "="*66)
+    print("        WEEKLY p50/p99 LLM LATENCY PER 5 MINUTES")
+    print("="*66)
+    print(f"Telemetry rows: {args.requests:,}   sketches stored: {n_sketches:,}   rollup backfill: {build_s:.1f}s")
+    print(f"{'method':<28} {'buckets':>8} {'query':>12}")
+    print(f"{'rollup sketches':<28} {len(series):>8} {rollup_ms:>10.1f}ms")
+    print(f"{'raw rows + numpy':<28} {len(exact):>8} {raw_ms:>10.1f}ms")
+    print("Worst relative error vs exact: " + ", ".join(f"p{q * 100:g} {e * 100:.2f}%" for q, e in errors.items()))
+    print("="*66)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark: keyword reranking in the hybrid search, per-request BM25Okapi vs the corpus-wide index.
+
+Ranking quality: labeled queries over the real guideline chunks, each with the file
+that answers it. The queries are the golden-dataset concepts from
+data_generation/generate_golden_dataset.py plus hand-written customer questions.
+Reports hit@1, MRR (ties count as the middle of the tied ranks), and how often
+a query scores zero against every chunk, which leaves the order to chance.
+
+Latency: a synthetic corpus built from guideline sentences (--chunks). Per query,
+the original approach builds BM25Okapi over the hybrid search's candidate set
+(--candidates chunks, split(" ") tokens) and scores it. It is also timed over the
+whole corpus, which it would need for corpus-wide IDF. The index scores the same
+candidates from precomputed postings.
+
+Usage: python benchmarks/bench_lexical_index.py --chunks 10000 --queries 2000
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from rag.lexical_index import LexicalIndex
+from data_generation.generate_golden_dataset import GUIDELINE_BANDS
+
+QUESTIONS = [
+    ("Why do young drivers under 21 pay so much?", "age_policy.txt"),
+    ("Does my age affect my premium?", "age_policy.txt"),
+    ("I'm 67, will my medical risks increase the price?", "age_policy.txt"),
+    ("How much extra do I pay after one claim?", "claims_count.txt"),
+    ("Will two claims get my policy declined?", "claims_count.txt"),
+    ("What discount does my No Claims Bonus give?", "ncb_policy.txt"),
+    ("How many years of NCB do I need for the biggest discount?", "ncb_policy.txt"),
+    ("Is my postcode considered a high-crime area?", "postcode_risk.txt"),
+    ("Do I get a discount for living in a safe rural area?", "postcode_risk.txt"),
+    ("Why are luxury and performance cars more expensive?", "vehicle_group.txt"),
+    ("Which vehicle groups count as economy cars?", "vehicle_group.txt"),
+    ("Is a family car cheaper to insure?", "vehicle_group.txt"),
+]
+
+def labeled_queries() -> list:
+    concepts = [(concept, filename) for filename, bands in GUIDELINE_BANDS.values() for *_, concept in bands if concept]
+    return concepts + QUESTIONS
+
+def expected_rank(scores: np.ndarray, relevant: int) -> float:
+    greater = np.sum(scores > scores[relevant])
+    ties = np.sum(scores == scores[relevant]) - 1
+    return 1 + greater + ties / 2
+
+def ranking_quality(score_fn, queries: list, names: list) -> tuple:
+    ranks, zero = [], 0
+    for query, filename in queries:
+        scores = np.asarray(score_fn(query), dtype=np.float64)
+        zero += not scores.any()
+        ranks.append(expected_rank(scores, names.index(filename)))
+    ranks = np.array(ranks)
+    return float(np.mean(ranks == 1)), float(np.mean(1 / ranks)), zero / len(queries)
+
+def synthetic_corpus(n_chunks: int, sentences: list, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    chunks = []
+    for _ in range(n_chunks):
+        picked = rng.choice(len(sentences), size=int(rng.integers(3, 7)), replace=False)
+        chunks.append(" ".join(sentences[i].replace("21", str(rng.integers(17, 90))) for i in picked))
+    return chunks
+
+def timed(fn, args_list: list) -> tuple:
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--chunks', type=int, default=10_000, help="Chunks in the synthetic corpus")
+    parser.add_argument('--queries', type=int, default=2000, help="Timed queries per approach")
+    parser.add_argument('--candidates', type=int, default=21, help="Candidates reranked per query (1 + 6 keywords, top 3 each)")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob("data/guidelines/*.txt"))
+    names = [os.path.basename(p) for p in paths]
+    documents = [open(p).read() for p in paths]
+    queries = labeled_queries()
+
+    # Ranking quality on the real chunks (every chunk is a candidate, as in the pipeline)
+    index = LexicalIndex.from_documents(names, documents)
+    quality = {
+        "BM25Okapi, split(\" \") (orig)": ranking_quality(
+            lambda q: BM25Okapi([d.split(" ") for d in documents]).get_scores(q.split(" ")), queries, names),
+        "corpus index, stemmed": ranking_quality(index.score, queries, names)
+    }
+
+    # Latency on the synthetic corpus
+    sentences = [line.strip() for d in documents for line in d.splitlines() if line.strip()]
+    corpus = synthetic_corpus(args.chunks, sentences)
+    ids = [f"chunk_{i}" for i in range(len(corpus))]
+    start = time.perf_counter()
+    big_index = LexicalIndex.from_documents(ids, corpus)
+    build_s = time.perf_counter() - start
+    rng = np.random.default_rng(1)
+    cases = [(queries[i % len(queries)][0], rng.choice(len(corpus), args.candidates, replace=False))
+             for i in range(args.queries)]
+
+    def per_request(query, candidates):
+        BM25Okapi([corpus[i].split(" ") for i in candidates]).get_scores(query.split(" "))
+
+    def per_request_corpus(query, _):
+        BM25Okapi([c.split(" ") for c in corpus]).get_scores(query.split(" "))
+
+    def indexed(query, candidates):
+        big_index.score_ids(query, [ids[i] for i in candidates])
+
+    latency = {
+        f"BM25Okapi over {args.candidates} candidates (orig)": timed(per_request, cases),
+        f"BM25Okapi over all {len(corpus):,} chunks": timed(per_request_corpus, cases[:max(args.queries // 100, 5)]),
+        "corpus index, score candidates": timed(indexed, cases)
+    }
+
+    print("\n" + "="*80)
+    print("              GUIDELINE KEYWORD RERANKING")
+    print("="*80)
+    print(f"Ranking quality: {len(queries)} labeled queries over {len(documents)} guideline chunks")
+    print(f"{'scorer':<32} {'hit@1':>8} {'MRR':>8} {'all-zero':>10}")
+    for name, (hit1, mrr, zero) in quality.items():
+        print(f"{name:<32} {hit1:>8.2f} {mrr:>8.3f} {zero * 100:>9.0f}%")
+    print(f"\nLatency: {len(corpus):,} synthetic chunks, index build {build_s * 1000:.0f}ms "
+          f"({big_index._state[0].shape[1]:,} terms, {big_index._state[0].nnz:,} postings)")
+    print(f"{'scorer':<40} {'p50':>10} {'p99':>10}")
+    for name, (p50, p99) in latency.items():
+        print(f"{name:<40} {p50:>8.1f}us {p99:>8.1f}us")
+    print("="*80)
+
+if __name__ == "__main__":
+    main()
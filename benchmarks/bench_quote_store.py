@@ -0,0 +1,107 @@
+"""
+Benchmark: concurrent quote reads per second, per-call connections vs the pooled store.
+
+Builds a synthetic quotes table twice: a legacy copy (rollback journal, no indexes,
+as pandas.to_sql created it) read the old way - sqlite3.connect + pd.read_sql_query
+per call - and the store's WAL database with covering indexes, read through pooled
+connections and prepared statements. Two workloads run at each thread count: the
+similar-quotes filter (LIMIT 5) and a cohort aggregate over the rating factors.
+
+Usage: python benchmarks/bench_quote_store.py --rows 1000000 --threads 1 2 4 8 --seconds 3
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database.store import QuoteStore, QUOTE_COLUMNS
+from benchmarks.common import random_profiles, synthetic_quotes_db
+
+WORKLOADS = {
+    'similar': (
+        f"SELECT {', '.join(QUOTE_COLUMNS)} FROM quotes "
+        "WHERE age BETWEEN ? AND ? AND vehicle_group BETWEEN ? AND ? LIMIT 5",
+        lambda p: (p['age'] - 2, p['age'] + 2, p['vehicle_group'] - 3, p['vehicle_group'] + 3)
+    ),
+    'cohort': (
+        "SELECT COUNT(*), AVG(premium), MIN(premium), MAX(premium) FROM quotes "
+        "WHERE age BETWEEN ? AND ? AND vehicle_group BETWEEN ? AND ? AND claims_count = ?",
+        lambda p: (p['age'] - 2, p['age'] + 2, p['vehicle_group'] - 3, p['vehicle_group'] + 3, p['claims_count'])
+    )
+}
+
+def legacy_read(db_path: str):
+    def read(sql: str, params: tuple):
+        conn = sqlite3.connect(db_path)
+        df = pd.read_sql_query(sql, conn, params=params)
+        conn.close()
+        return df
+    return read
+
+def reads_per_second(read, sql: str, param_sets: list, n_threads: int, seconds: float) -> float:
+    counts = [0] * n_threads
+    deadline = time.perf_counter() + seconds
+
+    def worker(slot: int):
+        i = slot
+        while time.perf_counter() < deadline:
+            read(sql, param_sets[i % len(param_sets)])
+            i += n_threads
+            counts[slot] += 1
+
+    threads = [threading.Thread(target=worker, args=(slot,)) for slot in range(n_threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Quotes in the synthetic table")
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8], help="Concurrent reader threads")
+    parser.add_argument('--seconds', type=float, default=3.0, help="Duration of each measurement")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "quotes.db")
+        legacy_path = os.path.join(tmp, "quotes_legacy.db")
+        synthetic_quotes_db(db_path, args.rows)
+        shutil.copy(db_path, legacy_path)
+        conn = sqlite3.connect(legacy_path)
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'quotes'").fetchall():
+            conn.execute(f"DROP INDEX {name}")
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.execute("VACUUM")
+        conn.close()
+
+        store = QuoteStore(db_path, readers=max(args.threads))
+        profiles = random_profiles(5000, seed=2)
+        results = []
+        for workload, (sql, to_params) in WORKLOADS.items():
+            param_sets = [to_params(p) for p in profiles]
+            for n_threads in args.threads:
+                legacy = reads_per_second(legacy_read(legacy_path), sql, param_sets, n_threads, args.seconds)
+                pooled = reads_per_second(store.fetch_all, sql, param_sets, n_threads, args.seconds)
+                results.append((workload, n_threads, legacy, pooled))
+        store.close()
+
+    print("\n" + "="*72)
+    print("              QUOTE STORE READ THROUGHPUT")
+    print("="*72)
+    print(f"Rows: {args.rows:,}, cores: {os.cpu_count()}, {args.seconds:.0f}s per measurement")
+    print(f"{'workload':<10} {'threads':>7} {'connect+pandas':>16} {'pooled store':>14} {'speedup':>9}")
+    for workload, n_threads, legacy, pooled in results:
+        print(f"{workload:<10} {n_threads:>7} {legacy:>12.0f} r/s {pooled:>10.0f} r/s {pooled / legacy:>8.1f}x")
+    print("="*72)
+
+if __name__ == "__main__":
+    main()
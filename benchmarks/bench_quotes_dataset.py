@@ -0,0 +1,106 @@
+"""
+Benchmark: loading quotes for training/evaluation, SQLite vs the Parquet dataset.
+
+Generates a synthetic quotes table, exports it to Parquet, then loads it in fresh
+processes (so peak RSS is per loader) the way train_model.py and evaluate_model.py
+used to - pd.read_sql_query("SELECT * FROM quotes") - and through Arrow: all
+columns, only the model features (column pruning), and a filtered slice
+(predicate pushdown) against the equivalent SQL WHERE.
+
+Usage: python benchmarks/bench_quotes_dataset.py --rows 10000000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import synthetic_quotes_db
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+LOADERS = {
+    "sqlite: read_sql_query SELECT *": """
+conn = sqlite3.connect(DB)
+df = pd.read_sql_query("SELECT * FROM quotes", conn)
+conn.close()
+n = len(df)
+""",
+    "parquet: all columns -> pandas": """
+df = read_quotes(dataset_dir=DATASET, sync=False).to_pandas()
+n = len(df)
+""",
+    "parquet: features only -> numpy": """
+table = read_quotes(['age', 'postcode_risk', 'vehicle_group', 'claims_count', 'ncb_years'], dataset_dir=DATASET, sync=False)
+X = np.column_stack([c.to_numpy() for c in table.columns]).astype(np.float64)
+n = len(X)
+""",
+    "sqlite: WHERE age < 25": """
+conn = sqlite3.connect(DB)
+df = pd.read_sql_query("SELECT * FROM quotes WHERE age < 25", conn)
+conn.close()
+n = len(df)
+""",
+    "parquet: filter age < 25": """
+df = read_quotes(filter=ds.field('age') < 25, dataset_dir=DATASET, sync=False).to_pandas()
+n = len(df)
+"""
+}
+
+# Every loader imports the same libraries before the clock starts, so times and peak
+# RSS (VmHWM: ru_maxrss would carry over the parent's high-water mark across exec)
+# compare only the loading itself
+RUNNER = """
+import sys, time, json, sqlite3
+import numpy as np, pandas as pd, pyarrow.dataset as ds
+sys.path.insert(0, {root!r})
+from database.quotes_dataset import read_quotes
+DB, DATASET = {db!r}, {dataset!r}
+start = time.time()
+{body}
+load_s = time.time() - start
+hwm_kb = next(int(line.split()[1]) for line in open('/proc/self/status') if line.startswith('VmHWM'))
+print(json.dumps({{'rows': n, 'load_s': load_s, 'peak_rss_mb': hwm_kb / 1024}}))
+"""
+
+def run(body: str, db_path: str, dataset_dir: str) -> dict:
+    code = RUNNER.format(root=ROOT, db=db_path, dataset=dataset_dir, body=body)
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000_000, help="Quotes in the synthetic table")
+    args = parser.parse_args()
+
+    from database.quotes_dataset import sync_quotes
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "quotes.db")
+        dataset_dir = os.path.join(tmp, "quotes_parquet")
+        synthetic_quotes_db(db_path, args.rows)
+        start = time.time()
+        sync_quotes(db_path, dataset_dir)
+        export_s = time.time() - start
+        db_mb = os.path.getsize(db_path) / 2**20
+        parquet_mb = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(dataset_dir) for f in files) / 2**20
+
+        # Both files were just written, so every loader reads from the page cache
+        baseline = run("n = 0", db_path, dataset_dir)
+        results = {name: run(body, db_path, dataset_dir) for name, body in LOADERS.items()}
+
+    print("\n" + "="*76)
+    print("              QUOTES LOAD: SQLITE VS PARQUET")
+    print("="*76)
+    print(f"Rows: {args.rows:,}   SQLite file (with indexes): {db_mb:.0f}MB   Parquet: {parquet_mb:.0f}MB   export: {export_s:.1f}s")
+    print(f"Peak RSS below is on top of {baseline['peak_rss_mb']:.0f}MB for the interpreter and libraries")
+    print(f"{'loader':<36} {'rows':>12} {'load':>9} {'peak RSS':>11}")
+    for name, r in results.items():
+        print(f"{name:<36} {r['rows']:>12,} {r['load_s']:>8.2f}s {r['peak_rss_mb'] - baseline['peak_rss_mb']:>8.0f}MB")
+    print("="*76)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: similar-quote lookup, KD-tree index vs the legacy SQL BETWEEN filter.
+
+Builds a synthetic quotes table, checks the index against exact brute force,
+times single-profile queries for both approaches and measures an incremental
+refresh after appending quotes.
+
+Usage: python benchmarks/bench_similar_quotes.py --rows 1000000 --queries 2000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_server.quote_index import QuoteIndex, RATING_FACTORS
+from benchmarks.common import random_profiles, synthetic_quotes_db
+
+def legacy_query(conn, profile: dict, limit: int = 5):
+    # The previous get_similar_quotes filter (without the DataFrame/markdown step)
+    age, vg = profile['age'], profile['vehicle_group']
+    return conn.execute(f"""
+    SELECT * FROM quotes 
+    WHERE age BETWEEN {age-2} AND {age+2}
+    AND vehicle_group BETWEEN {vg-3} AND {vg+3}
+    LIMIT {limit}
+    """).fetchall()
+
+def latency_us(func, profiles: list) -> tuple:
+    timings = []
+    for profile in profiles:
+        start = time.perf_counter()
+        func(profile)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Quotes in the synthetic table")
+    parser.add_argument('--queries', type=int, default=2000, help="Single-profile queries timed per approach")
+    parser.add_argument('--append', type=int, default=20_000, help="Quotes appended before the incremental refresh")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "quotes.db")
+        synthetic_quotes_db(db_path, args.rows)
+        profiles = random_profiles(args.queries, seed=1)
+
+        index = QuoteIndex(db_path, refresh_seconds=3600)
+        start = time.perf_counter()
+        index.refresh()
+        build_s = time.perf_counter() - start
+
+        # Exactness against brute force over the same standardized space
+        snapshot = index._snapshot
+        points = (snapshot.base_rows - snapshot.mean) / snapshot.scale
+        exact = 0
+        for profile in profiles[:50]:
+            q = (np.array([profile[f] for f in RATING_FACTORS]) - snapshot.mean) / snapshot.scale
+            brute = np.sort(np.sqrt(((points - q) ** 2).sum(axis=1)))[:5]
+            found = np.array([n['distance'] for n in index.query(profile)])
+            exact += np.allclose(found, np.round(brute, 4), atol=1e-4)
+
+        conn = sqlite3.connect(db_path)
+        results = {
+            "SQL BETWEEN filter (legacy)": latency_us(lambda p: legacy_query(conn, p), profiles),
+            "KD-tree top-5": latency_us(lambda p: index.query(p, 5), profiles),
+        }
+
+        # Append quotes and refresh: they land in the delta tree (or trigger a rebuild)
+        conn.execute(f"INSERT INTO quotes SELECT * FROM quotes LIMIT {args.append}")
+        conn.commit()
+        conn.close()
+        start = time.perf_counter()
+        added = index.refresh(force=True)
+        refresh_s = time.perf_counter() - start
+        results["KD-tree top-5 + delta tree"] = latency_us(lambda p: index.query(p, 5), profiles)
+
+    print("\n" + "="*60)
+    print("          SIMILAR QUOTES LOOKUP")
+    print("="*60)
+    print(f"Quotes: {args.rows:,}, index build: {build_s:.2f}s")
+    print(f"Exact top-5 vs brute force: {exact}/50 profiles")
+    print(f"Incremental refresh: {added:,} new quotes in {refresh_s * 1000:.0f}ms")
+    for name, (p50, p99) in results.items():
+        print(f"{name:<30} p50 {p50:>9.1f}us   p99 {p99:>9.1f}us")
+    print("="*60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark: peak memory and wall time of in-memory vs streaming training.
+
+For each size a synthetic quotes database is generated once, then each mode trains
+in a fresh process so peak RSS (ru_maxrss) is attributable to that mode alone:
+  - in-memory: train_model.py's approach (SELECT * into pandas, LGBMRegressor.fit)
+  - streaming: pricing_model/train_streaming.py (chunked lgb.Sequence, no cache)
+
+Usage: python benchmarks/bench_streaming_training.py --rows 1000000 10000000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import synthetic_quotes_db
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+IN_MEMORY = """
+import sys, time, json, sqlite3, resource
+import pandas as pd
+import lightgbm as lgb
+start = time.time()
+conn = sqlite3.connect(sys.argv[1])
+df = pd.read_sql_query("SELECT * FROM quotes", conn)
+conn.close()
+X, y = df.drop('premium', axis=1), df['premium']
+lgb.LGBMRegressor(n_estimators=100, learning_rate=0.1, max_depth=5, random_state=42, verbose=-1).fit(X, y)
+print(json.dumps({'wall_s': time.time() - start, 'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+def run(args: list) -> dict:
+    proc = subprocess.run([sys.executable] + args, cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000], help="Table sizes to benchmark")
+    parser.add_argument('--batch-size', type=int, default=100_000, help="Streaming chunk size")
+    parser.add_argument('--skip-in-memory', action='store_true', help="Only run streaming (e.g. when RAM is too small)")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_rows in args.rows:
+            db_path = os.path.join(tmp, f"quotes_{n_rows}.db")
+            start = time.time()
+            synthetic_quotes_db(db_path, n_rows)
+            print(f"Generated {n_rows:,} rows in {time.time() - start:.0f}s")
+
+            if not args.skip_in_memory:
+                results.append((n_rows, "in-memory (pandas)", run(["-c", IN_MEMORY, db_path])))
+            streaming = run(["pricing_model/train_streaming.py", "--db", db_path, "--batch-size", str(args.batch_size),
+                             "--no-cache", "--no-publish", "--json"])
+            results.append((n_rows, "streaming (lgb.Sequence)", streaming))
+            os.remove(db_path)
+
+    print("\n" + "="*60)
+    print("          TRAINING: PEAK MEMORY AND WALL TIME")
+    print("="*60)
+    for n_rows, mode, r in results:
+        print(f"{n_rows:>11,} rows  {mode:<26} wall {r['wall_s']:>7.1f}s   peak RSS {r['peak_rss_mb']:>7.0f}MB")
+    print("="*60)
+
+if __name__ == "__main__":
+    main()
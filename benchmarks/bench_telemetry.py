@@ -0,0 +1,74 @@
+"""
+Benchmark: per-request cost of recording telemetry.
+
+Times TelemetrySink.record() call by call while the background writer flushes to a
+scratch database, against a synchronous INSERT + COMMIT per request (what a
+handler writing to the telemetry table directly would pay). The sink's p99 should
+stay under the 50us budget.
+
+Usage: python benchmarks/bench_telemetry.py --requests 200000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database.store import QuoteStore, get_store
+from observability.telemetry import TelemetrySink, INSERT_TELEMETRY, format_timestamp
+
+BUDGET_US = 50.0
+PROFILE = {'age': 30, 'postcode_risk': 0.5, 'vehicle_group': 10, 'claims_count': 0, 'ncb_years': 5}
+
+def percentiles(timings_ns: list) -> tuple:
+    us = np.asarray(timings_ns) / 1000
+    return float(us.mean()), float(np.percentile(us, 50)), float(np.percentile(us, 99))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200_000, help="Records written by the sink")
+    parser.add_argument('--sync-requests', type=int, default=2000, help="Records written with a commit each")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "quotes.db")
+        QuoteStore(db_path).close()
+
+        sink = TelemetrySink(db_path, buffer_size=args.requests, flush_interval=0.1, retention_interval=0)
+        sink_ns = []
+        for i in range(args.requests):
+            start = time.perf_counter_ns()
+            sink.record("req-%d" % i, "/explain", "success", 812.5, 3.1, 45.2, 0.4, 760.0, PROFILE)
+            sink_ns.append(time.perf_counter_ns() - start)
+        start = time.perf_counter()
+        sink.close(timeout=60)
+        drain_s = time.perf_counter() - start
+        stats = sink.stats()
+
+        store = get_store(db_path)
+        sync_ns = []
+        for i in range(args.sync_requests):
+            start = time.perf_counter_ns()
+            store.execute(INSERT_TELEMETRY, (format_timestamp(time.time()), "req-%d" % i, "/explain", 812.5, 3.1,
+                                             45.2, 0.4, 760.0, "success", str(PROFILE)))
+            sync_ns.append(time.perf_counter_ns() - start)
+        rows = store.scalar("SELECT COUNT(*) FROM telemetry")
+
+    print("\n" + "="*66)
+    print("              TELEMETRY PER-REQUEST OVERHEAD")
+    print("="*66)
+    print(f"{'writer':<28} {'mean':>10} {'p50':>10} {'p99':>10}")
+    for name, timings in (("sink.record (buffered)", sink_ns), ("INSERT + COMMIT per request", sync_ns)):
+        mean, p50, p99 = percentiles(timings)
+        print(f"{name:<28} {mean:>8.1f}us {p50:>8.1f}us {p99:>8.1f}us")
+    print(f"Sink: {stats['flushed']:,} flushed, {stats['dropped']} dropped, final drain {drain_s * 1000:.0f}ms; "
+          f"{rows:,} rows in table")
+    p99 = percentiles(sink_ns)[2]
+    print(f"p99 {'within' if p99 < BUDGET_US else 'OVER'} the {BUDGET_US:.0f}us budget")
+    print("="*66)
+
+if __name__ == "__main__":
+    main()
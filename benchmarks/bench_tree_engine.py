@@ -0,0 +1,62 @@
+"""
+Benchmark: per-row latency of the NumPy tree engine against LightGBM.
+
+Usage: python benchmarks/bench_tree_engine.py --rows 2000
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pricing_model.predict import get_model_data, get_booster
+from pricing_model.tree_engine import TreeEnsemble
+from benchmarks.common import random_profiles
+
+def per_row_latency_us(func, rows: list) -> tuple:
+    timings = []
+    for row in rows:
+        start = time.perf_counter()
+        func(row)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000, help="Single-row predictions timed per engine")
+    args = parser.parse_args()
+
+    model_data = get_model_data()
+    booster = get_booster(model_data)
+    features = model_data['features']
+    engine = TreeEnsemble.from_booster(booster)
+
+    profiles = random_profiles(args.rows)
+    frames = [pd.DataFrame([p])[features] for p in profiles]
+    matrices = [df.to_numpy(dtype=np.float64) for df in frames]
+
+    # Parity first: a fast engine that disagrees is useless
+    X = np.vstack(matrices)
+    mismatches = int(np.count_nonzero(engine.predict(X) != booster.predict(X)))
+
+    results = {}
+    # The sklearn wrapper only exists in pickle-format versions (MODEL_FORMAT=arrays serves the booster)
+    if 'model' in model_data:
+        results["LGBMRegressor.predict (DataFrame)"] = per_row_latency_us(model_data['model'].predict, frames)
+    results["Booster.predict (ndarray)"] = per_row_latency_us(booster.predict, matrices)
+    results["TreeEnsemble.predict (NumPy)"] = per_row_latency_us(engine.predict, matrices)
+
+    print("\n" + "="*60)
+    print("          PER-ROW INFERENCE LATENCY")
+    print("="*60)
+    print(f"Trees: {engine.n_trees}, nodes: {engine.n_nodes}, max depth: {engine.max_depth}")
+    print(f"Parity: {len(X) - mismatches}/{len(X)} rows bit-identical")
+    for name, (p50, p99) in results.items():
+        print(f"{name:<36} p50 {p50:>8.1f}us   p99 {p99:>8.1f}us")
+    print("="*60)
+
+if __name__ == "__main__":
+    main()
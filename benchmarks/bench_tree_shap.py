@@ -0,0 +1,60 @@
+"""
+Benchmark: native NumPy TreeSHAP against shap.TreeExplainer.
+
+Usage: python benchmarks/bench_tree_shap.py --rows 500 --batch 5000
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import shap
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pricing_model.predict import get_model_data, get_booster, profiles_to_matrix
+from pricing_model.tree_shap import TreeShapExplainer
+from benchmarks.common import random_profiles
+
+def timed(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500, help="Single-row explanations timed per backend")
+    parser.add_argument('--batch', type=int, default=5000, help="Rows in the batch explanation")
+    args = parser.parse_args()
+
+    model_data = get_model_data()
+    booster = get_booster(model_data)
+    X = profiles_to_matrix(random_profiles(max(args.rows, args.batch)), model_data['features'])
+
+    shap_ctor = timed(shap.TreeExplainer, booster)
+    native_ctor = timed(TreeShapExplainer.from_booster, booster)
+    reference = shap.TreeExplainer(booster)
+    native = TreeShapExplainer.from_booster(booster)
+
+    max_diff = float(np.max(np.abs(reference.shap_values(X) - native.shap_values(X))))
+
+    def per_row_us(func):
+        return np.median([timed(func, X[i:i + 1]) for i in range(args.rows)]) * 1e6
+
+    baseline_row = np.median([timed(lambda row: shap.TreeExplainer(booster).shap_values(row), X[i:i + 1]) for i in range(min(args.rows, 100))]) * 1e6
+
+    print("\n" + "="*64)
+    print("          TREESHAP BENCHMARK")
+    print("="*64)
+    print(f"Max |native - shap| over {len(X)} rows: {max_diff:.2e}")
+    print(f"Constructor: shap {shap_ctor*1e3:.1f}ms, native {native_ctor*1e3:.1f}ms (once per model load)")
+    print(f"{'Per row, new shap.TreeExplainer each call (baseline)':<54} {baseline_row:>8.0f}us")
+    print(f"{'Per row, cached shap.TreeExplainer':<54} {per_row_us(reference.shap_values):>8.0f}us")
+    print(f"{'Per row, native TreeSHAP':<54} {per_row_us(native.shap_values):>8.0f}us")
+    batch = X[:args.batch]
+    print(f"{f'Batch of {len(batch)}, cached shap.TreeExplainer':<54} {len(batch)/timed(reference.shap_values, batch):>8,.0f} rows/s")
+    print(f"{f'Batch of {len(batch)}, native TreeSHAP':<54} {len(batch)/timed(native.shap_values, batch):>8,.0f} rows/s")
+    print("="*64)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark: guideline top-k retrieval, Chroma vs the in-process NumPy backend.
+
+For each corpus size, builds synthetic chunks with clustered, unit-length 384-d
+embeddings (the MiniLM width). The chunks go into a persistent Chroma collection and, through
+rag/vector_backend.write_index, into a NumPy index. Both backends are queried with
+the same precomputed query embeddings, so the model's cost, identical for both, is
+left out. Reports per-query p50/p99 latency, load and build times, and Chroma's
+recall@k against the exact NumPy result (HNSW is approximate).
+
+Loading a large Chroma collection takes minutes (~1k chunks/s here); --chroma-max
+skips Chroma above that size.
+
+Usage: python benchmarks/bench_vector_backend.py --sizes 10000 1000000 --queries 1000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from rag.vector_backend import NumpyBackend, write_index
+
+DIM = 384
+CHUNK_CHARS = 400
+
+def synthetic_chunks(n: int, seed: int = 0) -> tuple:
+    rng = np.random.default_rng(seed)
+    # Clustered, like real chunks of a few policy documents, rather than uniform noise
+    centres = rng.standard_normal(size=(max(n // 200, 1), DIM), dtype=np.float32)
+    embeddings = centres[rng.integers(len(centres), size=n)]
+    for lo in range(0, n, 100_000):
+        block = embeddings[lo:lo + 100_000]
+        block += 0.5 * rng.standard_normal(size=block.shape, dtype=np.float32)
+        # Unit length, as MiniLM outputs are, so Chroma's L2 ranks like the NumPy cosine
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+    ids = [f"guideline_{i // 50}.txt_{i % 50}" for i in range(n)]
+    documents = [f"Rule {i}: " + "x" * CHUNK_CHARS for i in range(n)]
+    metadatas = [{"source": f"guideline_{i // 50}.txt", "chunk_index": i % 50} for i in range(n)]
+    return ids, documents, metadatas, embeddings
+
+def timed(fn, queries: np.ndarray, k: int) -> tuple:
+    timings, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(fn(q[None, :], k)['ids'][0])
+        timings.append((time.perf_counter() - start) * 1e6)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99)), results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 1_000_000], help="Corpus sizes (chunks)")
+    parser.add_argument('--queries', type=int, default=1000, help="Queries timed per backend and size")
+    parser.add_argument('--k', type=int, default=5, help="Results per query")
+    parser.add_argument('--chroma-max', type=int, default=1_000_000, help="Skip Chroma above this many chunks")
+    args = parser.parse_args()
+
+    rows = []
+    for n in args.sizes:
+        ids, documents, metadatas, embeddings = synthetic_chunks(n)
+        queries = embeddings[np.random.default_rng(1).integers(n, size=args.queries)] \
+            + 0.3 * np.random.default_rng(2).standard_normal(size=(args.queries, DIM), dtype=np.float32)
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            write_index(os.path.join(tmp, "vector_index", "bench"), ids, documents, metadatas, embeddings)
+            numpy_build_s = time.perf_counter() - start
+            backend = NumpyBackend("bench", index_root=os.path.join(tmp, "vector_index"))
+            start = time.perf_counter()
+            backend.search(queries[:1], args.k)
+            numpy_load_s = time.perf_counter() - start
+            p50, p99, exact = timed(backend.search, queries, args.k)
+            rows.append((n, "numpy (matvec + argpartition)", p50, p99, numpy_build_s, numpy_load_s, 1.0))
+
+            if n > args.chroma_max:
+                continue
+            import chromadb
+            client = chromadb.PersistentClient(path=os.path.join(tmp, "chroma"))
+            collection = client.create_collection("bench", embedding_function=None)
+            batch = client.get_max_batch_size()
+            start = time.perf_counter()
+            for lo in range(0, n, batch):
+                collection.add(ids=ids[lo:lo + batch], embeddings=embeddings[lo:lo + batch],
+                               documents=documents[lo:lo + batch], metadatas=metadatas[lo:lo + batch])
+            chroma_build_s = time.perf_counter() - start
+            del client, collection
+            start = time.perf_counter()
+            collection = chromadb.PersistentClient(path=os.path.join(tmp, "chroma")).get_collection("bench")
+            chroma_query = lambda q, k: collection.query(query_embeddings=q, n_results=k,
+                                                         include=['documents', 'metadatas', 'distances'])
+            chroma_query(queries[:1], args.k)
+            chroma_load_s = time.perf_counter() - start
+            p50, p99, approx = timed(chroma_query, queries, args.k)
+            recall = np.mean([len(set(a) & set(e)) / args.k for a, e in zip(approx, exact)])
+            rows.append((n, "chroma (HNSW)", p50, p99, chroma_build_s, chroma_load_s, recall))
+
+    print("\n" + "="*80)
+    print("              GUIDELINE RETRIEVAL BACKENDS")
+    print("="*80)
+    print(f"{DIM}-d embeddings, top-{args.k}, {args.queries} queries per row; recall@{args.k} vs exact")
+    print(f"{'chunks':>10} {'backend':<30} {'p50':>9} {'p99':>9} {'build':>8} {'load':>7} {'recall':>7}")
+    for n, name, p50, p99, build_s, load_s, recall in rows:
+        print(f"{n:>10,} {name:<30} {p50 / 1000:>7.2f}ms {p99 / 1000:>7.2f}ms {build_s:>7.1f}s {load_s:>6.2f}s {recall:>7.3f}")
+    print("="*80)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark: concurrent single-profile pricing throughput, thread offload vs process pool.
+
+Fires --requests single-profile quotes with --concurrency in flight, the way the
+optimized pipeline does under load. The thread path (asyncio.to_thread) shares one
+GIL; the process pool should scale with workers up to the number of cores.
+
+Usage: python benchmarks/bench_worker_pool.py --requests 2000 --concurrency 32 --workers 1 2 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pricing_model.predict import price_profiles
+from pricing_model.worker_pool import PricingWorkerPool
+from benchmarks.common import random_profiles
+
+async def drive(price_one, profiles: list, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(profile):
+        async with semaphore:
+            await price_one(profile)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(p) for p in profiles))
+    return len(profiles) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000, help="Single-profile quotes per configuration")
+    parser.add_argument('--concurrency', type=int, default=32, help="Requests in flight")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count()], help="Pool sizes to test")
+    args = parser.parse_args()
+
+    # Off-grid postcodes so every quote runs live inference rather than a grid lookup
+    profiles = random_profiles(args.requests)
+    results = {}
+
+    price_profiles(profiles[:1])  # warm the in-process model
+    results["asyncio.to_thread (1 process)"] = asyncio.run(
+        drive(lambda p: asyncio.to_thread(price_profiles, [p]), profiles, args.concurrency)
+    )
+
+    for workers in sorted(set(args.workers)):
+        pool = PricingWorkerPool(workers)
+        pool.start()
+        results[f"process pool ({workers} workers)"] = asyncio.run(drive(pool.price_one, profiles, args.concurrency))
+        pool.shutdown()
+
+    baseline = results["asyncio.to_thread (1 process)"]
+    print("\n" + "="*60)
+    print("          CONCURRENT PRICING THROUGHPUT")
+    print("="*60)
+    print(f"Requests: {args.requests}, concurrency: {args.concurrency}, cores: {os.cpu_count()}")
+    for name, throughput in results.items():
+        print(f"{name:<32} {throughput:>8.0f} quotes/s   ({throughput / baseline:.2f}x)")
+    print("="*60)
+
+if __name__ == "__main__":
+    main()
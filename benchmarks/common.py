@@ -0,0 +1,19 @@
+import numpy as np
+
+def random_profiles(n: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            'age': int(rng.integers(18, 81)),
+            'postcode_risk': float(rng.uniform(0, 1)),
+            'vehicle_group': int(rng.integers(1, 51)),
+            'claims_count': int(rng.integers(0, 6)),
+            'ncb_years': int(rng.integers(0, 11))
+        }
+        for _ in range(n)
+    ]
+
+def synthetic_quotes_db(path: str, n_rows: int, chunk_size: int = 1_000_000, seed: int = 0):
+    """Writes an n_rows quotes table with the (vectorized, chunked) quote generator."""
+    from data_generation.generate_quotes import generate_quotes
+    generate_quotes(n_rows, seed=seed, db_path=path, chunk_size=chunk_size)
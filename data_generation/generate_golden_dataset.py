@@ -0,0 +1,175 @@
+"""
+Generates a large labeled golden dataset for evaluation/eval_pipeline.py from the pricing model.
+
+Profiles are stratified over the underwriting guideline bands: every combination
+of age, postcode risk, vehicle group, claims and NCB band is a stratum, and case k
+is drawn uniformly from stratum k mod n_strata, so any contiguous or round-robin
+slice of the cases covers the rating space evenly. All cases are priced in batches;
+each case's label comes from the model and the guideline files:
+  * expected_key_driver: the feature with the largest |SHAP| value;
+  * required_concepts: for the TOP_DRIVERS largest |SHAP| features, a concept quoted
+    from the guideline rule covering the profile's value. Values no rule covers
+    (postcode risk 0.2-0.8, 4 years NCB) are still sampled but require no concept.
+    Rules are located in data/guidelines/ by a phrase from their text and must
+    contain their concept verbatim, so an edited guideline fails generation instead
+    of silently mislabeling cases, and the concept is wording a grounded explanation
+    can actually use (eval_pipeline.py falls back to matching its words).
+
+The output is deterministic for a given seed and model version.
+
+Usage: python data_generation/generate_golden_dataset.py --cases 5000 [--seed 42]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import numpy as np
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from pricing_model.predict import price_profiles
+
+GUIDELINES_DIR = "data/guidelines"
+GOLDEN_OUTPUT = "evaluation/golden_dataset_generated.json"
+# Drivers whose guideline concepts a good explanation must cover
+TOP_DRIVERS = 3
+PRICING_BATCH = 10_000
+
+# Per feature: guideline file and its bands as (low, high inclusive, phrase locating the
+# rule in the file, concept quoted from that rule). Bands no rule covers have None for
+# both. postcode_risk bands are in hundredths.
+GUIDELINE_BANDS = {
+    'age': ("age_policy.txt", [
+        (18, 20, "under 21", "high risk"),
+        (21, 25, "aged 21-25", "medium risk"),
+        (26, 60, "aged 26-60", "low risk"),
+        (61, 80, "over 60", "medical risks")
+    ]),
+    'postcode_risk': ("postcode_risk.txt", [
+        (0, 19, "Risk < 0.2", "Safe rural area"),
+        (20, 80, None, None),
+        (81, 100, "Risk > 0.8", "accident-prone area")
+    ]),
+    'vehicle_group': ("vehicle_group.txt", [
+        (1, 10, "Groups 1-10", "Economy cars"),
+        (11, 30, "Groups 11-30", "Family cars"),
+        (31, 50, "Groups 31-50", "performance cars")
+    ]),
+    'claims_count': ("claims_count.txt", [
+        (0, 0, "0 claims", "Standard base premium"),
+        (1, 1, "1 claim", "15% surcharge"),
+        (2, 5, "2+ claims", "40% surcharge")
+    ]),
+    'ncb_years': ("ncb_policy.txt", [
+        (0, 0, "0 years NCB", "No discount"),
+        (1, 3, "1-3 years NCB", "10-20% discount"),
+        (4, 4, None, None),
+        (5, 10, "5+ years NCB", "50% discount")
+    ])
+}
+
+QUERIES = {
+    'high': ["Why is my premium so high?", "Explain the high premium amount.", "What is pushing my price up?"],
+    'low': ["Why is my premium so low?", "Why am I getting such a good price?", "What is keeping my premium down?"],
+    'mid': ["What is the primary factor driving my price?", "Please explain my insurance premium.",
+            "How was my premium calculated?"]
+}
+
+def load_guideline_rules(guidelines_dir: str = GUIDELINES_DIR) -> dict:
+    """Per feature, per band: the 'file#rule' source of the guideline rule matching the band's phrase (None if uncovered)."""
+    sources = {}
+    for feature, (filename, bands) in GUIDELINE_BANDS.items():
+        with open(os.path.join(guidelines_dir, filename), 'r') as f:
+            lines = [line.strip() for line in f]
+        sources[feature] = []
+        for _, _, phrase, concept in bands:
+            if phrase is None:
+                sources[feature].append(None)
+                continue
+            rule = next((line for line in lines if phrase in line and line[:1].isdigit()), None)
+            if rule is None:
+                raise ValueError(f"No rule in {filename} contains '{phrase}'; update GUIDELINE_BANDS.")
+            if concept not in rule:
+                raise ValueError(f"Rule '{rule}' in {filename} doesn't contain the concept '{concept}'; update GUIDELINE_BANDS.")
+            sources[feature].append(f"{filename}#{rule.split('.', 1)[0]}")
+    return sources
+
+def band_of(feature: str, value: float) -> int:
+    bands = GUIDELINE_BANDS[feature][1]
+    scaled = round(value * 100) if feature == 'postcode_risk' else value
+    for i, (low, high, _, _) in enumerate(bands):
+        if low <= scaled <= high:
+            return i
+    raise ValueError(f"{feature}={value} is outside every guideline band.")
+
+def stratified_profiles(n_cases: int, seed: int = 42) -> list:
+    """n_cases profiles; case k is drawn from stratum k mod n_strata (strata in a fixed order)."""
+    features = list(GUIDELINE_BANDS)
+    strata = list(itertools.product(*(range(len(GUIDELINE_BANDS[f][1])) for f in features)))
+    rng = np.random.default_rng(seed)
+    stratum_of_case = np.arange(n_cases) % len(strata)
+    profiles = []
+    for k in range(n_cases):
+        profile = {}
+        for feature, band in zip(features, strata[stratum_of_case[k]]):
+            low, high = GUIDELINE_BANDS[feature][1][band][:2]
+            value = int(rng.integers(low, high + 1))
+            profile[feature] = value / 100 if feature == 'postcode_risk' else value
+        profiles.append(profile)
+    return profiles
+
+def generate_golden_dataset(n_cases: int = 5000, seed: int = 42, output_path: str = GOLDEN_OUTPUT,
+                            guidelines_dir: str = GUIDELINES_DIR) -> list:
+    start = time.time()
+    sources = load_guideline_rules(guidelines_dir)
+    profiles = stratified_profiles(n_cases, seed)
+    priced = []
+    for lo in range(0, len(profiles), PRICING_BATCH):
+        priced += price_profiles(profiles[lo:lo + PRICING_BATCH])
+
+    premiums = np.array([p['predicted_premium'] for p in priced])
+    low_cut, high_cut = np.percentile(premiums, [33.3, 66.7]) if len(premiums) else (0.0, 0.0)
+    rng = np.random.default_rng([seed, 1])
+    cases = []
+    for case_id, (profile, result) in enumerate(zip(profiles, priced), start=1):
+        shap = result['shap_values']
+        drivers = sorted(shap, key=lambda f: abs(shap[f]), reverse=True)
+        bands = {f: band_of(f, profile[f]) for f in GUIDELINE_BANDS}
+        covered = [f for f in drivers[:TOP_DRIVERS] if f in bands and sources[f][bands[f]] is not None]
+        tier = 'high' if result['predicted_premium'] >= high_cut else 'low' if result['predicted_premium'] <= low_cut else 'mid'
+        cases.append({
+            "id": case_id,
+            "profile": profile,
+            "query": QUERIES[tier][int(rng.integers(len(QUERIES[tier])))],
+            "expected_key_driver": drivers[0],
+            "required_concepts": [GUIDELINE_BANDS[f][1][bands[f]][3] for f in covered],
+            "guideline_sources": [sources[f][bands[f]] for f in covered],
+            "stratum": "|".join(f"{f}:{GUIDELINE_BANDS[f][1][b][0]}-{GUIDELINE_BANDS[f][1][b][1]}" for f, b in bands.items()),
+            "predicted_premium": result['predicted_premium'],
+            "model_version": result['model_version']
+        })
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(cases, f, indent=1)
+    os.replace(tmp_path, output_path)
+
+    n_strata = len(set(c['stratum'] for c in cases))
+    drivers = {}
+    for c in cases:
+        drivers[c['expected_key_driver']] = drivers.get(c['expected_key_driver'], 0) + 1
+    print(f"Generated {len(cases):,} golden cases over {n_strata} strata in {time.time() - start:.1f}s -> {output_path}")
+    print("Key drivers: " + ", ".join(f"{f} {n:,}" for f, n in sorted(drivers.items(), key=lambda x: -x[1])))
+    return cases
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a stratified, model-labeled golden dataset.")
+    parser.add_argument('--cases', type=int, default=5000, help="Number of cases")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=GOLDEN_OUTPUT, help="JSON file read by eval_pipeline.py --dataset")
+    args = parser.parse_args()
+
+    generate_golden_dataset(args.cases, args.seed, args.output)
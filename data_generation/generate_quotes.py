@@ -1,32 +1,125 @@
-import sqlite3
+"""
+Synthetic quote generator.
+
+Quotes are generated in fixed-size chunks, each from its own seeded RNG stream, so
+the output depends only on (seed, chunk_size, n_samples) - not on how many worker
+processes produce the chunks - and memory stays bounded at any row count. Chunk 0
+uses the legacy np.random.seed(seed) stream, so the default 1500-row table is
+identical to the one the original row-by-row generator wrote.
+
+Usage:
+    python data_generation/generate_quotes.py                             # 1500 quotes
+    python data_generation/generate_quotes.py --rows 100000000 --workers 8 --db /data/load_test.db
+    python data_generation/generate_quotes.py --verify                    # check against the reference formula
+"""
 import pandas as pd
 import numpy as np
+import argparse
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from database.store import QuoteStore, QUOTE_COLUMNS
+
+DB_PATH = 'database/quotes.db'
+DEFAULT_SEED = 42
+CHUNK_SIZE = 1_000_000
+
+def calculate_premiums(ages, postcode_risk, vehicle_groups, claims_counts, ncb_years) -> np.ndarray:
+    """Hidden pricing formula, vectorized over arrays of rating factors."""
+    base_rate = 500
+
+    # Age effect
+    age_factor = np.select([ages < 21, ages < 26, ages > 65], [1.5, 1.2, 1.15], 1.0)
+
+    # Vehicle group effect
+    vehicle_factor = 1.0 + (vehicle_groups - 1) * 0.05
+
+    # Postcode risk effect
+    postcode_factor = 1.0 + (postcode_risk - 0.5) * 0.4
+
+    # Claims effect
+    claims_factor = 1.0 + claims_counts * 0.2
+
+    # NCB effect
+    ncb_factor = np.maximum(0.5, 1.0 - ncb_years * 0.05)
+
+    premium = base_rate * age_factor * vehicle_factor * postcode_factor * claims_factor * ncb_factor
+
+    # np.round scales by 100 first, which can land a value within an ulp of .5 on the
+    # other side from Python's round(); settle those rare cases with round() itself
+    rounded = np.round(premium, 2)
+    cents = premium * 100
+    near_half = np.flatnonzero(np.abs(cents - np.floor(cents) - 0.5) < 1e-6)
+    rounded[near_half] = [round(float(p), 2) for p in premium[near_half]]
+    return rounded
+
+def chunk_rng(seed: int, chunk: int) -> np.random.RandomState:
+    if chunk == 0:
+        return np.random.RandomState(seed)
+    # Independent stream per chunk, reproducible from (seed, chunk) alone
+    return np.random.RandomState(np.random.MT19937(np.random.SeedSequence(seed, spawn_key=(chunk,))))
+
+def generate_chunk(seed: int, chunk: int, n: int) -> tuple:
+    """Columns of one chunk, in QUOTE_COLUMNS order."""
+    rng = chunk_rng(seed, chunk)
 
-def generate_quotes(n_samples=1500):
-    np.random.seed(42)
-    
     # Generate random features
-    ages = np.random.randint(18, 80, n_samples)
-    postcode_risk = np.random.uniform(0, 1, n_samples)
-    vehicle_groups = np.random.randint(1, 51, n_samples)
-    claims_counts = np.random.randint(0, 6, n_samples)
-    ncb_years = np.random.randint(0, 11, n_samples)
-    
-    # Create DataFrame
+    ages = rng.randint(18, 80, n)
+    postcode_risk = rng.uniform(0, 1, n)
+    vehicle_groups = rng.randint(1, 51, n)
+    claims_counts = rng.randint(0, 6, n)
+    ncb_years = rng.randint(0, 11, n)
+
+    premium = calculate_premiums(ages, postcode_risk, vehicle_groups, claims_counts, ncb_years)
+    return ages, postcode_risk, vehicle_groups, claims_counts, ncb_years, premium
+
+def _chunk_rows(columns: tuple):
+    return zip(*(column.tolist() for column in columns))
+
+def iter_chunks(n_samples: int, seed: int = DEFAULT_SEED, chunk_size: int = CHUNK_SIZE, workers: int = 1):
+    """Yields the chunks' columns in order, produced by `workers` processes when > 1."""
+    sizes = [min(chunk_size, n_samples - start) for start in range(0, n_samples, chunk_size)]
+    if workers <= 1:
+        for chunk, n in enumerate(sizes):
+            yield generate_chunk(seed, chunk, n)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # A bounded window of chunks in flight keeps memory flat while the writer catches up
+        pending = []
+        for chunk, n in enumerate(sizes):
+            pending.append(pool.submit(generate_chunk, seed, chunk, n))
+            if len(pending) >= 2 * workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+def generate_quotes(n_samples=1500, seed=DEFAULT_SEED, db_path=DB_PATH, chunk_size=CHUNK_SIZE, workers=1):
+    start = time.time()
+
+    # Each chunk is inserted with executemany in its own transaction; indexes are built after the load
+    store = QuoteStore(db_path)
+    store.replace_quotes(_chunk_rows(columns) for columns in iter_chunks(n_samples, seed, chunk_size, workers))
+    store.close()
+
+    print(f"Generated {n_samples} quotes and saved to {db_path} in {time.time() - start:.1f}s")
+
+def reference_quotes(n_samples=1500, seed=DEFAULT_SEED) -> pd.DataFrame:
+    """The original row-by-row generator, kept as the reference for --verify."""
+    np.random.seed(seed)
     df = pd.DataFrame({
-        'age': ages,
-        'postcode_risk': postcode_risk,
-        'vehicle_group': vehicle_groups,
-        'claims_count': claims_counts,
-        'ncb_years': ncb_years
+        'age': np.random.randint(18, 80, n_samples),
+        'postcode_risk': np.random.uniform(0, 1, n_samples),
+        'vehicle_group': np.random.randint(1, 51, n_samples),
+        'claims_count': np.random.randint(0, 6, n_samples),
+        'ncb_years': np.random.randint(0, 11, n_samples)
     })
-    
-    # Hidden pricing formula
+
     def calculate_premium(row):
-        base_rate = 500
-        
-        # Age effect
         if row['age'] < 21:
             age_factor = 1.5
         elif row['age'] < 26:
@@ -35,31 +128,36 @@ def generate_quotes(n_samples=1500):
             age_factor = 1.15
         else:
             age_factor = 1.0
-            
-        # Vehicle group effect
         vehicle_factor = 1.0 + (row['vehicle_group'] - 1) * 0.05
-        
-        # Postcode risk effect
         postcode_factor = 1.0 + (row['postcode_risk'] - 0.5) * 0.4
-        
-        # Claims effect
         claims_factor = 1.0 + row['claims_count'] * 0.2
-        
-        # NCB effect
         ncb_factor = max(0.5, 1.0 - row['ncb_years'] * 0.05)
-        
-        premium = base_rate * age_factor * vehicle_factor * postcode_factor * claims_factor * ncb_factor
+        premium = 500 * age_factor * vehicle_factor * postcode_factor * claims_factor * ncb_factor
         return round(premium, 2)
-    
+
     df['premium'] = df.apply(calculate_premium, axis=1)
-    
-    # Save to SQLite
-    os.makedirs('database', exist_ok=True)
-    conn = sqlite3.connect('database/quotes.db')
-    df.to_sql('quotes', conn, if_exists='replace', index=False)
-    conn.close()
-    
-    print(f"Generated {n_samples} quotes and saved to database/quotes.db")
+    return df
+
+def verify_reference(n_samples=1500, seed=DEFAULT_SEED) -> int:
+    """Number of rows where the chunked generator differs from the reference (single chunk)."""
+    expected = reference_quotes(n_samples, seed)
+    actual = pd.DataFrame(dict(zip(QUOTE_COLUMNS, generate_chunk(seed, 0, n_samples))))
+    return int((expected[QUOTE_COLUMNS] != actual[QUOTE_COLUMNS]).any(axis=1).sum())
 
 if __name__ == "__main__":
-    generate_quotes()
+    parser = argparse.ArgumentParser(description="Generate synthetic insurance quotes into SQLite.")
+    parser.add_argument('--rows', type=int, default=1500, help="Number of quotes")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="RNG seed")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database to (re)create the quotes table in")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows generated and inserted per transaction")
+    parser.add_argument('--workers', type=int, default=1, help="Processes generating chunks")
+    parser.add_argument('--verify', action='store_true', help="Compare --rows against the reference generator instead of writing")
+    args = parser.parse_args()
+
+    if args.verify:
+        mismatches = verify_reference(args.rows, args.seed)
+        if mismatches:
+            raise AssertionError(f"Generator deviates from the reference formula on {mismatches}/{args.rows} rows")
+        print(f"Generator parity: {args.rows}/{args.rows} rows identical to the reference")
+    else:
+        generate_quotes(args.rows, args.seed, args.db, args.chunk_size, args.workers)
@@ -0,0 +1,181 @@
+"""
+Columnar copy of the quotes table as a partitioned Parquet dataset.
+
+Quotes are exported in rowid blocks of PARTITION_ROWS (hive partitions
+`block=00000/`, ...) with narrow column types and row groups small enough for
+predicate pushdown on the rating factors. The table is append-only, so a sync only
+rewrites the last, partial block and adds new ones; a manifest records the rowid
+exported through and a fingerprint of the first rows, which changes when the table
+is regenerated and triggers a full re-export.
+
+Readers scan the dataset through Arrow with the files memory-mapped, reading only the
+requested columns and only the row groups a filter can match.
+
+Usage: python database/quotes_dataset.py [--db database/quotes.db] [--full]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from database.store import get_store, DB_PATH, QUOTE_COLUMNS
+
+QUOTES_DATASET_DIR = os.getenv("QUOTES_DATASET_DIR", "database/quotes_parquet")
+MANIFEST_FILE = "_manifest.json"
+PARTITION_ROWS = 1_000_000
+ROW_GROUP_ROWS = 128 * 1024
+FINGERPRINT_ROWS = 1000
+
+SCHEMA = pa.schema([
+    ('rowid', pa.int64()),
+    ('age', pa.int16()),
+    ('postcode_risk', pa.float64()),
+    ('vehicle_group', pa.int16()),
+    ('claims_count', pa.int8()),
+    ('ncb_years', pa.int8()),
+    ('premium', pa.float64())
+])
+_SELECT_AFTER = f"SELECT rowid, {', '.join(QUOTE_COLUMNS)} FROM quotes WHERE rowid > ? AND rowid <= ? ORDER BY rowid"
+
+def _fingerprint(db_path: str, n_rows: int) -> str:
+    rows = get_store(db_path).fetch_all(_SELECT_AFTER, (0, n_rows))
+    return hashlib.sha256(repr(rows).encode()).hexdigest()[:16]
+
+def read_manifest(dataset_dir: str = QUOTES_DATASET_DIR) -> dict:
+    path = os.path.join(dataset_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def _block_dir(dataset_dir: str, block: int) -> str:
+    return os.path.join(dataset_dir, f"block={block:05d}")
+
+def _export_block(db_path: str, dataset_dir: str, block: int, batch_size: int) -> int:
+    """(Re)writes one rowid block; returns its row count."""
+    lo, hi = block * PARTITION_ROWS, (block + 1) * PARTITION_ROWS
+    block_dir = _block_dir(dataset_dir, block)
+    os.makedirs(block_dir, exist_ok=True)
+    # Dot-prefixed until complete, so concurrent readers skip it
+    tmp_path = os.path.join(block_dir, ".part-0.parquet.tmp")
+    n_rows = 0
+    with pq.ParquetWriter(tmp_path, SCHEMA, compression='snappy') as writer:
+        for rows in get_store(db_path).iter_batches(_SELECT_AFTER, (lo, hi), batch_size):
+            block_rows = np.asarray(rows, dtype=np.float64)
+            writer.write_table(
+                pa.Table.from_arrays(
+                    [pa.array(block_rows[:, i].astype(field.type.to_pandas_dtype())) for i, field in enumerate(SCHEMA)],
+                    schema=SCHEMA
+                ),
+                row_group_size=ROW_GROUP_ROWS
+            )
+            n_rows += len(rows)
+    os.replace(tmp_path, os.path.join(block_dir, "part-0.parquet"))
+    return n_rows
+
+def sync_quotes(db_path: str = DB_PATH, dataset_dir: str = QUOTES_DATASET_DIR, full: bool = False,
+                batch_size: int = ROW_GROUP_ROWS, verbose: bool = True) -> dict:
+    """Brings the Parquet dataset up to date with the quotes table; returns the manifest."""
+    store = get_store(db_path)
+    max_rowid = store.scalar("SELECT MAX(rowid) FROM quotes") or 0
+    manifest = read_manifest(dataset_dir)
+    # Rows already exported must be unchanged; a regenerated table differs in its first rows
+    stale = not manifest or manifest['fingerprint'] != _fingerprint(db_path, manifest['fingerprint_rows'])
+
+    if full or stale or max_rowid < manifest.get('exported_through', 0):
+        # New or regenerated table: start over
+        shutil.rmtree(dataset_dir, ignore_errors=True)
+        manifest = {}
+    exported_through = manifest.get('exported_through', 0)
+    if manifest and max_rowid == exported_through:
+        return manifest
+
+    start = time.time()
+    os.makedirs(dataset_dir, exist_ok=True)
+    # The block holding exported_through may be partial, so it is rewritten too
+    first_block = exported_through // PARTITION_ROWS
+    last_block = max(max_rowid - 1, 0) // PARTITION_ROWS
+    exported = sum(_export_block(db_path, dataset_dir, block, batch_size) for block in range(first_block, last_block + 1))
+
+    manifest = {
+        'db_path': os.path.abspath(db_path),
+        'fingerprint': _fingerprint(db_path, min(FINGERPRINT_ROWS, max_rowid)),
+        'fingerprint_rows': min(FINGERPRINT_ROWS, max_rowid),
+        'exported_through': max_rowid,
+        'partition_rows': PARTITION_ROWS,
+        'synced_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    tmp_path = os.path.join(dataset_dir, MANIFEST_FILE + ".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(dataset_dir, MANIFEST_FILE))
+    if verbose:
+        print(f"Quotes dataset: wrote {exported:,} rows in blocks {first_block}-{last_block} "
+              f"to {dataset_dir} in {time.time() - start:.1f}s")
+    return manifest
+
+def quotes_dataset(dataset_dir: str = QUOTES_DATASET_DIR) -> ds.Dataset:
+    # Memory-mapped reads: column chunks are decoded straight from the page cache
+    return ds.dataset(
+        dataset_dir,
+        schema=SCHEMA,
+        format='parquet',
+        partitioning='hive',
+        filesystem=pafs.LocalFileSystem(use_mmap=True),
+        exclude_invalid_files=False,
+        ignore_prefixes=['_', '.']
+    )
+
+def column_range(column: str, dataset_dir: str = QUOTES_DATASET_DIR) -> tuple:
+    """(min, max) of a column from the Parquet row-group statistics, without decoding its values."""
+    lo, hi = np.inf, -np.inf
+    for fragment in quotes_dataset(dataset_dir).get_fragments():
+        metadata = fragment.metadata
+        index = metadata.schema.names.index(column)
+        for i in range(metadata.num_row_groups):
+            stats = metadata.row_group(i).column(index).statistics
+            if stats is None or not stats.has_min_max:
+                # Written without statistics: fall back to reading this file's column
+                values = fragment.to_table(columns=[column]).column(column).to_numpy()
+                if len(values):
+                    lo, hi = min(lo, float(values.min())), max(hi, float(values.max()))
+                break
+            lo, hi = min(lo, float(stats.min)), max(hi, float(stats.max))
+    return (lo, hi) if lo <= hi else (None, None)
+
+def read_quotes(columns: list = None, filter=None, dataset_dir: str = QUOTES_DATASET_DIR,
+                db_path: str = DB_PATH, sync: bool = True) -> pa.Table:
+    """
+    Quotes as an Arrow table in rowid order, reading only `columns` (default: all of
+    QUOTE_COLUMNS) and the row groups that can satisfy `filter`, an Arrow expression
+    such as ds.field('age') < 25. Syncs from SQLite first unless sync=False.
+    """
+    if sync:
+        sync_quotes(db_path, dataset_dir, verbose=False)
+    columns = list(columns or QUOTE_COLUMNS)
+    table = quotes_dataset(dataset_dir).to_table(columns=columns + ['rowid'], filter=filter)
+    # Fragments are read in block order; sort only if a reordering ever slips through
+    rowid = table.column('rowid').to_numpy()
+    if len(rowid) > 1 and not np.all(rowid[1:] > rowid[:-1]):
+        table = table.sort_by('rowid')
+    return table.select(columns)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export / sync the quotes table to a partitioned Parquet dataset.")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database with the quotes table")
+    parser.add_argument('--dataset-dir', default=QUOTES_DATASET_DIR, help="Output dataset directory")
+    parser.add_argument('--full', action='store_true', help="Re-export everything instead of syncing new rows")
+    args = parser.parse_args()
+
+    manifest = sync_quotes(args.db, args.dataset_dir, full=args.full)
+    print(f"Quotes dataset up to date through rowid {manifest['exported_through']:,}")
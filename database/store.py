@@ -0,0 +1,287 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+DB_PATH = 'database/quotes.db'
+# Read connections kept open per store; readers beyond this wait for one to be returned
+QUOTE_STORE_READERS = int(os.getenv("QUOTE_STORE_READERS", "8"))
+# Seconds a statement waits on a lock held by another connection before failing
+QUOTE_STORE_BUSY_TIMEOUT = float(os.getenv("QUOTE_STORE_BUSY_TIMEOUT", "5"))
+# Prepared statements kept per connection (sqlite3 reuses them for identical SQL text)
+STATEMENT_CACHE_SIZE = 256
+FETCH_BATCH_SIZE = 100_000
+
+QUOTE_COLUMNS = ['age', 'postcode_risk', 'vehicle_group', 'claims_count', 'ncb_years', 'premium']
+RATING_FACTORS = QUOTE_COLUMNS[:-1]
+SELECT_QUOTES = f"SELECT {', '.join(QUOTE_COLUMNS)} FROM quotes"
+INSERT_QUOTE = f"INSERT INTO quotes ({', '.join(QUOTE_COLUMNS)}) VALUES ({', '.join('?' * len(QUOTE_COLUMNS))})"
+# replace_quotes loads here, then renames it over quotes
+STAGING_TABLE = "quotes_staging"
+
+# WAL lets readers run alongside the single writer; NORMAL sync is durable across
+# application crashes (an OS crash can lose only the last commits), and the page cache
+# and memory map keep the hot quotes pages out of the read() path.
+PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'cache_size': '-65536',        # KiB, i.e. 64MB per connection
+    'mmap_size': '268435456',      # 256MB
+    'temp_store': 'MEMORY'
+}
+
+QUOTES_TABLE = """CREATE TABLE IF NOT EXISTS {name} (
+        age INTEGER,
+        postcode_risk REAL,
+        vehicle_group INTEGER,
+        claims_count INTEGER,
+        ncb_years INTEGER,
+        premium REAL
+    )"""
+
+TABLES = [
+    QUOTES_TABLE.format(name="quotes"),
+    """CREATE TABLE IF NOT EXISTS telemetry (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        request_id TEXT,
+        endpoint TEXT,
+        total_latency_ms REAL,
+        pricing_latency_ms REAL,
+        guidelines_latency_ms REAL,
+        similarity_latency_ms REAL,
+        llm_latency_ms REAL,
+        status TEXT,
+        input_data TEXT
+    )""",
+    # One DDSketch of stage latencies per bucket (see observability/latency_rollups.py)
+    """CREATE TABLE IF NOT EXISTS latency_rollups (
+        resolution INTEGER NOT NULL,
+        endpoint TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        bucket_start INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        sketch BLOB NOT NULL,
+        PRIMARY KEY (resolution, endpoint, stage, bucket_start)
+    ) WITHOUT ROWID""",
+    # Premium DDSketch per rating cohort, and the last quote folded in (see mcp_server/cohort_stats.py)
+    """CREATE TABLE IF NOT EXISTS quote_cohorts (
+        age_band INTEGER NOT NULL,
+        vehicle_band INTEGER NOT NULL,
+        claims_band INTEGER NOT NULL,
+        ncb_band INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        sketch BLOB NOT NULL,
+        PRIMARY KEY (age_band, vehicle_band, claims_band, ncb_band)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS quote_cohorts_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        through_rowid INTEGER NOT NULL
+    )"""
+]
+
+# Covering indexes: lookups by rating factors (exact or banded, leading with age or
+# vehicle group) are answered from the index alone, including the premium.
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_quotes_age_cover ON quotes (age, vehicle_group, claims_count, ncb_years, postcode_risk, premium)",
+    "CREATE INDEX IF NOT EXISTS idx_quotes_vehicle_cover ON quotes (vehicle_group, claims_count, ncb_years, age, postcode_risk, premium)",
+    "CREATE INDEX IF NOT EXISTS idx_telemetry_timestamp ON telemetry (timestamp)"
+]
+
+class QuoteStore:
+    """
+    Shared access to the quotes database.
+
+    Reads go through a pool of long-lived read-only connections, so a query pays
+    neither the connect nor the schema parse, and each connection keeps its prepared
+    statements and page cache warm. Writes are serialized on one connection inside
+    explicit transactions. Results are plain tuples (or a float64 array) rather than
+    DataFrames; callers that want pandas build one themselves.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, readers: int = QUOTE_STORE_READERS):
+        self.db_path = db_path
+        self.readers = max(1, readers)
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._pool_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._writer = None
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._writer = self._connect(read_only=False)
+        # Only takes effect on a new, empty file: lets vacuum() release deleted pages without a full rewrite
+        self._writer.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        # Persistent in the file (and not allowed inside a transaction): later connections inherit it
+        self._writer.execute("PRAGMA journal_mode = WAL")
+        self.ensure_schema()
+
+    def _connect(self, read_only: bool) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=QUOTE_STORE_BUSY_TIMEOUT,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        for name, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        if read_only:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    @contextmanager
+    def reader(self):
+        """Borrows a pooled read connection for the duration of the block."""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                can_open = self._opened < self.readers
+                if can_open:
+                    self._opened += 1
+            conn = self._connect(read_only=True) if can_open else self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def _writer_connection(self) -> sqlite3.Connection:
+        # Callers hold _write_lock; reopened lazily after close()
+        if self._writer is None:
+            self._writer = self._connect(read_only=False)
+        return self._writer
+
+    @contextmanager
+    def transaction(self):
+        """The writer connection inside BEGIN IMMEDIATE ... COMMIT (rolled back on error)."""
+        with self._write_lock:
+            conn = self._writer_connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def ensure_schema(self, indexes: bool = True):
+        """Creates missing tables (and indexes); refreshes planner statistics when an index was added."""
+        with self.transaction() as conn:
+            self._create_schema(conn, indexes)
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection, indexes: bool = True):
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        for statement in TABLES + (INDEXES if indexes else []):
+            conn.execute(statement)
+        created = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")} - existing
+        if created:
+            # Sampled statistics are enough for the planner and take milliseconds on any table size
+            conn.execute("PRAGMA analysis_limit = 1000")
+            conn.execute("ANALYZE")
+
+    # --- Reads ---
+
+    def fetch_all(self, sql: str, params: tuple = ()) -> list:
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def fetch_one(self, sql: str, params: tuple = ()):
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def scalar(self, sql: str, params: tuple = ()):
+        row = self.fetch_one(sql, params)
+        return row[0] if row else None
+
+    def iter_batches(self, sql: str, params: tuple = (), batch_size: int = FETCH_BATCH_SIZE):
+        """Yields lists of up to batch_size rows; the connection is held until the generator finishes."""
+        with self.reader() as conn:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+    def fetch_array(self, sql: str, params: tuple = (), n_columns: int = None, batch_size: int = FETCH_BATCH_SIZE) -> np.ndarray:
+        """All rows of a numeric query as one float64 matrix, converted batch by batch."""
+        chunks = [np.asarray(rows, dtype=np.float64) for rows in self.iter_batches(sql, params, batch_size)]
+        if not chunks:
+            return np.empty((0, n_columns or 0))
+        return np.vstack(chunks)
+
+    # --- Writes ---
+
+    def execute(self, sql: str, params: tuple = ()) -> int:
+        with self.transaction() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def executemany(self, sql: str, rows) -> int:
+        with self.transaction() as conn:
+            return conn.executemany(sql, rows).rowcount
+
+    def replace_quotes(self, batches):
+        """
+        Recreates the quotes table from an iterable of row batches. The rows are loaded
+        into a staging table, which is swapped in (and indexed) in one transaction, so
+        readers see either the old quotes or all of the new ones; a failed load leaves
+        the old quotes in place. Indexing after the load is much faster than
+        maintaining the indexes row by row.
+        """
+        insert = INSERT_QUOTE.replace("INTO quotes", f"INTO {STAGING_TABLE}", 1)
+        with self.transaction() as conn:
+            conn.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+            conn.execute(QUOTES_TABLE.format(name=STAGING_TABLE))
+        for rows in batches:
+            self.executemany(insert, rows)
+        with self.transaction() as conn:
+            conn.execute("DROP TABLE quotes")
+            conn.execute(f"ALTER TABLE {STAGING_TABLE} RENAME TO quotes")
+            # Aggregates over the old rows are stale; they are rebuilt on the next refresh
+            conn.execute("DROP TABLE IF EXISTS quote_cohorts")
+            conn.execute("DROP TABLE IF EXISTS quote_cohorts_state")
+            self._create_schema(conn)
+
+    def vacuum(self, full: bool = False):
+        """
+        Returns free pages to the filesystem. Incremental when the file was created with
+        auto_vacuum (cheap); otherwise only a full VACUUM can shrink it, which rewrites the
+        whole database, so it only runs with full=True. Either way the WAL is truncated.
+        """
+        with self._write_lock:
+            conn = self._writer_connection()
+            if full:
+                conn.execute("VACUUM")
+            elif conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                conn.execute("PRAGMA incremental_vacuum").fetchall()
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+    def close(self):
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._pool_lock:
+            self._opened = 0
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+def get_store(db_path: str = DB_PATH) -> QuoteStore:
+    """One store per database and process (connections must not cross a fork)."""
+    key = (os.path.abspath(db_path), os.getpid())
+    store = _STORES.get(key)
+    if store is None:
+        with _STORES_LOCK:
+            store = _STORES.get(key)
+            if store is None:
+                store = _STORES[key] = QuoteStore(db_path)
+    return store
@@ -1,5 +1,22 @@
+"""
+Runs the golden dataset through the baseline and/or optimized pipeline and reports
+key-driver accuracy, concept coverage and latency (plus LLM-judge scores).
+
+Large generated suites (data_generation/generate_golden_dataset.py) can be split
+across machines: --shard i/n runs the i-th (1-based) of n contiguous id ranges, which
+is deterministic and, since generated case ids cycle through the rating strata,
+gives every shard of at least n_strata cases every stratum. --merge combines the shard reports into
+one report with the summary recomputed over all cases.
+
+Usage:
+    python evaluation/eval_pipeline.py                                   # both pipelines, hand-written cases
+    python evaluation/eval_pipeline.py --dataset evaluation/golden_dataset_generated.json --pipeline optimized --shard 1/4
+    python evaluation/eval_pipeline.py --merge evaluation/reports/eval_optimized_shard*_*.json
+"""
 import json
 import asyncio
+import argparse
+import hashlib
 import os
 import sys
 import pandas as pd
@@ -11,24 +28,68 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from pipelines.optimized_pipeline import run_optimized_pipeline_async
 from pipelines.baseline_pipeline import run_baseline_pipeline
 
+GOLDEN_DATASET = 'evaluation/golden_dataset.json'
+REPORTS_DIR = 'evaluation/reports'
+
 def normalize_strict(s):
     return "".join(c for c in s.lower() if c.isalnum())
 
-async def run_pipeline_evaluation(pipeline_type: str = "optimized"):
+def parse_shard(spec: str) -> tuple:
+    """'i/n' (1 <= i <= n) -> (i, n)."""
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/n, got '{spec}'.")
+    if not 1 <= index <= count:
+        raise ValueError(f"Shard index must be between 1 and {count}, got {index}.")
+    return index, count
+
+def select_shard(cases: list, shard: tuple = None) -> list:
+    """The i-th of n contiguous, near-equal id ranges; the same cases on every machine."""
+    cases = sorted(cases, key=lambda c: c['id'])
+    if shard is None:
+        return cases
+    index, count = shard
+    return cases[len(cases) * (index - 1) // count:len(cases) * index // count]
+
+def dataset_fingerprint(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+def summarize(pipeline_type: str, results: list) -> dict:
+    valid_results = [r for r in results if "error" not in r]
+    if not valid_results:
+        return {}
+    summary = {
+        "pipeline_type": pipeline_type,
+        "cases": len(results),
+        "errors": len(results) - len(valid_results),
+        "avg_concept_coverage": sum(r['concept_coverage'] for r in valid_results) / len(valid_results),
+        "key_driver_accuracy": sum(1 for r in valid_results if r['driver_match']) / len(valid_results),
+        "avg_latency": sum(r['latency'] for r in valid_results) / len(valid_results)
+    }
+    judged = [r['judge_metrics'] for r in valid_results if "error" not in r.get('judge_metrics', {"error": None})]
+    if judged:
+        for name in ("professionalism", "clarity", "safety"):
+            summary[f"judge_avg_{name}"] = sum(j[name]['score'] for j in judged) / len(judged)
+    return summary
+
+async def run_pipeline_evaluation(pipeline_type: str = "optimized", dataset_path: str = GOLDEN_DATASET, shard: tuple = None):
     """
     Runs pipeline evaluation for a specific architecture and returns results.
     pipeline_type: 'baseline' or 'optimized'
+    shard: (i, n) to run only the i-th of n deterministic shards of the dataset
     """
     # Load golden dataset
-    dataset_path = 'evaluation/golden_dataset.json'
     if not os.path.exists(dataset_path):
         return {"error": f"Golden dataset not found at {dataset_path}"}
         
     with open(dataset_path, 'r') as f:
-        golden_data = json.load(f)
+        golden_data = select_shard(json.load(f), shard)
         
     results = []
-    print(f"\nStarting {pipeline_type} evaluation of {len(golden_data)} test cases...\n")
+    shard_label = f" (shard {shard[0]}/{shard[1]})" if shard else ""
+    print(f"\nStarting {pipeline_type} evaluation of {len(golden_data)} test cases{shard_label}...\n")
     
     for case in golden_data:
         case_id = case['id']
@@ -89,7 +150,7 @@ async def run_pipeline_evaluation(pipeline_type: str = "optimized"):
                     concept_words = set(normalize_keywords(concept))
                     if concept_words.issubset(explanation_words):
                         found_concepts.append(concept)
-                concept_coverage = len(found_concepts) / len(required_concepts)
+                concept_coverage = len(found_concepts) / len(required_concepts) if required_concepts else 1.0
             
             results.append({
                 "case_id": case_id,
@@ -112,27 +173,19 @@ async def run_pipeline_evaluation(pipeline_type: str = "optimized"):
             print(f"  [Case {case_id}] ERROR: {str(e)}")
             
     # Aggregate results
-    valid_results = [r for r in results if "error" not in r]
-    if not valid_results:
+    summary = summarize(pipeline_type, results)
+    if not summary:
         return {"error": f"No valid results for {pipeline_type} pipeline."}
-        
-    avg_coverage = sum(r['concept_coverage'] for r in valid_results) / len(valid_results)
-    driver_accuracy = sum(1 for r in valid_results if r['driver_match']) / len(valid_results)
-    avg_latency = sum(r['latency'] for r in valid_results) / len(valid_results)
-    
-    summary = {
-        "pipeline_type": pipeline_type,
-        "avg_concept_coverage": avg_coverage,
-        "key_driver_accuracy": driver_accuracy,
-        "avg_latency": avg_latency
-    }
     
     # Save results
-    os.makedirs('evaluation/reports', exist_ok=True)
-    report_path = f"evaluation/reports/eval_{pipeline_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    shard_suffix = f"_shard{shard[0]}of{shard[1]}" if shard else ""
+    report_path = f"{REPORTS_DIR}/eval_{pipeline_type}{shard_suffix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
     with open(report_path, 'w') as f:
         json.dump({
             "summary": summary,
+            "dataset": {"path": dataset_path, "fingerprint": dataset_fingerprint(dataset_path)},
+            "shard": list(shard) if shard else None,
             "detailed_results": results
         }, f, indent=2)
     
@@ -143,17 +196,63 @@ async def run_pipeline_evaluation(pipeline_type: str = "optimized"):
     except Exception as e:
         print(f"Could not run LLM judge: {str(e)}")
 
+    with open(report_path, 'r') as f:
+        summary = json.load(f)['summary']
     return {
         "summary": summary,
         "report_path": report_path
     }
 
+def merge_reports(report_paths: list) -> dict:
+    """Combines the shard reports of one run (same pipeline and dataset, distinct shards) into one report."""
+    reports = []
+    for path in report_paths:
+        with open(path, 'r') as f:
+            reports.append(json.load(f))
+    pipelines = {r['summary']['pipeline_type'] for r in reports}
+    datasets = {r.get('dataset', {}).get('fingerprint') for r in reports}
+    if len(pipelines) != 1 or len(datasets) != 1:
+        raise ValueError("Reports come from different pipelines or datasets; merge one run at a time.")
+    shards = [tuple(r['shard']) if r.get('shard') else None for r in reports]
+    if None in shards or len({n for _, n in shards}) != 1 or len(set(shards)) != len(shards):
+        raise ValueError(f"Expected distinct shards i/n of one split, got {shards}.")
+    count = shards[0][1]
+    missing = sorted(set(range(1, count + 1)) - {i for i, _ in shards})
+    if missing:
+        print(f"Warning: merging without shards {missing} of {count}")
+
+    results = sorted((r for report in reports for r in report['detailed_results']), key=lambda r: r['case_id'])
+    pipeline_type = pipelines.pop()
+    merged = {
+        "summary": summarize(pipeline_type, results),
+        "dataset": reports[0].get('dataset'),
+        "shards": sorted(shards),
+        "missing_shards": missing,
+        "detailed_results": results
+    }
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    report_path = f"{REPORTS_DIR}/eval_{pipeline_type}_merged_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(report_path, 'w') as f:
+        json.dump(merged, f, indent=2)
+    return {"summary": merged['summary'], "report_path": report_path}
+
 if __name__ == "__main__":
-    # If run directly, run both for debugging
-    async def run_all():
-        print("Benchmarking Baseline...")
-        await run_pipeline_evaluation("baseline")
-        print("\nBenchmarking Optimized...")
-        await run_pipeline_evaluation("optimized")
-        
-    asyncio.run(run_all())
+    parser = argparse.ArgumentParser(description="Evaluate the explanation pipelines on a golden dataset.")
+    parser.add_argument('--pipeline', choices=['baseline', 'optimized', 'both'], default='both')
+    parser.add_argument('--dataset', default=GOLDEN_DATASET, help="Golden dataset JSON")
+    parser.add_argument('--shard', type=parse_shard, default=None, help="Run only shard i of n, e.g. 2/8")
+    parser.add_argument('--merge', nargs='+', metavar='REPORT', help="Merge shard reports instead of running")
+    args = parser.parse_args()
+
+    if args.merge:
+        merged = merge_reports(args.merge)
+        print(json.dumps(merged['summary'], indent=2))
+        print(f"Merged report written to {merged['report_path']}")
+    else:
+        async def run_all():
+            for pipeline_type in (['baseline', 'optimized'] if args.pipeline == 'both' else [args.pipeline]):
+                print(f"Benchmarking {pipeline_type.capitalize()}...")
+                res = await run_pipeline_evaluation(pipeline_type, args.dataset, args.shard)
+                print(res.get('error') or json.dumps(res['summary'], indent=2))
+            
+        asyncio.run(run_all())
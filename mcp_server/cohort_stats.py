@@ -0,0 +1,252 @@
+"""
+Premium statistics per rating cohort, served to the explanation prompt instead of raw quotes.
+
+A cohort is an age band x vehicle group band x claims band x NCB band. For each one
+the `quote_cohorts` table in quotes.db holds a DDSketch of the premiums (count, sum,
+min/max and quantiles within COHORT_SKETCH_ACCURACY). The quotes table is append-only,
+so a refresh folds only quotes above `quote_cohorts_state.through_rowid` into the
+sketches, in the same transaction that advances it; regenerating the table drops both
+(see QuoteStore.replace_quotes) and the next refresh rebuilds them. A regenerated
+table can end at the same rowid, so serving processes also compare a few sampled
+quotes on every refresh check and reload the summaries when they differ.
+
+Serving processes load the sketches into a dict of ready-made summaries for every
+cohort and every coarser cohort (trailing bands dropped), so a lookup is a dict get.
+Cohorts with fewer than COHORT_MIN_QUOTES quotes fall back to the next coarser one.
+
+Usage: python mcp_server/cohort_stats.py [--rebuild]
+"""
+import os
+import sys
+import time
+import bisect
+import argparse
+import threading
+import numpy as np
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from database.store import get_store, DB_PATH
+from observability.sketch import DDSketch
+
+# How often a lookup may check the table for new quotes (seconds)
+COHORT_REFRESH_SECONDS = float(os.getenv("COHORT_REFRESH_SECONDS", "5"))
+# Smaller cohorts are summarized at the next coarser level instead
+COHORT_MIN_QUOTES = int(os.getenv("COHORT_MIN_QUOTES", "30"))
+COHORT_SKETCH_ACCURACY = 0.005
+COHORT_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+# Quotes folded per transaction on a (re)build
+FOLD_BATCH_ROWS = 1_000_000
+# Quotes re-read on each refresh check; any difference means the table was regenerated
+FINGERPRINT_ROWS = 16
+
+# Band lower bounds; the last band is open-ended
+AGE_BANDS = (17, 25, 35, 50, 65)
+VEHICLE_GROUP_BANDS = (1, 11, 21, 31, 41)
+CLAIMS_BANDS = (0, 1, 2, 3)
+NCB_BANDS = (0, 1, 3, 6, 9)
+# Cohort key order; coarser cohorts drop bands from the end (NCB first, age last)
+COHORT_FACTORS = (('age', AGE_BANDS), ('vehicle_group', VEHICLE_GROUP_BANDS),
+                  ('claims_count', CLAIMS_BANDS), ('ncb_years', NCB_BANDS))
+
+SELECT_NEW_QUOTES = (
+    f"SELECT {', '.join(f for f, _ in COHORT_FACTORS)}, premium FROM quotes "
+    "WHERE rowid > ? AND rowid <= ? ORDER BY rowid"
+)
+SELECT_COHORT = "SELECT sketch FROM quote_cohorts WHERE age_band = ? AND vehicle_band = ? AND claims_band = ? AND ncb_band = ?"
+UPSERT_COHORT = (
+    "INSERT INTO quote_cohorts (age_band, vehicle_band, claims_band, ncb_band, count, sketch) VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (age_band, vehicle_band, claims_band, ncb_band) DO UPDATE SET count = excluded.count, sketch = excluded.sketch"
+)
+UPSERT_STATE = (
+    "INSERT INTO quote_cohorts_state (id, through_rowid) VALUES (1, ?) "
+    "ON CONFLICT (id) DO UPDATE SET through_rowid = excluded.through_rowid"
+)
+# One statement, so the sketches and the rowid they cover come from the same snapshot
+SELECT_COHORTS = (
+    "SELECT age_band, vehicle_band, claims_band, ncb_band, sketch, "
+    "(SELECT through_rowid FROM quote_cohorts_state WHERE id = 1) FROM quote_cohorts"
+)
+
+def _band_label(bounds: tuple, band: int) -> str:
+    lo = bounds[band]
+    if band == len(bounds) - 1:
+        return f"{lo}+"
+    hi = bounds[band + 1] - 1
+    return str(lo) if lo == hi else f"{lo}-{hi}"
+
+def cohort_label(key: tuple) -> str:
+    """e.g. 'age 25-34, vehicle group 11-20, 1 claim, NCB 3-5 years' for a full key; shorter keys name fewer bands."""
+    if not key:
+        return "all quotes"
+    parts = []
+    for (factor, bounds), band in zip(COHORT_FACTORS, key):
+        label = _band_label(bounds, band)
+        if factor == 'age':
+            parts.append(f"age {label}")
+        elif factor == 'vehicle_group':
+            parts.append(f"vehicle group {label}")
+        elif factor == 'claims_count':
+            parts.append(f"{label} claim" + ("" if label == "1" else "s"))
+        else:
+            parts.append(f"NCB {label} year" + ("" if label == "1" else "s"))
+    return ", ".join(parts)
+
+def cohort_bands(rows: np.ndarray) -> np.ndarray:
+    """Band indices (n, 4) for rows of the COHORT_FACTORS columns."""
+    return np.column_stack([
+        np.clip(np.searchsorted(bounds, rows[:, i], side='right') - 1, 0, None)
+        for i, (_, bounds) in enumerate(COHORT_FACTORS)
+    ]).astype(np.int64)
+
+def profile_key(profile: dict) -> tuple:
+    return tuple(max(bisect.bisect_right(bounds, float(profile[factor])) - 1, 0) for factor, bounds in COHORT_FACTORS)
+
+def format_summary(key: tuple, sketch: DDSketch) -> str:
+    quantiles = ", ".join(
+        f"{'median' if q == 0.5 else f'p{q * 100:g}'} £{sketch.quantile(q):,.2f}" for q in COHORT_QUANTILES
+    )
+    return (f"{sketch.count:,} stored quotes for {cohort_label(key)}: premium mean £{sketch.mean:,.2f}; "
+            f"{quantiles}; range £{sketch.min:,.2f}-£{sketch.max:,.2f}.")
+
+class CohortStats:
+    """Cohort premium summaries kept in step with the quotes table (see module docstring)."""
+
+    def __init__(self, db_path: str = DB_PATH, refresh_seconds: float = COHORT_REFRESH_SECONDS,
+                 min_quotes: int = COHORT_MIN_QUOTES):
+        self.db_path = db_path
+        self.refresh_seconds = refresh_seconds
+        self.min_quotes = min_quotes
+        self._summaries = None
+        self._through_rowid = None
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    # --- Materialized aggregates (SQLite) ---
+
+    def fold_new_quotes(self) -> int:
+        """Folds quotes added since the last fold into quote_cohorts. Returns the rowid now covered."""
+        store = get_store(self.db_path)
+        max_rowid = store.scalar("SELECT MAX(rowid) FROM quotes") or 0
+        while True:
+            # The state is re-read under the write lock, so concurrent folds never count a quote twice
+            with store.transaction() as conn:
+                state = conn.execute("SELECT through_rowid FROM quote_cohorts_state WHERE id = 1").fetchone()
+                through = state[0] if state else 0
+                if max_rowid < through:
+                    # Rows were removed without replace_quotes: start over
+                    conn.execute("DELETE FROM quote_cohorts")
+                    through = 0
+                if through >= max_rowid:
+                    conn.execute(UPSERT_STATE, (through,))
+                    return through
+                upto = min(through + FOLD_BATCH_ROWS, max_rowid)
+                rows = np.asarray(conn.execute(SELECT_NEW_QUOTES, (through, upto)).fetchall(), dtype=np.float64)
+                if len(rows):
+                    self._fold(conn, rows)
+                conn.execute(UPSERT_STATE, (upto,))
+
+    def _fold(self, conn, rows: np.ndarray):
+        # Flat cohort ids: np.unique over one int column is far cheaper than over rows
+        shape = tuple(len(bounds) for _, bounds in COHORT_FACTORS)
+        ids, inverse = np.unique(np.ravel_multi_index(cohort_bands(rows[:, :-1]).T, shape), return_inverse=True)
+        keys = np.column_stack(np.unravel_index(ids, shape))
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.flatnonzero(np.diff(inverse[order])) + 1
+        for key, positions in zip(keys.tolist(), np.split(order, bounds)):
+            row = conn.execute(SELECT_COHORT, key).fetchone()
+            sketch = DDSketch.from_bytes(row[0]) if row else DDSketch(COHORT_SKETCH_ACCURACY)
+            sketch.add_many(rows[positions, -1])
+            conn.execute(UPSERT_COHORT, (*key, sketch.count, sketch.to_bytes()))
+
+    def rebuild(self) -> int:
+        with get_store(self.db_path).transaction() as conn:
+            conn.execute("DELETE FROM quote_cohorts")
+            conn.execute("DELETE FROM quote_cohorts_state")
+        return self.refresh(force=True)
+
+    # --- Serving (in-memory) ---
+
+    def _load(self):
+        rows = get_store(self.db_path).fetch_all(SELECT_COHORTS)
+        merged = {}
+        for *key, blob, _ in rows:
+            sketch = DDSketch.from_bytes(blob)
+            # Every prefix of the key is a coarser cohort containing this one
+            for level in range(len(key) + 1):
+                prefix = tuple(key[:level])
+                if prefix in merged:
+                    merged[prefix].merge(sketch)
+                else:
+                    merged[prefix] = DDSketch.from_bytes(blob)
+        self._summaries = {key: (sketch.count, format_summary(key, sketch)) for key, sketch in merged.items()}
+        self._through_rowid = rows[0][-1] if rows else 0
+
+    def _sample_quotes(self, through: int) -> list:
+        """Up to FINGERPRINT_ROWS evenly spaced quotes at or below `through`, identifying this table."""
+        if not through:
+            return []
+        rowids = np.unique(np.linspace(1, through, min(FINGERPRINT_ROWS, through)).round().astype(np.int64))
+        return get_store(self.db_path).fetch_all(
+            f"SELECT rowid, {', '.join(f for f, _ in COHORT_FACTORS)}, premium FROM quotes "
+            f"WHERE rowid IN ({', '.join('?' * len(rowids))}) ORDER BY rowid",
+            tuple(int(r) for r in rowids)
+        )
+
+    def refresh(self, force: bool = False) -> int:
+        """Folds new quotes and reloads the summaries if anything changed. Returns the rowid covered."""
+        if self._summaries is not None and not force:
+            if time.time() - self._checked_at < self.refresh_seconds:
+                return self._through_rowid
+            # Lookups never wait on a refresh another thread is already running
+            if not self._lock.acquire(blocking=False):
+                return self._through_rowid
+        else:
+            self._lock.acquire()
+        try:
+            self._checked_at = time.time()
+            through = self.fold_new_quotes()
+            # Sampled before loading: a regeneration in between only causes one more reload
+            fingerprint = self._sample_quotes(through)
+            if through != self._through_rowid or fingerprint != self._fingerprint or self._summaries is None:
+                self._load()
+                self._fingerprint = fingerprint
+            return self._through_rowid
+        finally:
+            self._lock.release()
+
+    def summary(self, profile: dict) -> str:
+        """One line on the premiums of the profile's cohort, widened until it holds min_quotes quotes."""
+        self.refresh()
+        summaries = self._summaries
+        key = profile_key(profile)
+        for level in range(len(key), -1, -1):
+            entry = summaries.get(key[:level])
+            if entry is not None and (entry[0] >= self.min_quotes or level == 0):
+                return entry[1]
+        return "No similar quotes found in the database."
+
+_STATS = None
+_STATS_LOCK = threading.Lock()
+
+def get_cohort_stats() -> CohortStats:
+    global _STATS
+    if _STATS is None:
+        with _STATS_LOCK:
+            if _STATS is None:
+                _STATS = CohortStats()
+    return _STATS
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cohort premium statistics over the quotes table.")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database with the quotes table")
+    parser.add_argument('--rebuild', action='store_true', help="Recompute every cohort from scratch")
+    args = parser.parse_args()
+
+    stats = CohortStats(args.db)
+    start = time.time()
+    through = stats.rebuild() if args.rebuild else stats.refresh(force=True)
+    cohorts = get_store(args.db).scalar("SELECT COUNT(*) FROM quote_cohorts")
+    print(f"Cohort stats cover quotes through rowid {through:,} ({cohorts} cohorts) in {time.time() - start:.2f}s")
+    print(stats.summary({'age': 25, 'postcode_risk': 0.5, 'vehicle_group': 15, 'claims_count': 1, 'ncb_years': 3}))
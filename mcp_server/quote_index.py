@@ -0,0 +1,199 @@
+import os
+import sys
+import time
+import threading
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from database.store import get_store, DB_PATH, RATING_FACTORS
+
+INTEGER_FACTORS = {'age', 'vehicle_group', 'claims_count', 'ncb_years'}
+
+# How often a query may check the table for new quotes (seconds)
+SIMILAR_QUOTES_REFRESH_SECONDS = float(os.getenv("SIMILAR_QUOTES_REFRESH_SECONDS", "5"))
+# New quotes go into a small delta tree until they exceed this share of the main tree, then it is rebuilt
+DELTA_REBUILD_FRACTION = 0.05
+DELTA_REBUILD_MIN = 10_000
+# Indexed rows re-read on each refresh check; any difference means the table was regenerated
+FINGERPRINT_ROWS = 16
+
+class _Snapshot:
+    """Immutable view queried by readers; refreshes build a new one and swap the reference."""
+
+    def __init__(self, mean, scale, tree, base_rows, base_premium, base_rowid, delta_tree, delta_rows, delta_premium, delta_rowid):
+        self.mean = mean
+        self.scale = scale
+        self.tree = tree
+        self.base_rows = base_rows
+        self.base_premium = base_premium
+        self.base_rowid = base_rowid
+        self.delta_tree = delta_tree
+        self.delta_rows = delta_rows
+        self.delta_premium = delta_premium
+        self.delta_rowid = delta_rowid
+
+    @property
+    def last_rowid(self) -> int:
+        if len(self.delta_rowid):
+            return int(self.delta_rowid[-1])
+        return int(self.base_rowid[-1]) if len(self.base_rowid) else 0
+
+    @property
+    def size(self) -> int:
+        return len(self.base_rowid) + len(self.delta_rowid)
+
+    def sample(self, n: int) -> tuple:
+        """(rowid, rows, premium) for up to n evenly spaced indexed quotes, first and last included."""
+        positions = np.unique(np.linspace(0, self.size - 1, min(n, self.size)).round().astype(np.intp))
+        n_base = len(self.base_rowid)
+        base, delta = positions[positions < n_base], positions[positions >= n_base] - n_base
+        return (
+            np.concatenate([self.base_rowid[base], self.delta_rowid[delta]]),
+            np.vstack([self.base_rows[base], self.delta_rows[delta]]),
+            np.concatenate([self.base_premium[base], self.delta_premium[delta]])
+        )
+
+class QuoteIndex:
+    """
+    Exact k-nearest-neighbour search over the quotes table.
+
+    All five rating factors are standardized (z-scores fixed at the last full build)
+    and indexed in a KD-tree. Quotes added since then go into a second, small tree
+    (rebuilt from scratch on each refresh, which is cheap) whose top-k is merged
+    with the main tree's; once the delta outgrows DELTA_REBUILD_FRACTION of the
+    main tree, everything is folded into a new main tree. The
+    quotes table is append-only, so new rows are exactly those above the last rowid seen.
+    Regenerating it (QuoteStore.replace_quotes) restarts the rowids: each refresh
+    check re-reads FINGERPRINT_ROWS indexed quotes, and if any of them moved or
+    changed the index is rebuilt from scratch instead of extended.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, refresh_seconds: float = SIMILAR_QUOTES_REFRESH_SECONDS):
+        self.db_path = db_path
+        self.refresh_seconds = refresh_seconds
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _read_rows(self, after_rowid: int) -> tuple:
+        block = get_store(self.db_path).fetch_array(
+            f"SELECT rowid, {', '.join(RATING_FACTORS)}, premium FROM quotes WHERE rowid > ? ORDER BY rowid",
+            (after_rowid,),
+            n_columns=len(RATING_FACTORS) + 2
+        )
+        return block[:, 0].astype(np.int64), block[:, 1:-1], block[:, -1]
+
+    def _build(self, rowid, rows, premium) -> _Snapshot:
+        mean = rows.mean(axis=0) if len(rows) else np.zeros(len(RATING_FACTORS))
+        scale = rows.std(axis=0) if len(rows) else np.ones(len(RATING_FACTORS))
+        scale[scale == 0] = 1.0
+        tree = cKDTree((rows - mean) / scale, balanced_tree=False, compact_nodes=False)
+        empty = np.empty((0, len(RATING_FACTORS)))
+        return _Snapshot(mean, scale, tree, rows, premium, rowid, None, empty, np.empty(0), np.empty(0, dtype=np.int64))
+
+    def _max_rowid(self) -> int:
+        return get_store(self.db_path).scalar("SELECT MAX(rowid) FROM quotes") or 0
+
+    def _matches_table(self, snapshot: _Snapshot) -> bool:
+        """Whether the snapshot's sampled quotes are still in the table, unchanged."""
+        if snapshot.size == 0:
+            return True
+        rowid, rows, premium = snapshot.sample(FINGERPRINT_ROWS)
+        current = get_store(self.db_path).fetch_array(
+            f"SELECT rowid, {', '.join(RATING_FACTORS)}, premium FROM quotes "
+            f"WHERE rowid IN ({', '.join('?' * len(rowid))}) ORDER BY rowid",
+            tuple(int(r) for r in rowid),
+            n_columns=len(RATING_FACTORS) + 2
+        )
+        return (len(current) == len(rowid) and np.array_equal(current[:, 0].astype(np.int64), rowid)
+                and np.array_equal(current[:, 1:-1], rows) and np.array_equal(current[:, -1], premium))
+
+    def refresh(self, force: bool = False) -> int:
+        """Picks up quotes added since the last refresh. Returns the number of new quotes."""
+        if self._snapshot is not None and not force:
+            if time.time() - self._checked_at < self.refresh_seconds:
+                return 0
+            # Queries never wait on a refresh another thread is already running
+            if not self._lock.acquire(blocking=False):
+                return 0
+        else:
+            self._lock.acquire()
+        try:
+            return self._refresh_locked()
+        finally:
+            self._lock.release()
+
+    def _refresh_locked(self) -> int:
+        snapshot = self._snapshot
+        self._checked_at = time.time()
+        max_rowid = self._max_rowid()
+        if snapshot is None or max_rowid < snapshot.last_rowid or not self._matches_table(snapshot):
+            # First load, or the table was regenerated (rowids restarted, possibly with as many rows or more)
+            self._snapshot = self._build(*self._read_rows(0))
+            return self._snapshot.size
+        if max_rowid == snapshot.last_rowid:
+            return 0
+
+        rowid, rows, premium = self._read_rows(snapshot.last_rowid)
+        delta_rows = np.vstack([snapshot.delta_rows, rows])
+        if len(delta_rows) > max(DELTA_REBUILD_MIN, DELTA_REBUILD_FRACTION * len(snapshot.base_rowid)):
+            self._snapshot = self._build(
+                np.concatenate([snapshot.base_rowid, snapshot.delta_rowid, rowid]),
+                np.vstack([snapshot.base_rows, delta_rows]),
+                np.concatenate([snapshot.base_premium, snapshot.delta_premium, premium])
+            )
+        else:
+            self._snapshot = _Snapshot(
+                snapshot.mean, snapshot.scale, snapshot.tree,
+                snapshot.base_rows, snapshot.base_premium, snapshot.base_rowid,
+                cKDTree((delta_rows - snapshot.mean) / snapshot.scale),
+                delta_rows,
+                np.concatenate([snapshot.delta_premium, premium]),
+                np.concatenate([snapshot.delta_rowid, rowid])
+            )
+        return len(rowid)
+
+    def query(self, profile: dict, k: int = 5) -> list:
+        """The k closest quotes to `profile`, nearest first, each with its standardized distance."""
+        self.refresh()
+        snapshot = self._snapshot
+        if snapshot.size == 0 or k <= 0:
+            return []
+        point = (np.array([float(profile[f]) for f in RATING_FACTORS]) - snapshot.mean) / snapshot.scale
+
+        candidates = []
+        for tree, rowids, rows, premiums in (
+            (snapshot.tree, snapshot.base_rowid, snapshot.base_rows, snapshot.base_premium),
+            (snapshot.delta_tree, snapshot.delta_rowid, snapshot.delta_rows, snapshot.delta_premium)
+        ):
+            k_tree = min(k, len(rowids))
+            if tree is None or not k_tree:
+                continue
+            distances, positions = tree.query(point, k=k_tree)
+            distances, positions = np.atleast_1d(distances), np.atleast_1d(positions)
+            candidates += [(d, rowids[i], rows[i], premiums[i]) for d, i in zip(distances, positions)]
+
+        # Ties broken by rowid so results are stable across rebuilds
+        candidates.sort(key=lambda c: (c[0], c[1]))
+        return [
+            {
+                'rowid': int(rowid),
+                **{f: int(v) if f in INTEGER_FACTORS else float(v) for f, v in zip(RATING_FACTORS, row)},
+                'premium': float(premium),
+                'distance': round(float(distance), 4)
+            }
+            for distance, rowid, row, premium in candidates[:k]
+        ]
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+def get_quote_index() -> QuoteIndex:
+    global _INDEX
+    if _INDEX is None:
+        with _INDEX_LOCK:
+            if _INDEX is None:
+                _INDEX = QuoteIndex()
+    return _INDEX
@@ -1,14 +1,19 @@
 from mcp.server.fastmcp import FastMCP
-import sqlite3
-import pandas as pd
-import chromadb
-from chromadb.utils import embedding_functions
+from tabulate import tabulate
 import sys
 import os
 
 # Add parent directory to path so we can import pricing_model.predict
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from pricing_model.predict import predict_premium
+from pricing_model.predict import predict_premium, predict_premium_batch
+from mcp_server.quote_index import get_quote_index, RATING_FACTORS
+from mcp_server.cohort_stats import get_cohort_stats
+from rag.feature_map import get_feature_map
+from rag.vector_backend import get_vector_backend
+
+# What get_similar_quotes returns: 'cohort' (one-line premium summary of the profile's
+# rating cohort) or 'neighbours' (table of the nearest stored quotes)
+SIMILAR_QUOTES_MODE = os.getenv("SIMILAR_QUOTES_MODE", "cohort")
 
 # Initialize MCP Server
 mcp = FastMCP("InsurancePricing")
@@ -18,20 +23,15 @@ mcp = FastMCP("InsurancePricing")
 @mcp.tool()
 def search_guidelines(query: str, n_results: int = 5) -> str:
     """
-    Search underwriting guidelines in ChromaDB for a given query.
+    Search underwriting guidelines (Chroma or the NumPy index, see VECTOR_BACKEND) for a given query.
     Useful for explaining policy rules related to age, postcode, vehicle, etc.
     """
-    persist_directory = "database/chroma_db"
-    client = chromadb.PersistentClient(path=persist_directory)
-    collection = client.get_collection(
-        name="underwriting_guidelines",
-        embedding_function=embedding_functions.DefaultEmbeddingFunction()
-    )
-    
-    results = collection.query(
-        query_texts=[query],
-        n_results=n_results
-    )
+    # Rating factor names (the agent's top_feature) are answered from the precomputed map
+    hits = get_feature_map().lookup(query, n_results)
+    if hits is not None:
+        return "\n---\n".join(h['document'] for h in hits)
+
+    results = get_vector_backend("underwriting_guidelines").query([query], n_results)
     
     docs = results['documents'][0]
     return "\n---\n".join(docs)
@@ -42,17 +42,7 @@ def search_guidelines_baseline(query: str, n_results: int = 1) -> str:
     Naive search of underwriting guidelines (Baseline).
     Searches the NON-CHUNKED collection for whole documents.
     """
-    persist_directory = "database/chroma_db"
-    client = chromadb.PersistentClient(path=persist_directory)
-    collection = client.get_collection(
-        name="underwriting_guidelines_baseline",
-        embedding_function=embedding_functions.DefaultEmbeddingFunction()
-    )
-    
-    results = collection.query(
-        query_texts=[query],
-        n_results=n_results
-    )
+    results = get_vector_backend("underwriting_guidelines_baseline").query([query], n_results)
     
     if not results['documents']:
         return "No guidelines found."
@@ -70,31 +60,33 @@ def run_pricing_model(profile: dict) -> dict:
     return predict_premium(profile)
 
 @mcp.tool()
-def get_similar_quotes(profile: dict, limit: int = 5) -> str:
+def run_pricing_model_batch(profiles: list[dict]) -> list[dict]:
     """
-    Search the SQLite database for quotes with similar profiles to justify pricing.
-    Uses basic filtering on age and vehicle group for 'similarity' in this prototype.
+    Run the ML pricing model for many customer profiles in one vectorized pass.
+    Each profile should contain: age, postcode_risk, vehicle_group, claims_count, ncb_years.
+    Returns one premium and SHAP breakdown per profile, in input order.
     """
-    conn = sqlite3.connect('database/quotes.db')
-    
-    # Simple similarity: match age range and vehicle group range
-    age = profile.get('age', 30)
-    vg = profile.get('vehicle_group', 20)
-    
-    query = f"""
-    SELECT * FROM quotes 
-    WHERE age BETWEEN {age-2} AND {age+2}
-    AND vehicle_group BETWEEN {vg-3} AND {vg+3}
-    LIMIT {limit}
+    return predict_premium_batch(profiles)
+
+@mcp.tool()
+def get_similar_quotes(profile: dict, limit: int = 5) -> str:
     """
+    Summarize the stored quotes similar to a profile.
+    By default returns the premium mean, percentiles and count of the profile's cohort
+    (age band x vehicle group band x claims x NCB band, widened when sparse). With
+    SIMILAR_QUOTES_MODE=neighbours returns the true top-k nearest neighbours
+    (standardized Euclidean distance) with their premiums instead.
+    """
+    if SIMILAR_QUOTES_MODE == "cohort":
+        return get_cohort_stats().summary(profile)
+
+    neighbours = get_quote_index().query(profile, k=limit)
     
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    
-    if df.empty:
+    if not neighbours:
         return "No similar quotes found in the database."
     
-    return df.to_markdown(index=False)
+    columns = RATING_FACTORS + ['premium', 'distance']
+    return tabulate([[n[c] for c in columns] for n in neighbours], headers=columns, tablefmt="pipe")
 
 if __name__ == "__main__":
     mcp.run()
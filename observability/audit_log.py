@@ -0,0 +1,234 @@
+import os
+import gzip
+import json
+import time
+import queue
+import atexit
+import shutil
+import threading
+from typing import Optional
+
+# Backpressure when the queue is full: 'block' (wait up to AUDIT_LOG_BLOCK_TIMEOUT, then drop),
+# 'drop' (discard the new records) or 'drop_oldest' (discard the oldest queued records)
+AUDIT_LOG_POLICY = os.getenv("AUDIT_LOG_POLICY", "block")
+AUDIT_LOG_QUEUE_SIZE = int(os.getenv("AUDIT_LOG_QUEUE_SIZE", "10000"))
+AUDIT_LOG_BLOCK_TIMEOUT = float(os.getenv("AUDIT_LOG_BLOCK_TIMEOUT", "0.05"))
+# Rotate the active segment when it reaches this size (bytes) or age (seconds, 0 disables)
+AUDIT_LOG_MAX_BYTES = int(os.getenv("AUDIT_LOG_MAX_BYTES", str(64 * 1024 * 1024)))
+AUDIT_LOG_ROTATE_SECONDS = float(os.getenv("AUDIT_LOG_ROTATE_SECONDS", "0"))
+AUDIT_LOG_COMPRESS = os.getenv("AUDIT_LOG_COMPRESS", "true").lower() == "true"
+# Rotated segments kept on disk (0 keeps all)
+AUDIT_LOG_BACKUP_COUNT = int(os.getenv("AUDIT_LOG_BACKUP_COUNT", "20"))
+
+POLICIES = ("block", "drop", "drop_oldest")
+
+_STOP = object()
+
+class AuditLogWriter:
+    """
+    JSON-lines audit log written by a background thread.
+
+    `write()` only enqueues the records; serialization, batching, file I/O and
+    rotation all happen on the writer thread. Rotated segments are renamed to
+    `<path>.<UTC timestamp>` and optionally gzipped. Pending records are flushed
+    on `close()`, which is also registered with atexit.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_queue: int = AUDIT_LOG_QUEUE_SIZE,
+        policy: str = AUDIT_LOG_POLICY,
+        block_timeout: float = AUDIT_LOG_BLOCK_TIMEOUT,
+        batch_size: int = 256,
+        flush_interval: float = 0.5,
+        max_bytes: int = AUDIT_LOG_MAX_BYTES,
+        rotate_seconds: float = AUDIT_LOG_ROTATE_SECONDS,
+        compress: bool = AUDIT_LOG_COMPRESS,
+        backup_count: int = AUDIT_LOG_BACKUP_COUNT
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown audit log policy '{policy}'. Expected one of {POLICIES}.")
+        self.path = path
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compress = compress
+        self.backup_count = backup_count
+
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self.errors = 0
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._file = None
+        self._opened_at = 0.0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # --- Request path ---
+
+    def write(self, records: list) -> bool:
+        """Enqueues a list of JSON-serializable records as one unit. Returns False if dropped."""
+        if self._closed:
+            self.dropped += len(records)
+            return False
+        try:
+            if self.policy == "block":
+                self._queue.put(records, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(records)
+            return True
+        except queue.Full:
+            pass
+
+        if self.policy == "drop_oldest":
+            try:
+                evicted = self._queue.get_nowait()
+                self._queue.task_done()
+                self.dropped += len(evicted)
+                self._queue.put_nowait(records)
+                return True
+            except (queue.Empty, queue.Full):
+                pass
+        self.dropped += len(records)
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "rotations": self.rotations,
+            "errors": self.errors
+        }
+
+    # --- Writer thread ---
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._opened_at = time.time()
+
+    def _should_rotate(self) -> bool:
+        if self._file.tell() >= self.max_bytes > 0:
+            return True
+        return self.rotate_seconds > 0 and time.time() - self._opened_at >= self.rotate_seconds and self._file.tell() > 0
+
+    def _rotate(self):
+        self._file.close()
+        segment = f"{self.path}.{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}.{self.rotations}"
+        os.replace(self.path, segment)
+        if self.compress:
+            with open(segment, 'rb') as src, gzip.open(segment + '.gz', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(segment)
+        self.rotations += 1
+        self._prune()
+        self._open()
+
+    def _prune(self):
+        if self.backup_count <= 0:
+            return
+        directory = os.path.dirname(self.path) or '.'
+        prefix = os.path.basename(self.path) + '.'
+        segments = sorted(
+            (os.path.join(directory, name) for name in os.listdir(directory) if name.startswith(prefix)),
+            key=os.path.getmtime
+        )
+        for stale in segments[:-self.backup_count]:
+            os.remove(stale)
+
+    def _write_batch(self, batch: list):
+        lines = [json.dumps(record) + '\n' for records in batch for record in records]
+        self._file.write(''.join(lines))
+        self._file.flush()
+        self.written += len(lines)
+
+    def _maybe_rotate(self):
+        try:
+            if self._should_rotate():
+                self._rotate()
+        except Exception as e:
+            # The records are already on disk; keep appending to whatever segment is usable
+            self.errors += 1
+            print(f"Audit log rotation failed: {e}")
+            if self._file.closed:
+                try:
+                    self._open()
+                except OSError:
+                    pass
+
+    def _run(self):
+        self._open()
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                # Idle: still honour time-based rotation
+                self._maybe_rotate()
+                continue
+            # Drain whatever else is already queued into the same write
+            taken = 0
+            while True:
+                taken += 1
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+                if stopping or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    # Never let a disk error kill the writer; the records are counted as dropped
+                    self.errors += 1
+                    self.dropped += sum(len(records) for records in batch)
+                    print(f"Audit log write failed: {e}")
+                self._maybe_rotate()
+            # Marked done only once written, so flush() means "on disk"
+            for _ in range(taken):
+                self._queue.task_done()
+        self._file.close()
+
+    def flush(self):
+        """Blocks until everything enqueued so far has been written."""
+        self._queue.join()
+
+    def close(self, timeout: Optional[float] = 5.0):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            print("Audit log writer did not drain before shutdown; pending records lost")
+            return
+        self._thread.join(timeout)
+
+_AUDIT_LOGS = {}
+_AUDIT_LOGS_LOCK = threading.Lock()
+
+def get_audit_log(path: str) -> AuditLogWriter:
+    """Process-wide writer per path (recreated after fork, since the thread doesn't survive it)."""
+    key = (path, os.getpid())
+    writer = _AUDIT_LOGS.get(key)
+    if writer is None:
+        with _AUDIT_LOGS_LOCK:
+            if key not in _AUDIT_LOGS:
+                _AUDIT_LOGS[key] = AuditLogWriter(path)
+            writer = _AUDIT_LOGS[key]
+    return writer
@@ -0,0 +1,217 @@
+"""
+Pre-aggregated latency percentiles over the telemetry table.
+
+For every (resolution, time bucket, endpoint, stage) the `latency_rollups` table
+holds a serialized DDSketch of the latencies recorded in that bucket. Rollups are
+updated in the same transaction that flushes raw telemetry, at three resolutions:
+1-minute buckets for recent detail, 5-minute buckets (the usual dashboard step) and
+hourly buckets for long windows. A percentile
+query reads only the sketches covering the window at the coarsest resolution that
+fits the requested interval, and merges them; it never touches the raw rows. A
+window summary uses whole coarse buckets inside the window and finer ones only at its
+unaligned edges, so long windows stay within every resolution's retention.
+Each resolution is purged on its own horizon (ROLLUP_RETENTION_DAYS), so the table
+stays bounded: about a week of minutes, a quarter of 5-minute buckets, two years of hours.
+
+Usage (backfill from raw telemetry): python observability/latency_rollups.py --rebuild
+"""
+import os
+import sys
+import time
+import argparse
+from collections import defaultdict
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from database.store import get_store, DB_PATH
+from observability.sketch import DDSketch
+
+LATENCY_ROLLUPS = os.getenv("LATENCY_ROLLUPS", "true").lower() == "true"
+LATENCY_SKETCH_ACCURACY = float(os.getenv("LATENCY_SKETCH_ACCURACY", "0.01"))
+# Bucket widths in seconds; each must divide the next so intervals can be served from either
+ROLLUP_RESOLUTIONS = (60, 300, 3600)
+# Days each resolution's buckets are kept (resolutions not listed are kept forever)
+ROLLUP_RETENTION_DAYS = {60: 7, 300: 90, 3600: 730}
+# Stages in the order the telemetry table (and a telemetry record) holds them
+STAGES = ('total', 'pricing', 'guidelines', 'similarity', 'llm')
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+SELECT_SKETCH = "SELECT sketch FROM latency_rollups WHERE resolution = ? AND endpoint = ? AND stage = ? AND bucket_start = ?"
+UPSERT_SKETCH = (
+    "INSERT INTO latency_rollups (resolution, endpoint, stage, bucket_start, count, sketch) VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (resolution, endpoint, stage, bucket_start) DO UPDATE SET count = excluded.count, sketch = excluded.sketch"
+)
+
+class LatencyRollups:
+    def __init__(self, db_path: str = DB_PATH, resolutions: tuple = ROLLUP_RESOLUTIONS,
+                 relative_accuracy: float = LATENCY_SKETCH_ACCURACY, retention_days: dict = None):
+        self.db_path = db_path
+        self.resolutions = tuple(sorted(resolutions))
+        self.relative_accuracy = relative_accuracy
+        self.retention_days = ROLLUP_RETENTION_DAYS if retention_days is None else retention_days
+
+    # --- Writes (inside the telemetry flush transaction) ---
+
+    def update(self, conn, samples) -> int:
+        """
+        Folds samples of (unix timestamp, endpoint, latencies in STAGES order, None for
+        stages a request didn't run) into the rollups using the caller's transaction.
+        Returns the number of sketches touched.
+        """
+        groups = defaultdict(list)
+        for ts, endpoint, latencies in samples:
+            for stage, value in zip(STAGES, latencies):
+                if value is None:
+                    continue
+                for resolution in self.resolutions:
+                    groups[(resolution, endpoint, stage, int(ts // resolution) * resolution)].append(value)
+
+        for key, values in groups.items():
+            row = conn.execute(SELECT_SKETCH, key).fetchone()
+            sketch = DDSketch.from_bytes(row[0]) if row else DDSketch(self.relative_accuracy)
+            sketch.add_many(values)
+            conn.execute(UPSERT_SKETCH, (*key, sketch.count, sketch.to_bytes()))
+        return len(groups)
+
+    def apply_retention(self, conn, now: float = None) -> int:
+        """Drops each resolution's buckets older than its retention_days horizon. Returns sketches deleted."""
+        now = time.time() if now is None else now
+        deleted = 0
+        for resolution in self.resolutions:
+            days = self.retention_days.get(resolution)
+            if days is None or days <= 0:
+                continue
+            deleted += conn.execute(
+                "DELETE FROM latency_rollups WHERE resolution = ? AND bucket_start < ?",
+                (resolution, int(now - days * 86400))
+            ).rowcount
+        return deleted
+
+    def rebuild(self, batch_size: int = 50_000) -> int:
+        """Recomputes every rollup from the raw telemetry rows (e.g. after enabling rollups)."""
+        store = get_store(self.db_path)
+        with store.transaction() as conn:
+            conn.execute("DELETE FROM latency_rollups")
+        n = 0
+        batches = store.iter_batches(
+            "SELECT (julianday(timestamp) - 2440587.5) * 86400.0, endpoint, total_latency_ms, pricing_latency_ms, "
+            "guidelines_latency_ms, similarity_latency_ms, llm_latency_ms FROM telemetry ORDER BY id",
+            batch_size=batch_size
+        )
+        for rows in batches:
+            with store.transaction() as conn:
+                self.update(conn, ((row[0], row[1] or '', row[2:]) for row in rows))
+            n += len(rows)
+        return n
+
+    # --- Queries ---
+
+    def resolution_for(self, interval: int) -> int:
+        """The coarsest stored resolution that evenly divides `interval` (seconds)."""
+        fitting = [r for r in self.resolutions if interval % r == 0]
+        return fitting[-1] if fitting else self.resolutions[0]
+
+    def _sketches(self, stage: str, start: float, end: float, resolution: int, endpoint: str = None):
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage '{stage}'. Expected one of {STAGES}.")
+        sql = ("SELECT bucket_start, sketch FROM latency_rollups "
+               "WHERE resolution = ? AND stage = ? AND bucket_start >= ? AND bucket_start < ?")
+        params = [resolution, stage, int(start // resolution) * resolution, end]
+        if endpoint is not None:
+            sql += " AND endpoint = ?"
+            params.append(endpoint)
+        for bucket_start, blob in get_store(self.db_path).fetch_all(sql, tuple(params)):
+            yield bucket_start, DDSketch.from_bytes(blob)
+
+    @staticmethod
+    def _describe(sketch: DDSketch, quantiles: tuple) -> dict:
+        summary = {
+            'count': sketch.count,
+            'mean_ms': sketch.mean,
+            'min_ms': sketch.min if sketch.count else None,
+            'max_ms': sketch.max if sketch.count else None
+        }
+        for q in quantiles:
+            summary[f"p{q * 100:g}_ms"] = sketch.quantile(q)
+        return summary
+
+    def series(self, stage: str = 'total', start: float = None, end: float = None, interval: int = 300,
+               endpoint: str = None, quantiles: tuple = DEFAULT_QUANTILES) -> list:
+        """Percentiles of `stage` per `interval` seconds between start and end (default: the last hour)."""
+        end = time.time() if end is None else end
+        start = end - 3600 if start is None else start
+        merged = {}
+        for bucket_start, sketch in self._sketches(stage, start, end, self.resolution_for(interval), endpoint):
+            group = bucket_start // interval * interval
+            if group in merged:
+                merged[group].merge(sketch)
+            else:
+                merged[group] = sketch
+        return [
+            {'bucket_start': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(group)), **self._describe(merged[group], quantiles)}
+            for group in sorted(merged)
+        ]
+
+    def _retained(self, resolution: int, ts: float, now: float) -> bool:
+        days = self.retention_days.get(resolution)
+        return days is None or days <= 0 or ts >= now - days * 86400
+
+    def cover(self, start: float, end: float, now: float = None) -> list:
+        """
+        (resolution, lo, hi) pieces covering [start, end): whole buckets of the coarsest
+        resolution inside the window, finer ones toward the unaligned edges. An edge
+        stays at the coarser resolution (its partial bucket is read whole) once the
+        finer buckets there are past their retention.
+        """
+        now = time.time() if now is None else now
+        pieces = []
+
+        def split(lo, hi, level):
+            resolution = self.resolutions[level]
+            inner_lo, inner_hi = -(-lo // resolution) * resolution, hi // resolution * resolution
+            edges = [(lo, hi)]
+            if inner_lo < inner_hi:
+                pieces.append((resolution, inner_lo, inner_hi))
+                edges = [(lo, inner_lo), (inner_hi, hi)]
+            for edge_lo, edge_hi in edges:
+                if edge_lo >= edge_hi:
+                    continue
+                if level > 0 and self._retained(self.resolutions[level - 1], edge_lo, now):
+                    split(edge_lo, edge_hi, level - 1)
+                else:
+                    pieces.append((resolution, edge_lo, edge_hi))
+
+        split(start, end, len(self.resolutions) - 1)
+        return pieces
+
+    def summary(self, stage: str = 'total', start: float = None, end: float = None, endpoint: str = None,
+                quantiles: tuple = DEFAULT_QUANTILES) -> dict:
+        """Percentiles of `stage` over the whole window (default: the last hour)."""
+        end = time.time() if end is None else end
+        start = end - 3600 if start is None else start
+        total = DDSketch(self.relative_accuracy)
+        for resolution, lo, hi in self.cover(start, end):
+            for _, sketch in self._sketches(stage, lo, hi, resolution, endpoint):
+                total.merge(sketch)
+        return self._describe(total, quantiles)
+
+def get_latency_rollups(db_path: str = DB_PATH):
+    """Rollups for db_path, or None when LATENCY_ROLLUPS is false."""
+    return LatencyRollups(db_path) if LATENCY_ROLLUPS else None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency rollups over the telemetry table.")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database with the telemetry table")
+    parser.add_argument('--rebuild', action='store_true', help="Recompute all rollups from raw telemetry")
+    parser.add_argument('--stage', default='total', choices=STAGES)
+    parser.add_argument('--hours', type=float, default=1.0, help="Window to report")
+    parser.add_argument('--interval', type=int, default=300, help="Seconds per reported bucket")
+    args = parser.parse_args()
+
+    rollups = LatencyRollups(args.db)
+    if args.rebuild:
+        print(f"Rebuilt rollups from {rollups.rebuild():,} telemetry rows")
+    end = time.time()
+    for row in rollups.series(args.stage, end - args.hours * 3600, end, args.interval):
+        print(row)
+    print({'window': f"last {args.hours:g}h", **rollups.summary(args.stage, end - args.hours * 3600, end)})
@@ -17,6 +17,7 @@ class PipelineMetrics:
     eval_duration: float = 0.0
     cache_hit: bool = False
     semantic_cache_latency: float = 0.0
+    model_version: str = ""
     
     def to_dict(self) -> Dict[str, Any]:
         return asdict(self)
@@ -53,6 +54,9 @@ class MetricsCollector:
         self.metrics.prompt_eval_duration = prompt_duration_ns / 1_000_000_000
         self.metrics.eval_duration = eval_duration_ns / 1_000_000_000
 
+    def set_model_version(self, version: str):
+        self.metrics.model_version = version or ""
+
     def increment_counter(self, counter: str, value: int = 1):
         if counter == 'rag_calls':
             self.metrics.rag_calls += value
@@ -0,0 +1,110 @@
+import math
+import struct
+import numpy as np
+
+# Values at or below this (e.g. a 0ms cache hit) are counted in a dedicated zero bin
+MIN_INDEXABLE_VALUE = 1e-9
+_HEADER = struct.Struct("<dqqdddi")
+
+class DDSketch:
+    """
+    Mergeable quantile sketch with relative-error guarantees (DDSketch).
+
+    Values are counted in logarithmic bins: bin k holds (gamma^(k-1), gamma^k] with
+    gamma = (1 + a) / (1 - a), so any quantile is returned within a relative error of
+    `relative_accuracy` (a) of the true value, however skewed the distribution.
+    Sketches with the same accuracy merge exactly by adding bin counts, which is what
+    lets per-minute sketches roll up into hours or weeks without the raw values.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def add(self, value: float):
+        if value <= MIN_INDEXABLE_VALUE:
+            self.zero_count += 1
+        else:
+            key = self._key(value)
+            self.bins[key] = self.bins.get(key, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        positive = values[values > MIN_INDEXABLE_VALUE]
+        self.zero_count += len(values) - len(positive)
+        keys, counts = np.unique(np.ceil(np.log(positive) / self._log_gamma).astype(np.int64), return_counts=True)
+        for key, n in zip(keys.tolist(), counts.tolist()):
+            self.bins[key] = self.bins.get(key, 0) + n
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other: "DDSketch") -> "DDSketch":
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, n in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + n
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q: float):
+        """Value at quantile q in [0, 1] (None when empty), within relative_accuracy."""
+        if self.count == 0:
+            return None
+        if not 0 <= q <= 1:
+            raise ValueError("q must be in [0, 1]")
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return max(self.min, 0.0)
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                # Midpoint of the bin in the relative sense: within a of any value in it
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def to_bytes(self) -> bytes:
+        keys = np.fromiter(self.bins.keys(), dtype=np.int32, count=len(self.bins))
+        counts = np.fromiter(self.bins.values(), dtype=np.int64, count=len(self.bins))
+        header = _HEADER.pack(self.relative_accuracy, self.zero_count, self.count, self.sum, self.min, self.max, len(keys))
+        return header + keys.tobytes() + counts.tobytes()
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "DDSketch":
+        accuracy, zero_count, count, total, lo, hi, n_bins = _HEADER.unpack_from(blob)
+        sketch = cls(accuracy)
+        offset = _HEADER.size
+        keys = np.frombuffer(blob, dtype=np.int32, count=n_bins, offset=offset)
+        counts = np.frombuffer(blob, dtype=np.int64, count=n_bins, offset=offset + 4 * n_bins)
+        sketch.bins = dict(zip(keys.tolist(), counts.tolist()))
+        sketch.zero_count, sketch.count, sketch.sum, sketch.min, sketch.max = zero_count, count, total, lo, hi
+        return sketch
@@ -0,0 +1,217 @@
+"""
+Per-request latency telemetry, persisted to the `telemetry` table in quotes.db.
+
+Usage (maintenance): python observability/telemetry.py --retention-days 30 [--vacuum-full]
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import argparse
+import threading
+from collections import deque
+from typing import Optional
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from database.store import get_store, DB_PATH
+from observability.latency_rollups import LatencyRollups, get_latency_rollups
+
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "true").lower() == "true"
+# Records held in memory between flushes; when full the oldest unflushed record is overwritten
+TELEMETRY_BUFFER_SIZE = int(os.getenv("TELEMETRY_BUFFER_SIZE", "10000"))
+TELEMETRY_FLUSH_INTERVAL = float(os.getenv("TELEMETRY_FLUSH_INTERVAL", "1.0"))
+# Rows older than this are deleted by the retention job (0 keeps everything)
+TELEMETRY_RETENTION_DAYS = float(os.getenv("TELEMETRY_RETENTION_DAYS", "30"))
+TELEMETRY_RETENTION_INTERVAL = float(os.getenv("TELEMETRY_RETENTION_INTERVAL", "3600"))
+
+INSERT_TELEMETRY = (
+    "INSERT INTO telemetry (timestamp, request_id, endpoint, total_latency_ms, pricing_latency_ms, "
+    "guidelines_latency_ms, similarity_latency_ms, llm_latency_ms, status, input_data) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+DELETE_BEFORE = "DELETE FROM telemetry WHERE id IN (SELECT id FROM telemetry WHERE timestamp < ? LIMIT ?)"
+RETENTION_BATCH = 10_000
+
+def format_timestamp(ts: float) -> str:
+    """UTC, in the same text form as SQLite's CURRENT_TIMESTAMP (plus milliseconds), so it sorts and compares."""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts)) + f".{int(ts % 1 * 1000):03d}"
+
+class TelemetrySink:
+    """
+    Batched, non-blocking telemetry writer.
+
+    `record()` appends a tuple to a bounded in-memory ring buffer and returns; a
+    background thread drains the buffer every `flush_interval` seconds and inserts
+    the batch in a single transaction, which also folds it into the latency rollups
+    when they are enabled. Timestamp formatting and JSON encoding of the
+    input happen at flush time, off the request path. If the buffer fills up the
+    oldest unflushed records are overwritten and counted in `dropped`. The same
+    thread runs the retention job. Pending records are flushed on `close()`, which is
+    also registered with atexit.
+    """
+
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        buffer_size: int = TELEMETRY_BUFFER_SIZE,
+        flush_interval: float = TELEMETRY_FLUSH_INTERVAL,
+        retention_days: float = TELEMETRY_RETENTION_DAYS,
+        retention_interval: float = TELEMETRY_RETENTION_INTERVAL,
+        rollups: LatencyRollups = None
+    ):
+        self.db_path = db_path
+        self.rollups = rollups
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.retention_interval = retention_interval
+
+        self.recorded = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.flush_errors = 0
+        self.purged = 0
+
+        self._buffer = deque(maxlen=buffer_size)
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._closed = False
+        self._last_retention = 0.0
+        self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # --- Request path ---
+
+    def record(self, request_id: str, endpoint: str, status: str, total_ms: float,
+               pricing_ms: float = None, guidelines_ms: float = None, similarity_ms: float = None,
+               llm_ms: float = None, input_data=None):
+        """Buffers one request's latencies (milliseconds). Never blocks or touches the database."""
+        if self._closed:
+            self.dropped += 1
+            return
+        if len(self._buffer) == self._buffer.maxlen:
+            # The append below overwrites the oldest unflushed record
+            self.dropped += 1
+        self._buffer.append((time.time(), request_id, endpoint, total_ms, pricing_ms, guidelines_ms,
+                             similarity_ms, llm_ms, status, input_data))
+        self.recorded += 1
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "flush_errors": self.flush_errors,
+            "purged": self.purged
+        }
+
+    # --- Writer thread ---
+
+    @staticmethod
+    def _to_row(record: tuple) -> tuple:
+        ts, *fields, input_data = record
+        if input_data is not None and not isinstance(input_data, str):
+            input_data = json.dumps(input_data)
+        return (format_timestamp(ts), *fields, input_data)
+
+    def flush(self) -> int:
+        """Writes everything buffered so far in one transaction. Returns the number of rows written."""
+        with self._flush_lock:
+            batch = []
+            while True:
+                try:
+                    batch.append(self._buffer.popleft())
+                except IndexError:
+                    break
+            if not batch:
+                return 0
+            try:
+                with get_store(self.db_path).transaction() as conn:
+                    conn.executemany(INSERT_TELEMETRY, [self._to_row(record) for record in batch])
+                    if self.rollups is not None:
+                        # Record layout: (ts, request_id, endpoint, <latencies in STAGES order>, status, input)
+                        self.rollups.update(conn, ((r[0], r[2], r[3:8]) for r in batch))
+            except Exception as e:
+                # Never let a database error kill the writer; the batch is counted as dropped
+                self.flush_errors += 1
+                self.dropped += len(batch)
+                print(f"Telemetry flush failed: {e}")
+                return 0
+            self.flushed += len(batch)
+            return len(batch)
+
+    def apply_retention(self, retention_days: float = None, vacuum_full: bool = False) -> int:
+        """Deletes rows older than retention_days in small transactions, then vacuums. Returns rows deleted."""
+        retention_days = self.retention_days if retention_days is None else retention_days
+        store = get_store(self.db_path)
+        if self.rollups is not None:
+            # Each resolution ages out on its own horizon, independently of the raw rows
+            with store.transaction() as conn:
+                self.rollups.apply_retention(conn)
+        if retention_days <= 0:
+            return 0
+        cutoff_ts = time.time() - retention_days * 86400
+        cutoff = format_timestamp(cutoff_ts)
+        deleted = 0
+        while True:
+            # Bounded batches keep the write lock short, so flushes aren't held up
+            with store.transaction() as conn:
+                n = conn.execute(DELETE_BEFORE, (cutoff, RETENTION_BATCH)).rowcount
+            deleted += n
+            if n < RETENTION_BATCH:
+                break
+        if deleted or vacuum_full:
+            store.vacuum(full=vacuum_full)
+        self.purged += deleted
+        return deleted
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+            if self.retention_interval > 0 and time.time() - self._last_retention >= self.retention_interval:
+                self._last_retention = time.time()
+                try:
+                    self.apply_retention()
+                except Exception as e:
+                    print(f"Telemetry retention failed: {e}")
+        self.flush()
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Stops the writer after a final flush (graceful shutdown)."""
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        self._thread.join(timeout)
+
+_SINKS = {}
+_SINKS_LOCK = threading.Lock()
+
+def get_telemetry_sink(db_path: str = DB_PATH) -> Optional[TelemetrySink]:
+    """Process-wide sink (recreated after fork), or None when TELEMETRY_ENABLED is false."""
+    if not TELEMETRY_ENABLED:
+        return None
+    key = (db_path, os.getpid())
+    sink = _SINKS.get(key)
+    if sink is None:
+        with _SINKS_LOCK:
+            if key not in _SINKS:
+                _SINKS[key] = TelemetrySink(db_path, rollups=get_latency_rollups(db_path))
+            sink = _SINKS[key]
+    return sink
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Telemetry table maintenance.")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database with the telemetry table")
+    parser.add_argument('--retention-days', type=float, default=TELEMETRY_RETENTION_DAYS, help="Delete rows older than this")
+    parser.add_argument('--vacuum-full', action='store_true', help="Rewrite the database file to reclaim space (locks it while running)")
+    args = parser.parse_args()
+
+    sink = TelemetrySink(args.db, retention_interval=0, rollups=get_latency_rollups(args.db))
+    deleted = sink.apply_retention(args.retention_days, vacuum_full=args.vacuum_full)
+    sink.close()
+    remaining = get_store(args.db).scalar("SELECT COUNT(*) FROM telemetry")
+    print(f"Telemetry retention: deleted {deleted:,} rows older than {args.retention_days:g} days; {remaining:,} remain")
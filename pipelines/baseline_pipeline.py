@@ -34,6 +34,8 @@ def run_baseline_pipeline(profile: dict, query: str = "Please explain my insuran
         # But accurately it's combined. We will leave SHAP as 0 or equal to pricing for now?
         # Let's just track pricing.
         
+    collector.set_model_version(metadata.get('model_version'))
+
     if 'guidelines_latency' in metadata:
         # This is RAG (Vector Search)
         duration_sec = metadata['guidelines_latency'] / 1000.0
@@ -4,10 +4,7 @@ import json
 import time
 import asyncio
 import functools
-import shap
-import pandas as pd
 import numpy as np
-from chromadb.utils import embedding_functions
 from rank_bm25 import BM25Okapi
 from langchain_ollama import ChatOllama
 from langchain_core.messages import SystemMessage
@@ -15,96 +12,108 @@ from langchain_core.messages import SystemMessage
 # Add root directory
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from pricing_model.predict import get_model_data
+from pricing_model.predict import get_model_data, get_model_version, profiles_to_matrix, format_shap_row, warm_model, price_matrix
 from mcp_server.server import get_similar_quotes, search_guidelines
+from pricing_model.worker_pool import get_pricing_pool
 from observability.metrics import MetricsCollector
 from observability.timer import measure_time
+from rag.embedding_cache import get_embedding_function
+from rag.feature_map import get_feature_map, FEATURE_KEYWORDS
+from rag.lexical_index import get_lexical_index
+from rag.vector_backend import get_vector_backend
 
-# --- Optimization 1: Global Caching for Model & Explainer ---
-_PRICING_CACHE = None
+# --- Optimization 1: Versioned Model Registry ---
+# The registry loads and warms each published model version once and swaps it in
+# atomically, so requests always see a fully warmed model without a restart.
 
 # --- Optimization Bonus: Global Semantic Response Cache ---
 # Structure: { profile_hash: [ {'embedding': np.array, 'result': dict, 'query': str} ] }
 _RESPONSE_CACHE = {}
-_EMBEDDING_FUNC = embedding_functions.DefaultEmbeddingFunction()
+# Content-addressed embedding cache (rag/embedding_cache.py): the query and the fixed
+# feature keywords are embedded once, then served from memory or the on-disk store
+_EMBEDDING_FUNC = get_embedding_function()
 
 def get_cached_pricing_components():
-    global _PRICING_CACHE
-    if _PRICING_CACHE is None:
-        data = get_model_data()
-        model = data['model']
-        explainer = shap.TreeExplainer(model)
-        _PRICING_CACHE = (model, data['features'], explainer)
-    return _PRICING_CACHE
+    data = get_model_data()
+    # Flattened trees, native TreeSHAP path tables (SHAP_BACKEND=shap to opt out) and the
+    # pricing grid are built once per model version; this is a dict lookup once warm
+    warm_model(data)
+    return data
 
-def run_pricing_optimized(profile: dict):
+def run_pricing_optimized(profile: dict, engine: str = None):
     # Uses cached explainer to avoid re-initialization overhead (Optimization: SHAP caching)
-    model, features, explainer = get_cached_pricing_components()
+    data = get_cached_pricing_components()
+    features = data['features']
     
-    df = pd.DataFrame([profile])
     # Ensure columns match expected features
-    if not all(col in df.columns for col in features):
-        print(f"DEBUG: Missing features. Profile: {list(df.columns)}, Expected: {features}")
+    if not all(col in profile for col in features):
+        print(f"DEBUG: Missing features. Profile: {list(profile)}, Expected: {features}")
     
-    df = df[features]
-    premium = model.predict(df)[0]
-    
-    # SHAP calculation is faster if explainer is reused? 
-    # TreeExplainer init is expensive. Computing shap_values is separate.
-    shap_values = explainer.shap_values(df)
-    
-    if isinstance(shap_values, list):
-        shap_vals = shap_values[0][0]
-    else:
-        shap_vals = shap_values[0]
-        
-    explanation = {}
-    for i, feature in enumerate(features):
-        explanation[feature] = float(shap_vals[i])
+    # On-grid profiles are answered from the precomputed table, others live
+    X = profiles_to_matrix([profile], features)
+    premiums, shap_values, _ = price_matrix(data, X, engine)
         
     return {
-        "predicted_premium": round(float(premium), 2),
-        "shap_values": explanation
+        "predicted_premium": round(float(premiums[0]), 2),
+        "shap_values": format_shap_row(shap_values[0], features),
+        "model_version": get_model_version(data)
     }
 
-# --- Optimization 2: Global Persistent Chroma Client ---
-_CHROMA_CLIENT = None
-_CHROMA_COLLECTION = None
+def run_pricing_optimized_batch(profiles: list, engine: str = None):
+    # Vectorized variant: one booster call and one SHAP call for the whole batch
+    data = get_cached_pricing_components()
+    features = data['features']
+    
+    X = profiles_to_matrix(profiles, features)
+    premiums, shap_values, _ = price_matrix(data, X, engine)
+    
+    return [
+        {
+            "predicted_premium": round(float(premium), 2),
+            "shap_values": format_shap_row(shap_row, features),
+            "model_version": get_model_version(data)
+        }
+        for premium, shap_row in zip(premiums, shap_values)
+    ]
 
-def get_underwriting_collection():
-    global _CHROMA_CLIENT, _CHROMA_COLLECTION
-    if _CHROMA_COLLECTION is None:
-        import chromadb
-        persist_directory = "database/chroma_db"
-        _CHROMA_CLIENT = chromadb.PersistentClient(path=persist_directory)
-        _CHROMA_COLLECTION = _CHROMA_CLIENT.get_collection(
-            name="underwriting_guidelines",
-            embedding_function=embedding_functions.DefaultEmbeddingFunction()
-        )
-    return _CHROMA_COLLECTION
+# --- Optimization 2: Process-wide Retrieval Backend ---
+# The Chroma collection opened once, or the in-process NumPy index (VECTOR_BACKEND=numpy,
+# rag/vector_backend.py); both return Chroma-shaped results
 
 def search_guidelines_hybrid(query: str, features: list, n_results: int = 3):
     """
     Hybrid Search: Vector Search + BM25 Reranking
     """
-    collection = get_underwriting_collection()
-    
     # 1. Vector Search (Semantic)
-    # Search for user query AND top features
-    search_queries = [query] + features
-    vector_results = collection.query(
-        query_texts=search_queries,
-        n_results=n_results
-    )
+    # Feature keywords come from the map precomputed at index time (rag/feature_map.py);
+    # only the user query, plus any feature the map can't answer, is searched live
+    feature_map = get_feature_map()
+    precomputed = {f: feature_map.lookup(f, n_results) for f in features}
+    search_queries = [query] + [f for f in features if precomputed[f] is None]
+    vector_results = get_vector_backend().query(search_queries, n_results)
+    ids, documents, metadatas = vector_results['ids'][:1], vector_results['documents'][:1], vector_results['metadatas'][:1]
+    live = iter(zip(vector_results['ids'][1:], vector_results['documents'][1:], vector_results['metadatas'][1:]))
+    for f in features:
+        if precomputed[f] is None:
+            chunk_ids, docs, metas = next(live)
+        else:
+            chunk_ids = [h['id'] for h in precomputed[f]]
+            docs, metas = [h['document'] for h in precomputed[f]], [h['metadata'] for h in precomputed[f]]
+        ids.append(chunk_ids)
+        documents.append(docs)
+        metadatas.append(metas)
+    vector_results = {'ids': ids, 'documents': documents, 'metadatas': metadatas}
     
     # Deduplicate and flatten
     unique_docs = {} # content -> metadata
+    doc_ids = {} # content -> chunk id
     
     # Process vector results
     for i, docs in enumerate(vector_results['documents']):
         for j, doc in enumerate(docs):
             if doc not in unique_docs:
                 unique_docs[doc] = vector_results['metadatas'][i][j]
+                doc_ids[doc] = vector_results['ids'][i][j]
 
     # Quick return if no docs
     if not unique_docs:
@@ -113,13 +122,14 @@ def search_guidelines_hybrid(query: str, features: list, n_results: int = 3):
     docs_list = list(unique_docs.keys())
     
     # 2. BM25 Ranking (Keyword)
-    # Tokenize corpus
-    tokenized_corpus = [doc.split(" ") for doc in docs_list]
-    bm25 = BM25Okapi(tokenized_corpus)
-    
-    # Score against query
-    tokenized_query = query.split(" ")
-    doc_scores = bm25.get_scores(tokenized_query)
+    # Scores come from the corpus-wide index built with the vector store (rag/lexical_index.py):
+    # stemmed tokens, IDF over every chunk, no per-request index build
+    doc_scores = get_lexical_index().score_ids(query, [doc_ids[d] for d in docs_list])
+    if doc_scores is None:
+        # No current index (never built, or guidelines re-indexed since): candidates-only BM25
+        tokenized_corpus = [doc.split(" ") for doc in docs_list]
+        bm25 = BM25Okapi(tokenized_corpus)
+        doc_scores = bm25.get_scores(query.split(" "))
     
     # 3. Simple Reranking/Filtering
     # Sort by score
@@ -141,6 +151,12 @@ async def timed_task(func, *args, **kwargs):
     duration = time.time() - start
     return res, duration
 
+async def timed_coroutine(coro):
+    start = time.time()
+    res = await coro
+    duration = time.time() - start
+    return res, duration
+
 def cosine_similarity(v1, v2):
     return np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
 
@@ -162,10 +178,16 @@ async def run_optimized_pipeline_async(profile: dict, query: str = "Explain prem
     # To enable this, we search for all relevant feature keywords concurrently with pricing.
     
     t_parallel_start = time.time()
-    all_feature_keywords = ["age", "postcode_risk", "vehicle_group", "claims_count", "ncb_years", "years_experience"]
+    all_feature_keywords = FEATURE_KEYWORDS
     
     task_embedding = asyncio.to_thread(_EMBEDDING_FUNC, [query])
-    task_pricing = timed_task(run_pricing_optimized, profile)
+    # CPU-bound pricing/SHAP goes to the process pool when enabled (PRICING_WORKERS > 0),
+    # so concurrent requests aren't serialized on this process's GIL
+    pricing_pool = get_pricing_pool()
+    if pricing_pool is not None:
+        task_pricing = timed_coroutine(pricing_pool.price_one(profile))
+    else:
+        task_pricing = timed_task(run_pricing_optimized, profile)
     task_similar = timed_task(get_similar_quotes, profile)
     task_guidelines = asyncio.to_thread(search_guidelines_hybrid, query, all_feature_keywords)
     
@@ -178,6 +200,9 @@ async def run_optimized_pipeline_async(profile: dict, query: str = "Explain prem
     # Now check semantic cache AFTER we have the embedding
     t_sem_start = time.time()
     cached_result = None if bypass_cache else check_semantic_cache_sync(profile_hash, query_embedding)
+    if cached_result and cached_result['metrics'].get('model_version') != pricing_res['model_version']:
+        # Explanation was written for a model that has since been replaced
+        cached_result = None
     actual_check_time = time.time() - t_sem_start
     
     if cached_result:
@@ -192,6 +217,7 @@ async def run_optimized_pipeline_async(profile: dict, query: str = "Explain prem
 
     collector.track_latency('semantic_cache', actual_check_time)
     collector.track_latency('pricing', pricing_time)
+    collector.set_model_version(pricing_res['model_version'])
     collector.track_latency('vector_search', time.time() - t_parallel_start) 
     collector.increment_counter('rag_calls', 1)
     
@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+GRID_DIR = 'pricing_model/grid'
+
+# Integer rating factors and their inclusive domains (see data_generation/generate_quotes.py)
+INTEGER_DOMAINS = {
+    'age': (18, 80),
+    'vehicle_group': (1, 50),
+    'claims_count': (0, 5),
+    'ncb_years': (0, 10)
+}
+# postcode_risk is a bounded float, tabulated at a fixed resolution
+POSTCODE_RANGE = (0.0, 1.0)
+DEFAULT_POSTCODE_STEP = 0.05
+
+def grid_spec(features: list, postcode_step: float = DEFAULT_POSTCODE_STEP) -> list:
+    """One uniform axis {feature, start, step, size} per model feature, in model feature order."""
+    spec = []
+    for feature in features:
+        if feature in INTEGER_DOMAINS:
+            low, high = INTEGER_DOMAINS[feature]
+            spec.append({'feature': feature, 'start': low, 'step': 1, 'size': high - low + 1})
+        elif feature == 'postcode_risk':
+            low, high = POSTCODE_RANGE
+            size = int(round((high - low) / postcode_step)) + 1
+            spec.append({'feature': feature, 'start': low, 'step': postcode_step, 'size': size})
+        else:
+            raise ValueError(f"No grid domain defined for feature '{feature}'.")
+    return spec
+
+def axis_values(axis: dict) -> np.ndarray:
+    # Rounded so grid points are the same doubles a user would type (3 * 0.05 -> 0.15, not 0.15000000000000002)
+    return np.round(axis['start'] + np.arange(axis['size']) * axis['step'], 10)
+
+def grid_paths(version: str, grid_dir: str = GRID_DIR) -> dict:
+    return {
+        'meta': os.path.join(grid_dir, f"{version}.json"),
+        'premium': os.path.join(grid_dir, f"{version}_premium.npy"),
+        'shap': os.path.join(grid_dir, f"{version}_shap.npy")
+    }
+
+class PricingGrid:
+    """
+    Memory-mapped premium/SHAP table over the discrete rating space.
+
+    Cells are laid out row-major over the model's feature order, so a profile's cell
+    is a dot product of per-axis indices with fixed strides. Only exact grid points
+    are answered; anything else is reported as off-grid for live inference.
+    """
+
+    def __init__(self, meta: dict, premiums: np.ndarray, shap_values: np.ndarray):
+        self.meta = meta
+        self.version = meta['model_version']
+        self.features = meta['features']
+        self.base_value = meta['base_value']
+        self.premiums = premiums
+        self.shap_values = shap_values
+        self.axes = [axis_values(axis) for axis in meta['axes']]
+        self._start = np.array([axis['start'] for axis in meta['axes']], dtype=np.float64)
+        self._step = np.array([axis['step'] for axis in meta['axes']], dtype=np.float64)
+        self._size = np.array([axis['size'] for axis in meta['axes']], dtype=np.intp)
+        self._strides = np.array([int(np.prod(self._size[j + 1:])) for j in range(len(self._size))], dtype=np.intp)
+
+    @property
+    def n_cells(self) -> int:
+        return int(np.prod(self._size))
+
+    def locate(self, X: np.ndarray) -> tuple:
+        """Returns (on_grid mask, flat cell index) for each row of X."""
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(self.features))
+        idx = np.rint((X - self._start) / self._step)
+        in_range = np.all((idx >= 0) & (idx < self._size), axis=1)
+        # NaN/inf rows are off-grid (comparisons above are False); park them on cell 0 so indexing stays valid
+        idx = np.where(np.isfinite(idx), idx, 0)
+        idx = np.clip(idx, 0, self._size - 1).astype(np.intp)
+        exact = np.all(np.column_stack([self.axes[j][idx[:, j]] == X[:, j] for j in range(X.shape[1])]), axis=1)
+        return in_range & exact, idx @ self._strides
+
+    def cell_profiles(self, flat_index: np.ndarray) -> np.ndarray:
+        """Inverse of locate: the feature matrix for the given flat cell indices."""
+        flat_index = np.asarray(flat_index, dtype=np.intp)
+        idx = (flat_index[:, None] // self._strides) % self._size
+        return np.column_stack([self.axes[j][idx[:, j]] for j in range(len(self.axes))])
+
+    def lookup(self, X: np.ndarray) -> tuple:
+        """Returns (on_grid mask, premiums, shap_values) with values only for on-grid rows."""
+        on_grid, flat_index = self.locate(X)
+        cells = flat_index[on_grid]
+        return on_grid, self.premiums[cells], self.shap_values[cells]
+
+def load_pricing_grid(version: str, grid_dir: str = GRID_DIR):
+    """Maps the grid for a model version, or returns None if it has not been built."""
+    paths = grid_paths(version, grid_dir)
+    if not all(os.path.exists(p) for p in paths.values()):
+        return None
+    with open(paths['meta'], 'r') as f:
+        meta = json.load(f)
+    premiums = np.load(paths['premium'], mmap_mode='r')
+    shap_values = np.load(paths['shap'], mmap_mode='r')
+    return PricingGrid(meta, premiums, shap_values)
+
+def verify_pricing_grid(grid: PricingGrid, tree_engine, explainer, n_samples: int = 256, seed: int = 0) -> bool:
+    """Startup self-test: random cells must match live inference (premium bit-for-bit, SHAP to 1e-9)."""
+    rng = np.random.default_rng(seed)
+    cells = rng.integers(0, grid.n_cells, n_samples)
+    X = grid.cell_profiles(cells)
+    on_grid, premiums, shap_values = grid.lookup(X)
+    if not on_grid.all():
+        return False
+    premium_ok = np.array_equal(premiums, tree_engine.predict(X))
+    shap_ok = np.allclose(shap_values, explainer.shap_values(X), rtol=0, atol=1e-9)
+    base_ok = abs(grid.base_value - explainer.expected_value) < 1e-6
+    return bool(premium_ok and shap_ok and base_ok)
+
+# --- Offline build ---
+
+_WORKER = {}
+
+def _init_worker():
+    from pricing_model.predict import get_model_data, get_tree_engine, get_explainer
+    model_data = get_model_data()
+    _WORKER['engine'] = get_tree_engine(model_data)
+    _WORKER['explainer'] = get_explainer(model_data, "native")
+
+def _evaluate_block(args):
+    """Fills every cell whose first-axis index is `i` directly in the on-disk arrays."""
+    i, meta, premium_path, shap_path = args
+    axes = [axis_values(axis) for axis in meta['axes']]
+    rest = np.meshgrid(*axes[1:], indexing='ij')
+    X = np.column_stack([np.full(rest[0].size, axes[0][i])] + [r.ravel() for r in rest])
+
+    premiums = np.load(premium_path, mmap_mode='r+')
+    shap_values = np.load(shap_path, mmap_mode='r+')
+    block = slice(i * len(X), (i + 1) * len(X))
+    premiums[block] = _WORKER['engine'].predict(X)
+    shap_values[block] = _WORKER['explainer'].shap_values(X)
+    premiums.flush()
+    shap_values.flush()
+    return len(X)
+
+def build_pricing_grid(postcode_step: float = DEFAULT_POSTCODE_STEP, workers: int = None, grid_dir: str = GRID_DIR):
+    from pricing_model.predict import get_model_data, get_model_version, get_tree_engine, get_explainer
+
+    model_data = get_model_data()
+    features = model_data['features']
+    version = get_model_version(model_data)
+    explainer = get_explainer(model_data, "native")
+
+    meta = {
+        'model_version': version,
+        'features': features,
+        'axes': grid_spec(features, postcode_step),
+        'base_value': float(explainer.expected_value),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    n_cells = int(np.prod([axis['size'] for axis in meta['axes']]))
+
+    os.makedirs(grid_dir, exist_ok=True)
+    paths = grid_paths(version, grid_dir)
+    tmp_premium = paths['premium'] + '.tmp.npy'
+    tmp_shap = paths['shap'] + '.tmp.npy'
+    np.lib.format.open_memmap(tmp_premium, mode='w+', dtype=np.float64, shape=(n_cells,)).flush()
+    np.lib.format.open_memmap(tmp_shap, mode='w+', dtype=np.float64, shape=(n_cells, len(features))).flush()
+
+    start = time.time()
+    tasks = [(i, meta, tmp_premium, tmp_shap) for i in range(meta['axes'][0]['size'])]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        filled = sum(pool.map(_evaluate_block, tasks))
+    assert filled == n_cells, f"Filled {filled} of {n_cells} cells"
+
+    # Publish atomically: arrays first, metadata last (readers key on the metadata file)
+    os.replace(tmp_premium, paths['premium'])
+    os.replace(tmp_shap, paths['shap'])
+    with open(paths['meta'] + '.tmp', 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(paths['meta'] + '.tmp', paths['meta'])
+
+    grid = load_pricing_grid(version, grid_dir)
+    if not verify_pricing_grid(grid, get_tree_engine(model_data), explainer):
+        raise RuntimeError("Pricing grid does not match the live model.")
+
+    size_mb = (os.path.getsize(paths['premium']) + os.path.getsize(paths['shap'])) / 1e6
+    print(f"Built pricing grid for model {version}: {n_cells:,} cells, {size_mb:.0f}MB in {time.time() - start:.1f}s")
+    print(f"Saved to {paths['meta']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the premium/SHAP lookup grid for the current model.")
+    parser.add_argument('--postcode-step', type=float, default=DEFAULT_POSTCODE_STEP, help="Grid resolution for postcode_risk")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+    build_pricing_grid(postcode_step=args.postcode_step, workers=args.workers)
@@ -1,62 +1,245 @@
-import sqlite3
+"""
+Pricing model evaluation: MAE / RMSE / R² over every quote, plus feature importance
+and predicted-vs-actual plots in evaluation/plots/.
+
+Small portfolios are evaluated in memory. Above EVAL_STREAMING_ROWS quotes (or with
+--streaming) the Parquet dataset is evaluated in rowid chunks instead, optionally
+across worker processes. Each chunk is reduced to exactly mergeable partials, so
+memory is bounded by the chunk size:
+  * metrics: count, mean and centred sum of squares of the premium, plus running
+    means of |residual| and residual², combined with Chan et al.'s pairwise update;
+  * plots: a fixed-grid 2D histogram of (actual, predicted) over all quotes, and a
+    uniform reservoir sample of PLOT_SAMPLE_SIZE quotes (smallest random keys) for
+    the residual scatter.
+
+Usage: python pricing_model/evaluate_model.py [--streaming] [--workers 4] [--chunk-rows 524288]
+"""
 import pandas as pd
 import pickle
 import os
+import sys
+import argparse
 import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
 import seaborn as sns
+from concurrent.futures import ProcessPoolExecutor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import numpy as np
+import pyarrow.dataset as ds
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from database.quotes_dataset import read_quotes, sync_quotes, quotes_dataset, column_range, QUOTES_DATASET_DIR, ROW_GROUP_ROWS
+from pricing_model.predict import get_booster
+
+# Portfolios larger than this are evaluated chunk by chunk
+EVAL_STREAMING_ROWS = int(os.getenv("EVAL_STREAMING_ROWS", "1000000"))
+EVAL_CHUNK_ROWS = int(os.getenv("EVAL_CHUNK_ROWS", str(4 * ROW_GROUP_ROWS)))
+EVAL_WORKERS = int(os.getenv("EVAL_WORKERS", "1"))
+PLOT_SAMPLE_SIZE = 20_000
+HIST_BINS = 200
+SAMPLE_SEED = 42
+
+class RunningMetrics:
+    """Regression metrics over a stream of chunks; partials merge exactly and stably."""
+
+    def __init__(self, n: int = 0, y_mean: float = 0.0, y_m2: float = 0.0, abs_err: float = 0.0, sq_err: float = 0.0):
+        self.n = n
+        self.y_mean = y_mean
+        # Sum of squared deviations of y from its mean (R²'s total sum of squares)
+        self.y_m2 = y_m2
+        # Running means, so no sum grows with the portfolio
+        self.abs_err = abs_err
+        self.sq_err = sq_err
+
+    @classmethod
+    def from_chunk(cls, y: np.ndarray, y_pred: np.ndarray) -> "RunningMetrics":
+        if not len(y):
+            return cls()
+        residual = y - y_pred
+        y_mean = float(y.mean())
+        return cls(len(y), y_mean, float(((y - y_mean) ** 2).sum()),
+                   float(np.abs(residual).mean()), float((residual ** 2).mean()))
+
+    def merge(self, other: "RunningMetrics") -> "RunningMetrics":
+        if other.n == 0:
+            return self
+        n = self.n + other.n
+        weight = other.n / n
+        delta = other.y_mean - self.y_mean
+        self.y_m2 += other.y_m2 + delta ** 2 * self.n * weight
+        self.y_mean += delta * weight
+        self.abs_err += (other.abs_err - self.abs_err) * weight
+        self.sq_err += (other.sq_err - self.sq_err) * weight
+        self.n = n
+        return self
+
+    def result(self) -> dict:
+        if self.n == 0:
+            return {}
+        return {
+            "mae": self.abs_err,
+            "rmse": float(np.sqrt(self.sq_err)),
+            "r2": 1.0 - self.sq_err * self.n / self.y_m2 if self.y_m2 > 0 else 0.0
+        }
+
+def _reservoir(keys: np.ndarray, *columns, size: int) -> tuple:
+    """Keeps the `size` rows with the smallest keys: a uniform sample that merges by concatenation."""
+    if len(keys) <= size:
+        return (keys, *columns)
+    keep = np.argpartition(keys, size)[:size]
+    return (keys[keep], *(c[keep] for c in columns))
+
+# --- Chunk evaluation (in-process, or in pool workers) ---
+
+_WORKER = {}
+
+def _init_worker(model_path: str, dataset_dir: str, edges: np.ndarray, sample_size: int, n_threads: int):
+    with open(model_path, 'rb') as f:
+        model_data = pickle.load(f)
+    _WORKER.update(model_data=model_data, dataset=quotes_dataset(dataset_dir), edges=edges,
+                   sample_size=sample_size, n_threads=n_threads)
+
+def _evaluate_chunk(chunk: int, lo: int, hi: int) -> tuple:
+    """Partials for quotes with lo <= rowid < hi: (RunningMetrics, 2D histogram, reservoir sample)."""
+    features = _WORKER['model_data']['features']
+    table = _WORKER['dataset'].to_table(
+        columns=features + ['premium'],
+        filter=(ds.field('rowid') >= lo) & (ds.field('rowid') < hi)
+    )
+    X = np.column_stack([table.column(f).to_numpy() for f in features]).astype(np.float64)
+    y = table.column('premium').to_numpy()
+    y_pred = get_booster(_WORKER['model_data']).predict(X, num_threads=_WORKER['n_threads']) if len(y) else y
+
+    edges = _WORKER['edges']
+    # Predictions outside the premium range land in the edge bins
+    hist, _, _ = np.histogram2d(y, np.clip(y_pred, edges[0], edges[-1]), bins=(edges, edges))
+    # Keys depend only on the chunk, so the sample is the same for any worker count
+    keys = np.random.default_rng([SAMPLE_SEED, chunk]).random(len(y))
+    sample = _reservoir(keys, y, y_pred, size=_WORKER['sample_size'])
+    return RunningMetrics.from_chunk(y, y_pred), hist, sample
+
+def evaluate_streaming(model_path: str, dataset_dir: str, n_rows: int, chunk_rows: int = EVAL_CHUNK_ROWS,
+                       workers: int = EVAL_WORKERS, sample_size: int = PLOT_SAMPLE_SIZE) -> tuple:
+    """Evaluates rowids 1..n_rows chunk by chunk; returns (RunningMetrics, histogram, edges, sample)."""
+    lo, hi = column_range('premium', dataset_dir)
+    edges = np.linspace(lo, hi, HIST_BINS + 1)
+    chunks = [(i, lo_id, min(lo_id + chunk_rows, n_rows + 1)) for i, lo_id in enumerate(range(1, n_rows + 1, chunk_rows))]
+    # LightGBM threads are split between the workers so the pool never oversubscribes the cores
+    initargs = (model_path, dataset_dir, edges, sample_size, max(1, (os.cpu_count() or 1) // max(workers, 1)))
 
-def run_model_evaluation():
-    """Runs model evaluation and returns metrics."""
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs)
+        # In chunk order, so the merged floating-point result doesn't depend on scheduling
+        results = pool.map(_evaluate_chunk, *zip(*chunks))
+    else:
+        pool = None
+        _init_worker(*initargs)
+        results = (_evaluate_chunk(*chunk) for chunk in chunks)
+
+    metrics = RunningMetrics()
+    hist = np.zeros((HIST_BINS, HIST_BINS))
+    sample = (np.empty(0), np.empty(0), np.empty(0))
+    try:
+        for chunk_metrics, chunk_hist, chunk_sample in results:
+            metrics.merge(chunk_metrics)
+            hist += chunk_hist
+            sample = _reservoir(*(np.concatenate(pair) for pair in zip(sample, chunk_sample)), size=sample_size)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        _WORKER.clear()
+    return metrics, hist, edges, sample
+
+# --- Plots ---
+
+def plot_feature_importance(model, features: list):
+    plt.figure(figsize=(10, 6))
+    lgb_importance = pd.DataFrame({
+        'feature': features,
+        'importance': model.feature_importances_
+    }).sort_values(by='importance', ascending=False)
+
+    sns.barplot(x='importance', y='feature', data=lgb_importance, hue='feature', palette='viridis', legend=False)
+    plt.title('Feature Importance (LightGBM)')
+    plt.tight_layout()
+    plt.savefig('evaluation/plots/feature_importance.png')
+    plt.close() # Close plot to free memory
+
+def plot_predicted_vs_actual_density(hist: np.ndarray, edges: np.ndarray, n: int):
+    """Predicted vs actual for every quote, drawn as counts per cell rather than one marker per quote."""
+    plt.figure(figsize=(8, 8))
+    plt.pcolormesh(edges, edges, np.ma.masked_equal(hist.T, 0), norm=LogNorm(), cmap='viridis')
+    plt.colorbar(label='Quotes')
+    plt.plot([edges[0], edges[-1]], [edges[0], edges[-1]], 'r--', lw=2)
+    plt.xlabel('Actual Premium (£)')
+    plt.ylabel('Predicted Premium (£)')
+    plt.title(f'Predicted vs Actual Premium ({n:,} quotes)')
+    plt.tight_layout()
+    plt.savefig('evaluation/plots/predicted_vs_actual.png')
+    plt.close()
+
+def plot_residual_sample(y: np.ndarray, y_pred: np.ndarray, n: int):
+    plt.figure(figsize=(8, 6))
+    plt.scatter(y, y_pred - y, s=4, alpha=0.3)
+    plt.axhline(0, color='r', ls='--', lw=2)
+    plt.xlabel('Actual Premium (£)')
+    plt.ylabel('Predicted - Actual (£)')
+    plt.title(f'Residuals (uniform sample of {len(y):,} of {n:,} quotes)')
+    plt.tight_layout()
+    plt.savefig('evaluation/plots/residuals_sample.png')
+    plt.close()
+
+def run_model_evaluation(streaming: bool = None, chunk_rows: int = EVAL_CHUNK_ROWS, workers: int = EVAL_WORKERS):
+    """Runs model evaluation and returns metrics. streaming=None picks by portfolio size."""
     # Load model
     model_path = 'pricing_model/model.pkl'
     if not os.path.exists(model_path):
         return {"error": f"Model not found at {model_path}"}
-    
+
     with open(model_path, 'rb') as f:
         model_data = pickle.load(f)
-    
+
     model = model_data['model']
     features = model_data['features']
-    
+
     # Load data for evaluation
     db_path = 'database/quotes.db'
     if not os.path.exists(db_path):
         return {"error": f"Database not found at {db_path}"}
-        
-    conn = sqlite3.connect(db_path)
-    df = pd.read_sql_query("SELECT * FROM quotes", conn)
-    conn.close()
-    
+
+    n_rows = sync_quotes(db_path, QUOTES_DATASET_DIR, verbose=False)['exported_through']
+    if streaming is None:
+        streaming = n_rows > EVAL_STREAMING_ROWS
+
+    os.makedirs('evaluation/plots', exist_ok=True)
+    # 1. Feature Importance
+    plot_feature_importance(model, features)
+
+    if streaming:
+        running, hist, edges, (_, y_sample, pred_sample) = evaluate_streaming(
+            model_path, QUOTES_DATASET_DIR, n_rows, chunk_rows, workers
+        )
+        # 2. Predicted vs Actual, from the histogram and the reservoir sample
+        plot_predicted_vs_actual_density(hist, edges, running.n)
+        plot_residual_sample(y_sample, pred_sample, running.n)
+        return {**running.result(), "rows": running.n, "mode": "streaming"}
+
+    # Only the model's features and the target are read from the Parquet copy
+    df = read_quotes(features + ['premium'], db_path=db_path, sync=False).to_pandas()
+
     X = df[features]
     y = df['premium']
-    
+
     # Predict
     y_pred = model.predict(X)
-    
+
     # Calculate Metrics
     mae = mean_absolute_error(y, y_pred)
     mse = mean_squared_error(y, y_pred)
     rmse = np.sqrt(mse)
     r2 = r2_score(y, y_pred)
-    
-    # Visualizations
-    os.makedirs('evaluation/plots', exist_ok=True)
-    
-    # 1. Feature Importance
-    plt.figure(figsize=(10, 6))
-    lgb_importance = pd.DataFrame({
-        'feature': features,
-        'importance': model.feature_importances_
-    }).sort_values(by='importance', ascending=False)
-    
-    sns.barplot(x='importance', y='feature', data=lgb_importance, hue='feature', palette='viridis', legend=False)
-    plt.title('Feature Importance (LightGBM)')
-    plt.tight_layout()
-    plt.savefig('evaluation/plots/feature_importance.png')
-    plt.close() # Close plot to free memory
-    
+
     # 2. Predicted vs Actual
     plt.figure(figsize=(8, 8))
     plt.scatter(y, y_pred, alpha=0.5)
@@ -71,17 +254,26 @@ def run_model_evaluation():
     return {
         "mae": mae,
         "rmse": rmse,
-        "r2": r2
+        "r2": r2,
+        "rows": len(y),
+        "mode": "in-memory"
     }
 
 if __name__ == "__main__":
-    metrics = run_model_evaluation()
+    parser = argparse.ArgumentParser(description="Evaluate the pricing model on every quote.")
+    parser.add_argument('--streaming', action='store_true', help=f"Evaluate in chunks (default above {EVAL_STREAMING_ROWS:,} quotes)")
+    parser.add_argument('--chunk-rows', type=int, default=EVAL_CHUNK_ROWS, help="Quotes per chunk when streaming")
+    parser.add_argument('--workers', type=int, default=EVAL_WORKERS, help="Processes predicting chunks in parallel")
+    args = parser.parse_args()
+
+    metrics = run_model_evaluation(streaming=args.streaming or None, chunk_rows=args.chunk_rows, workers=args.workers)
     if "error" in metrics:
         print(metrics["error"])
     else:
         print("\n" + "="*40)
         print("          MODEL EVALUATION REPORT")
         print("="*40)
+        print(f"Quotes evaluated:        {metrics['rows']:,} ({metrics['mode']})")
         print(f"Mean Absolute Error:     £{metrics['mae']:.2f}")
         print(f"Root Mean Squared Error:  £{metrics['rmse']:.2f}")
         print(f"R2 Score:                {metrics['r2']:.4f}")
@@ -1,63 +1,255 @@
 import pickle
-import pandas as pd
-import shap
+import numpy as np
 import os
-import json
+import sys
+import hashlib
+import threading
 from datetime import datetime
 
-# Load model globally to avoid reloading on every call
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from pricing_model.tree_engine import TreeEnsemble
+from pricing_model.tree_shap import TreeShapExplainer
+from pricing_model.build_pricing_grid import load_pricing_grid, verify_pricing_grid
+from pricing_model.registry import ModelRegistry
+from observability.audit_log import get_audit_log
+
+# Unversioned model file, used until a version has been published to the registry
 MODEL_PATH = 'pricing_model/model.pkl'
 
+# Inference engine for premiums: 'lightgbm' (booster predict) or 'numpy' (flattened tree arrays)
+PRICING_ENGINE = os.getenv("PRICING_ENGINE", "lightgbm")
+
+# SHAP implementation: 'native' (precomputed NumPy TreeSHAP) or 'shap' (shap.TreeExplainer per call)
+SHAP_BACKEND = os.getenv("SHAP_BACKEND", "native")
+
+# Precomputed premium/SHAP grid: 'auto' (use when built for the current model) or 'off'
+PRICING_GRID = os.getenv("PRICING_GRID", "auto")
+
+# SHAP audit trail (rotation, compression and backpressure: see observability/audit_log.py)
+SHAP_LOG_PATH = os.getenv("SHAP_LOG_PATH", "logs/shap_results.jsonl")
+
+# Flattened trees, native explainer and grid keyed by model version. The active and the
+# previous version are kept so requests still holding the old model_data after a swap
+# don't rebuild its components.
+_TREE_ENGINE_CACHE = {}
+_COMPONENT_VERSIONS_KEPT = 2
+_COMPONENT_LOCK = threading.Lock()
+
+def get_model_version(model_data: dict) -> str:
+    """Registry version, or a content hash of the booster for an unpublished model.pkl."""
+    if not model_data.get('version'):
+        model_string = model_data['model'].booster_.model_to_string()
+        model_data['version'] = hashlib.sha256(model_string.encode()).hexdigest()[:12]
+    return model_data['version']
+
+def warm_model(model_data: dict):
+    """Builds every per-version component up front so the first request doesn't pay for it."""
+    get_tree_engine(model_data)
+    get_explainer(model_data)
+    get_pricing_grid(model_data)
+
+_REGISTRY = ModelRegistry(warmup=warm_model)
+_LEGACY_MODEL = {}
+
+def get_registry() -> ModelRegistry:
+    return _REGISTRY
+
 def get_model_data():
+    """
+    The active model. Published registry versions are loaded once and hot-swapped by
+    the registry's watcher; a bare model.pkl (no registry yet) is reloaded only when
+    the file changes.
+    """
+    model_data = _REGISTRY.active()
+    if model_data is not None:
+        return model_data
+
     if not os.path.exists(MODEL_PATH):
         raise FileNotFoundError(f"Model not found at {MODEL_PATH}. Please run train_model.py first.")
-    
-    with open(MODEL_PATH, 'rb') as f:
-        return pickle.load(f)
+    mtime = os.path.getmtime(MODEL_PATH)
+    if _LEGACY_MODEL.get('mtime') != mtime:
+        with open(MODEL_PATH, 'rb') as f:
+            _LEGACY_MODEL['model_data'] = pickle.load(f)
+        _LEGACY_MODEL['mtime'] = mtime
+    return _LEGACY_MODEL['model_data']
+
+def _get_compiled_components(model_data: dict) -> dict:
+    key = get_model_version(model_data)
+    components = _TREE_ENGINE_CACHE.get(key)
+    if components is None:
+        with _COMPONENT_LOCK:
+            if key not in _TREE_ENGINE_CACHE:
+                while len(_TREE_ENGINE_CACHE) >= _COMPONENT_VERSIONS_KEPT:
+                    _TREE_ENGINE_CACHE.pop(next(iter(_TREE_ENGINE_CACHE)))
+                # Arrays-format versions ship their flattened trees; pickles are flattened here
+                engine = model_data.get('tree_engine') or TreeEnsemble.from_booster(model_data['model'].booster_)
+                _TREE_ENGINE_CACHE[key] = {'engine': engine}
+            components = _TREE_ENGINE_CACHE[key]
+    return components
+
+def get_tree_engine(model_data: dict) -> TreeEnsemble:
+    return _get_compiled_components(model_data)['engine']
+
+def get_booster(model_data: dict):
+    """The LightGBM booster; for arrays-format versions it is read from model.txt on first use."""
+    if 'model' in model_data:
+        return model_data['model'].booster_
+    components = _get_compiled_components(model_data)
+    if 'booster' not in components:
+        import lightgbm as lgb
+        components['booster'] = lgb.Booster(model_file=model_data['booster_file'])
+    return components['booster']
+
+def get_pricing_grid(model_data: dict):
+    """Loads and self-tests the grid for the current model once; None if absent, disabled or stale."""
+    if PRICING_GRID == "off":
+        return None
+    components = _get_compiled_components(model_data)
+    if 'grid' not in components:
+        grid = load_pricing_grid(get_model_version(model_data))
+        if grid is not None and not verify_pricing_grid(grid, components['engine'], get_explainer(model_data, "native")):
+            print(f"Pricing grid for model {grid.version} failed its self-test; using live inference")
+            grid = None
+        components['grid'] = grid
+    return components['grid']
+
+def build_explainer(model_data: dict, tree_engine: TreeEnsemble, backend: str = None):
+    """Returns an object with shap_values(X) and expected_value for the chosen backend."""
+    backend = backend or SHAP_BACKEND
+    if backend == "native":
+        try:
+            return TreeShapExplainer(tree_engine)
+        except NotImplementedError as e:
+            print(f"Native TreeSHAP unavailable ({e}); falling back to shap.TreeExplainer")
+    elif backend != "shap":
+        raise ValueError(f"Unknown SHAP backend '{backend}'. Expected 'native' or 'shap'.")
+    import shap
+    return shap.TreeExplainer(get_booster(model_data))
+
+def get_explainer(model_data: dict, backend: str = None):
+    backend = backend or SHAP_BACKEND
+    if backend == "shap":
+        # Baseline behaviour: a fresh shap.TreeExplainer per call
+        return build_explainer(model_data, None, backend)
+    components = _get_compiled_components(model_data)
+    if 'explainer' not in components:
+        components['explainer'] = build_explainer(model_data, components['engine'], backend)
+    return components['explainer']
+
+def resolve_engine(engine: str = None) -> str:
+    engine = engine or PRICING_ENGINE
+    if engine not in ("lightgbm", "numpy"):
+        raise ValueError(f"Unknown pricing engine '{engine}'. Expected 'lightgbm' or 'numpy'.")
+    return engine
+
+def predict_raw(model_data: dict, X: np.ndarray, engine: str = None) -> np.ndarray:
+    """Premiums for a feature matrix using the selected inference engine."""
+    if resolve_engine(engine) == "numpy":
+        return get_tree_engine(model_data).predict(X)
+    return get_booster(model_data).predict(X)
+
+def profiles_to_matrix(profiles: list, features: list) -> np.ndarray:
+    """Builds an (n_profiles, n_features) float matrix in model feature order."""
+    return np.array([[p[f] for f in features] for p in profiles], dtype=np.float64)
 
-def predict_premium(profile: dict) -> dict:
+def format_shap_row(shap_row, features: list) -> dict:
+    return {feature: float(shap_row[i]) for i, feature in enumerate(features)}
+
+def log_shap_results(results: list):
+    # Enqueue only; the background writer batches, rotates and flushes on shutdown
+    get_audit_log(SHAP_LOG_PATH).write(results)
+
+def price_matrix(model_data: dict, X: np.ndarray, engine: str = None, shap_backend: str = None) -> tuple:
+    """
+    Premiums, SHAP values (n_rows, n_features) and base value for a feature matrix.
+    On-grid rows are answered from the precomputed grid; the rest go through live inference.
+    """
+    # An explicit backend request (e.g. comparing against shap) always runs live
+    grid = get_pricing_grid(model_data) if engine is None and shap_backend is None else None
+    if grid is not None:
+        on_grid, grid_premiums, grid_shap = grid.lookup(X)
+        if on_grid.all():
+            return grid_premiums, grid_shap, grid.base_value
+    else:
+        on_grid = np.zeros(len(X), dtype=bool)
+
+    live = ~on_grid
+    explainer = get_explainer(model_data, shap_backend)
+    premiums = np.empty(len(X))
+    shap_values = np.empty(X.shape)
+    premiums[live] = predict_raw(model_data, X[live], engine)
+    live_shap = explainer.shap_values(X[live])
+    # TreeExplainer might return a list of arrays if it's multi-output,
+    # but for regression it should be a single array.
+    shap_values[live] = live_shap[0] if isinstance(live_shap, list) else live_shap
+    if grid is not None:
+        premiums[on_grid] = grid_premiums
+        shap_values[on_grid] = grid_shap
+    return premiums, shap_values, float(explainer.expected_value)
+
+def predict_premium(profile: dict, engine: str = None, shap_backend: str = None) -> dict:
     model_data = get_model_data()
-    model = model_data['model']
     features = model_data['features']
     
-    # Convert profile to DataFrame with correct column order
-    df = pd.DataFrame([profile])[features]
+    # Convert profile to a one-row matrix with correct column order
+    X = profiles_to_matrix([profile], features)
     
-    # Predict premium
-    premium = model.predict(df)[0]
-    
-    # Calculate SHAP values
-    explainer = shap.TreeExplainer(model)
-    shap_values = explainer.shap_values(df)
-    
-    # Format SHAP values for response
-    # TreeExplainer might return a list of arrays if it's multi-output, 
-    # but for regression it should be a single array.
-    if isinstance(shap_values, list):
-        shap_vals = shap_values[0][0]
-    else:
-        shap_vals = shap_values[0]
-        
-    explanation = {}
-    for i, feature in enumerate(features):
-        explanation[feature] = float(shap_vals[i])
+    # Predict premium and SHAP values (grid lookup when on-grid)
+    premiums, shap_values, base_value = price_matrix(model_data, X, engine, shap_backend)
         
     result = {
         "timestamp": datetime.now().isoformat(),
         "profile": profile,
-        "predicted_premium": round(float(premium), 2),
-        "shap_values": explanation,
-        "base_value": float(explainer.expected_value)
+        "predicted_premium": round(float(premiums[0]), 2),
+        "shap_values": format_shap_row(shap_values[0], features),
+        "base_value": base_value,
+        "model_version": get_model_version(model_data)
     }
     
     # Log the result
-    log_dir = 'logs'
-    os.makedirs(log_dir, exist_ok=True)
-    with open(os.path.join(log_dir, 'shap_results.jsonl'), 'a') as f:
-        f.write(json.dumps(result) + '\n')
+    log_shap_results([result])
         
     return result
 
+def price_profiles(profiles: list, engine: str = None, shap_backend: str = None) -> list:
+    """
+    Prices N profiles with a single booster predict call and a single SHAP call.
+    Returns one result dict per profile, in input order, shaped like predict_premium.
+    Nothing is logged; see predict_premium_batch.
+    """
+    if not profiles:
+        return []
+
+    model_data = get_model_data()
+    features = model_data['features']
+    
+    # One contiguous matrix for the whole batch; both engines skip the
+    # sklearn wrapper's per-call DataFrame validation.
+    X = profiles_to_matrix(profiles, features)
+    premiums, shap_values, base_value = price_matrix(model_data, X, engine, shap_backend)
+    
+    timestamp = datetime.now().isoformat()
+    model_version = get_model_version(model_data)
+    return [
+        {
+            "timestamp": timestamp,
+            "profile": profile,
+            "predicted_premium": round(float(premium), 2),
+            "shap_values": format_shap_row(shap_row, features),
+            "base_value": base_value,
+            "model_version": model_version
+        }
+        for profile, premium, shap_row in zip(profiles, premiums, shap_values)
+    ]
+
+def predict_premium_batch(profiles: list, engine: str = None, shap_backend: str = None) -> list:
+    """Vectorized predict_premium: prices every profile in one pass and audit-logs the results."""
+    results = price_profiles(profiles, engine, shap_backend)
+    if results:
+        log_shap_results(results)
+    return results
+
 if __name__ == "__main__":
     # Test prediction
     sample_profile = {
@@ -74,3 +266,16 @@ if __name__ == "__main__":
     for feat, val in result['shap_values'].items():
         print(f"  {feat}: {val:+.2f}")
     print(f"Base Value: {result['base_value']:.2f}")
+    
+    batch_result = predict_premium_batch([sample_profile])[0]
+    assert batch_result['predicted_premium'] == result['predicted_premium'], "Batch and single-row premiums differ"
+    print(f"Batch path premium: {batch_result['predicted_premium']}")
+    
+    numpy_result = predict_premium(sample_profile, engine="numpy")
+    assert numpy_result['predicted_premium'] == result['predicted_premium'], "NumPy engine and LightGBM premiums differ"
+    print(f"NumPy engine premium: {numpy_result['predicted_premium']}")
+    
+    shap_result = predict_premium(sample_profile, shap_backend="shap")
+    for feat, val in shap_result['shap_values'].items():
+        assert abs(val - result['shap_values'][feat]) < 1e-6, f"Native and shap SHAP values differ for {feat}"
+    print("Native TreeSHAP matches shap.TreeExplainer")
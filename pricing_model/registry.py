@@ -0,0 +1,211 @@
+import os
+import sys
+import time
+import json
+import pickle
+import shutil
+import hashlib
+import threading
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pricing_model.tree_engine import TreeEnsemble
+from pricing_model.tree_shap import native_explainer_limit
+
+REGISTRY_DIR = 'pricing_model/versions'
+LATEST_FILE = 'LATEST'
+MODEL_FILE = 'model.pkl'
+# Fast-loading format: native booster text, JSON sidecar and flattened tree arrays
+BOOSTER_FILE = 'model.txt'
+METADATA_FILE = 'metadata.json'
+TREES_DIR = 'trees'
+
+# Artifact served from each version: 'pickle' (sklearn wrapper dict) or 'arrays'
+# (mmap'd tree arrays; no unpickling, lightgbm only imported if PRICING_ENGINE=lightgbm)
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "pickle")
+
+# How often serving processes look for a newly published version (seconds, 0 disables)
+MODEL_POLL_INTERVAL = float(os.getenv("MODEL_POLL_INTERVAL", "30"))
+
+def _write_atomic(path: str, content: str):
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def make_version(model) -> str:
+    """Sortable, content-addressed version id: <UTC timestamp>-<booster hash>."""
+    digest = hashlib.sha256(model.booster_.model_to_string().encode()).hexdigest()[:8]
+    return f"{time.strftime('%Y%m%d%H%M%S', time.gmtime())}-{digest}"
+
+class BoosterModel:
+    """
+    Minimal LGBMRegressor-like view of a raw `lightgbm.Booster` (e.g. from `lgb.train`),
+    so models trained outside the sklearn API publish and serve the same way.
+    """
+
+    def __init__(self, booster):
+        self.booster_ = booster
+
+    def predict(self, X):
+        return self.booster_.predict(X)
+
+    @property
+    def feature_importances_(self):
+        return self.booster_.feature_importance()
+
+def publish_model(model_data: dict, registry_dir: str = REGISTRY_DIR) -> str:
+    """
+    Writes a new immutable version directory and then flips LATEST to it.
+    Readers only ever see complete versions: the directory is renamed into place
+    before the pointer changes, and the pointer itself is replaced atomically.
+    """
+    version = model_data.get('version') or make_version(model_data['model'])
+    model_data['version'] = version
+
+    os.makedirs(registry_dir, exist_ok=True)
+    final_dir = os.path.join(registry_dir, version)
+    tmp_dir = os.path.join(registry_dir, f".{version}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    booster = model_data['model'].booster_
+    with open(os.path.join(tmp_dir, MODEL_FILE), 'wb') as f:
+        pickle.dump(model_data, f)
+    booster.save_model(os.path.join(tmp_dir, BOOSTER_FILE))
+    try:
+        ensemble = TreeEnsemble.from_booster(booster)
+        ensemble.save(os.path.join(tmp_dir, TREES_DIR))
+    except NotImplementedError as e:
+        # Still publishable; this version is then always served from the pickle
+        print(f"Skipping flattened tree arrays for version {version}: {e}")
+    else:
+        limit = native_explainer_limit(ensemble)
+        if limit is not None:
+            print(f"Version {version} will be explained by shap.TreeExplainer, not the native TreeSHAP: {limit}")
+    with open(os.path.join(tmp_dir, METADATA_FILE), 'w') as f:
+        json.dump({
+            'version': version,
+            'features': model_data['features'],
+            'metrics': {k: float(v) for k, v in model_data.get('metrics', {}).items()},
+            'training': model_data.get('training', {}),
+            'published_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }, f, indent=2)
+
+    os.replace(tmp_dir, final_dir)
+    _write_atomic(os.path.join(registry_dir, LATEST_FILE), version)
+    return version
+
+def list_versions(registry_dir: str = REGISTRY_DIR) -> list:
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(registry_dir)
+        if not name.startswith('.') and os.path.isfile(os.path.join(registry_dir, name, MODEL_FILE))
+    )
+
+def load_arrays_artifact(version_dir: str) -> dict:
+    """
+    Loads a version without unpickling: features/metrics from the sidecar and the
+    flattened trees memory-mapped. The result has no 'model' key; 'tree_engine' and
+    'booster_file' take its place (see pricing_model/predict.py).
+    """
+    with open(os.path.join(version_dir, METADATA_FILE), 'r') as f:
+        metadata = json.load(f)
+    return {
+        'features': metadata['features'],
+        'metrics': metadata['metrics'],
+        'tree_engine': TreeEnsemble.load(os.path.join(version_dir, TREES_DIR)),
+        'booster_file': os.path.join(version_dir, BOOSTER_FILE)
+    }
+
+class ModelRegistry:
+    """
+    Serving-side view of the registry: one active model, swapped atomically.
+
+    Each version is unpickled and warmed (via `warmup`, e.g. building the tree engine,
+    explainer and pricing grid) exactly once, off the request path. Requests read
+    `active()` which is a single reference assignment away from the new version, so
+    in-flight requests keep using the model_data they already hold. Only the first
+    `active()` call reads LATEST; after that it serves the snapshot the watcher keeps
+    current (or, with polling disabled, whatever `refresh()` last activated).
+    """
+
+    def __init__(self, registry_dir: str = REGISTRY_DIR, warmup=None, poll_interval: float = MODEL_POLL_INTERVAL,
+                 model_format: str = MODEL_FORMAT):
+        if model_format not in ("pickle", "arrays"):
+            raise ValueError(f"Unknown model format '{model_format}'. Expected 'pickle' or 'arrays'.")
+        self.registry_dir = registry_dir
+        self.model_format = model_format
+        self.warmup = warmup
+        self.poll_interval = poll_interval
+        self._active = None
+        self._initialized = False
+        self._load_lock = threading.Lock()
+        self._init_lock = threading.Lock()
+        self._watch_lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def latest_version(self):
+        path = os.path.join(self.registry_dir, LATEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return f.read().strip() or None
+
+    def load_version(self, version: str) -> dict:
+        if self.model_format == "arrays" and os.path.isdir(os.path.join(self.registry_dir, version, TREES_DIR)):
+            model_data = load_arrays_artifact(os.path.join(self.registry_dir, version))
+        else:
+            with open(os.path.join(self.registry_dir, version, MODEL_FILE), 'rb') as f:
+                model_data = pickle.load(f)
+        model_data['version'] = version
+        if self.warmup is not None:
+            self.warmup(model_data)
+        return model_data
+
+    @property
+    def active_version(self):
+        return self._active['version'] if self._active else None
+
+    def refresh(self) -> bool:
+        """Loads and activates LATEST if it differs from the active version. Returns True on swap."""
+        with self._load_lock:
+            latest = self.latest_version()
+            if latest is None or latest == self.active_version:
+                return False
+            model_data = self.load_version(latest)
+            previous = self.active_version
+            self._active = model_data
+        print(f"Model registry: activated version {latest}" + (f" (was {previous})" if previous else ""))
+        return True
+
+    def active(self):
+        """The active model_data, loading LATEST synchronously on first use. None if nothing was published."""
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self.refresh()
+                    self._initialized = True
+            self.start_watching()
+        return self._active
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                # A half-written or broken version must not take serving down; keep the old one
+                print(f"Model registry: failed to activate new version: {e}")
+
+    def start_watching(self):
+        with self._watch_lock:
+            if self.poll_interval <= 0 or self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, name="model-registry-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
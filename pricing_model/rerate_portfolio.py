@@ -0,0 +1,360 @@
+"""
+Portfolio re-rating: how every stored quote would move from one model to another.
+
+Both models score the whole quotes table, read from its Parquet copy in rowid chunks.
+The chunks are spread over a process pool. Each chunk writes two files:
+  * deltas/chunk=NNNNN.parquet: rowid, old and new premium (rounded to the penny as
+    quoted), delta and delta_pct for every quote in the chunk;
+  * segments/chunk=NNNNN.parquet: additive partials per (age band, vehicle group
+    band, claims count) segment.
+Files are renamed into place once complete, so an interrupted run is resumed by
+rerunning the same command: chunks whose files exist are skipped. When every chunk
+is done, the segment partials are combined into impact_by_segment.parquet and the
+overall impact is recorded in run.json.
+
+Models are registry versions (pricing_model/versions/<version>) or paths to a
+model.pkl / LightGBM model.txt, e.g. a candidate not yet published. The candidate
+has no default, and two specs naming the same model are rejected (train_model.py
+writes model.pkl and publishes it as LATEST, so those two are one model).
+Segments use the cohort bands of mcp_server/cohort_stats.py.
+
+Usage: python pricing_model/rerate_portfolio.py --new pricing_model/model.pkl [--old LATEST] [--workers 4]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import pickle
+import argparse
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import lightgbm as lgb
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from pricing_model.registry import REGISTRY_DIR, LATEST_FILE, BOOSTER_FILE, METADATA_FILE
+from database.quotes_dataset import sync_quotes, quotes_dataset, QUOTES_DATASET_DIR, ROW_GROUP_ROWS
+from database.store import DB_PATH
+from mcp_server.cohort_stats import AGE_BANDS, VEHICLE_GROUP_BANDS
+
+RERATE_OUTPUT_DIR = os.getenv("RERATE_OUTPUT_DIR", "data/rerating")
+RERATE_CHUNK_ROWS = int(os.getenv("RERATE_CHUNK_ROWS", str(4 * ROW_GROUP_ROWS)))
+RUN_FILE = "run.json"
+SEGMENTS_FILE = "impact_by_segment.parquet"
+
+# Segments: cohort age and vehicle group bands x claims count (capped)
+CLAIMS_MAX = 5
+# Quotes moving by more than this (percent) either way are counted as material moves
+MATERIAL_MOVE_PCT = 5.0
+
+# Per-segment partials; all additive except the min/max, which combine with min/max
+PARTIAL_SUMS = ('quotes', 'old_premium_sum', 'new_premium_sum', 'delta_sum', 'delta_sq_sum', 'delta_pct_sum',
+                'material_increases', 'material_decreases')
+
+DELTA_SCHEMA = pa.schema([
+    ('rowid', pa.int64()),
+    ('old_premium', pa.float64()),
+    ('new_premium', pa.float64()),
+    ('delta', pa.float64()),
+    ('delta_pct', pa.float64())
+])
+
+def _band_labels(bounds: tuple, upper: int) -> list:
+    return [f"{lo}-{hi - 1}" for lo, hi in zip(bounds, bounds[1:])] + [f"{bounds[-1]}-{upper}" if upper else f"{bounds[-1]}+"]
+
+AGE_LABELS = _band_labels(AGE_BANDS, None)
+VEHICLE_GROUP_LABELS = _band_labels(VEHICLE_GROUP_BANDS, 50)
+N_SEGMENTS = len(AGE_BANDS) * len(VEHICLE_GROUP_BANDS) * (CLAIMS_MAX + 1)
+
+def resolve_model(spec: str, registry_dir: str = REGISTRY_DIR) -> dict:
+    """
+    'LATEST', a registry version id, or a path to a model.pkl / model.txt ->
+    {'name', 'booster_file' or 'model_pkl', 'features'}.
+    """
+    if spec == 'LATEST':
+        with open(os.path.join(registry_dir, LATEST_FILE), 'r') as f:
+            spec = f.read().strip()
+    version_dir = os.path.join(registry_dir, spec)
+    if os.path.isdir(version_dir):
+        with open(os.path.join(version_dir, METADATA_FILE), 'r') as f:
+            features = json.load(f)['features']
+        return {'name': spec, 'booster_file': os.path.abspath(os.path.join(version_dir, BOOSTER_FILE)), 'features': features}
+    if not os.path.isfile(spec):
+        raise FileNotFoundError(f"'{spec}' is neither a version in {registry_dir} nor a model file.")
+    if spec.endswith('.pkl'):
+        with open(spec, 'rb') as f:
+            model_data = pickle.load(f)
+        name = model_data.get('version') or f"{os.path.basename(spec)}@{int(os.path.getmtime(spec))}"
+        return {'name': name, 'model_pkl': os.path.abspath(spec), 'features': model_data['features']}
+    booster = lgb.Booster(model_file=spec)
+    name = f"{os.path.basename(spec)}@{int(os.path.getmtime(spec))}"
+    metadata_path = os.path.join(os.path.dirname(os.path.abspath(spec)), METADATA_FILE)
+    if os.path.basename(spec) == BOOSTER_FILE and os.path.isfile(metadata_path):
+        # A published version's booster goes by the version's name
+        with open(metadata_path, 'r') as f:
+            name = json.load(f)['version']
+    return {'name': name, 'booster_file': os.path.abspath(spec), 'features': booster.feature_name()}
+
+def _load_booster(model: dict):
+    if 'booster_file' in model:
+        return lgb.Booster(model_file=model['booster_file'])
+    with open(model['model_pkl'], 'rb') as f:
+        return pickle.load(f)['model'].booster_
+
+def segment_ids(age: np.ndarray, vehicle_group: np.ndarray, claims_count: np.ndarray) -> np.ndarray:
+    """Flat segment index, row-major over (age band, vehicle group band, claims count)."""
+    age_band = np.searchsorted(AGE_BANDS, age, side='right') - 1
+    vehicle_band = np.searchsorted(VEHICLE_GROUP_BANDS, vehicle_group, side='right') - 1
+    claims = np.clip(claims_count, 0, CLAIMS_MAX)
+    return (np.clip(age_band, 0, None) * len(VEHICLE_GROUP_BANDS) + np.clip(vehicle_band, 0, None)) * (CLAIMS_MAX + 1) + claims
+
+def _segment_partials(segment: np.ndarray, old: np.ndarray, new: np.ndarray, delta: np.ndarray,
+                      delta_pct: np.ndarray) -> pa.Table:
+    counts = lambda weights=None: np.bincount(segment, weights, minlength=N_SEGMENTS)
+    present = counts() > 0
+    min_delta = np.full(N_SEGMENTS, np.inf)
+    max_delta = np.full(N_SEGMENTS, -np.inf)
+    np.minimum.at(min_delta, segment, delta)
+    np.maximum.at(max_delta, segment, delta)
+    ids = np.flatnonzero(present)
+    columns = {
+        'segment': ids,
+        'quotes': counts()[ids].astype(np.int64),
+        'old_premium_sum': counts(old)[ids],
+        'new_premium_sum': counts(new)[ids],
+        'delta_sum': counts(delta)[ids],
+        'delta_sq_sum': counts(delta ** 2)[ids],
+        'delta_pct_sum': counts(delta_pct)[ids],
+        'material_increases': counts(delta_pct > MATERIAL_MOVE_PCT)[ids].astype(np.int64),
+        'material_decreases': counts(delta_pct < -MATERIAL_MOVE_PCT)[ids].astype(np.int64),
+        'min_delta': min_delta[ids],
+        'max_delta': max_delta[ids]
+    }
+    return pa.table(columns)
+
+# --- Workers ---
+
+_WORKER = {}
+
+def _init_worker(old_model: dict, new_model: dict, dataset_dir: str, output_dir: str, n_threads: int):
+    _WORKER.update(
+        old=(_load_booster(old_model), old_model['features']),
+        new=(_load_booster(new_model), new_model['features']),
+        dataset=quotes_dataset(dataset_dir),
+        output_dir=output_dir,
+        n_threads=n_threads
+    )
+
+def _write_atomic(table: pa.Table, path: str):
+    # Dot-prefixed until complete; a chunk counts as done only once both files are in place
+    tmp_path = os.path.join(os.path.dirname(path), "." + os.path.basename(path) + ".tmp")
+    pq.write_table(table, tmp_path, compression='snappy')
+    os.replace(tmp_path, path)
+
+def _rerate_chunk(chunk: int, lo: int, hi: int) -> int:
+    """Scores quotes with lo <= rowid < hi under both models and writes the chunk's files. Returns rows."""
+    (old_booster, old_features), (new_booster, new_features) = _WORKER['old'], _WORKER['new']
+    columns = sorted(set(old_features) | set(new_features) | {'age', 'vehicle_group', 'claims_count'})
+    table = _WORKER['dataset'].to_table(
+        columns=['rowid'] + columns,
+        filter=(ds.field('rowid') >= lo) & (ds.field('rowid') < hi)
+    )
+    data = {name: table.column(name).to_numpy() for name in table.column_names}
+
+    def score(booster, features):
+        if not len(data['rowid']):
+            return np.empty(0)
+        X = np.column_stack([data[f] for f in features]).astype(np.float64)
+        # Premiums are quoted to the penny (see predict_premium)
+        return np.round(booster.predict(X, num_threads=_WORKER['n_threads']), 2)
+
+    old = score(old_booster, old_features)
+    new = score(new_booster, new_features)
+    delta = new - old
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta_pct = np.where(old != 0, delta / old * 100, 0.0)
+
+    output_dir = _WORKER['output_dir']
+    _write_atomic(
+        pa.Table.from_arrays([pa.array(data['rowid']), pa.array(old), pa.array(new), pa.array(delta), pa.array(delta_pct)],
+                             schema=DELTA_SCHEMA),
+        os.path.join(output_dir, 'deltas', f"chunk={chunk:05d}.parquet")
+    )
+    segment = segment_ids(data['age'], data['vehicle_group'], data['claims_count'])
+    _write_atomic(_segment_partials(segment, old, new, delta, delta_pct),
+                  os.path.join(output_dir, 'segments', f"chunk={chunk:05d}.parquet"))
+    return len(old)
+
+# --- Driver ---
+
+def _chunk_done(output_dir: str, chunk: int) -> bool:
+    return all(os.path.exists(os.path.join(output_dir, part, f"chunk={chunk:05d}.parquet")) for part in ('deltas', 'segments'))
+
+def combine_segments(output_dir: str) -> pa.Table:
+    """Merges every chunk's partials into one row per segment with the impact measures."""
+    partials = ds.dataset(os.path.join(output_dir, 'segments'), format='parquet', ignore_prefixes=['.']).to_table()
+    sums = partials.group_by('segment').aggregate(
+        [(name, 'sum') for name in PARTIAL_SUMS] + [('min_delta', 'min'), ('max_delta', 'max')]
+    ).sort_by('segment')
+    segment = sums.column('segment').to_numpy()
+    col = lambda name: sums.column(name).to_numpy()
+    quotes = col('quotes_sum').astype(np.float64)
+    mean_delta = col('delta_sum_sum') / quotes
+    n_bands = (len(VEHICLE_GROUP_BANDS), CLAIMS_MAX + 1)
+    return pa.table({
+        'age_band': [AGE_LABELS[i] for i in segment // (n_bands[0] * n_bands[1])],
+        'vehicle_group_band': [VEHICLE_GROUP_LABELS[i] for i in segment // n_bands[1] % n_bands[0]],
+        'claims_count': (segment % n_bands[1]).astype(np.int8),
+        'quotes': col('quotes_sum'),
+        'mean_old_premium': col('old_premium_sum_sum') / quotes,
+        'mean_new_premium': col('new_premium_sum_sum') / quotes,
+        'mean_delta': mean_delta,
+        'std_delta': np.sqrt(np.maximum(col('delta_sq_sum_sum') / quotes - mean_delta ** 2, 0.0)),
+        'mean_delta_pct': col('delta_pct_sum_sum') / quotes,
+        # Relative move of the segment's total premium
+        'premium_change_pct': (col('new_premium_sum_sum') / col('old_premium_sum_sum') - 1) * 100,
+        'material_increase_share': col('material_increases_sum') / quotes,
+        'material_decrease_share': col('material_decreases_sum') / quotes,
+        'min_delta': col('min_delta_min'),
+        'max_delta': col('max_delta_max')
+    })
+
+def overall_impact(segments: pa.Table) -> dict:
+    col = lambda name: segments.column(name).to_numpy()
+    quotes = col('quotes')
+    n = int(quotes.sum())
+    old_total = float((col('mean_old_premium') * quotes).sum())
+    new_total = float((col('mean_new_premium') * quotes).sum())
+    return {
+        'quotes': n,
+        'old_premium_total': round(old_total, 2),
+        'new_premium_total': round(new_total, 2),
+        'premium_change_pct': (new_total / old_total - 1) * 100 if old_total else 0.0,
+        'mean_delta': (new_total - old_total) / n if n else 0.0,
+        'material_increase_share': float((col('material_increase_share') * quotes).sum() / n) if n else 0.0,
+        'material_decrease_share': float((col('material_decrease_share') * quotes).sum() / n) if n else 0.0,
+        'min_delta': float(col('min_delta').min()) if n else 0.0,
+        'max_delta': float(col('max_delta').max()) if n else 0.0
+    }
+
+def _write_run(output_dir: str, run: dict):
+    tmp_path = os.path.join(output_dir, RUN_FILE + ".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(run, f, indent=2)
+    os.replace(tmp_path, os.path.join(output_dir, RUN_FILE))
+
+def rerate_portfolio(old: str, new: str, db_path: str = DB_PATH,
+                     dataset_dir: str = QUOTES_DATASET_DIR, output_dir: str = None, chunk_rows: int = RERATE_CHUNK_ROWS,
+                     workers: int = None, restart: bool = False) -> dict:
+    if not os.path.exists(db_path):
+        print("Database not found. Please run data_generation/generate_quotes.py first.")
+        return {}
+
+    old_model, new_model = resolve_model(old), resolve_model(new)
+    if old_model['name'] == new_model['name']:
+        raise ValueError(f"--old {old} and --new {new} are the same model ({old_model['name']}); nothing to re-rate.")
+    output_dir = output_dir or os.path.join(RERATE_OUTPUT_DIR, f"{old_model['name']}__{new_model['name']}".replace(os.sep, '_'))
+    manifest = sync_quotes(db_path, dataset_dir, verbose=False)
+
+    run_path = os.path.join(output_dir, RUN_FILE)
+    run = None
+    if os.path.exists(run_path) and not restart:
+        with open(run_path, 'r') as f:
+            run = json.load(f)
+        # Only the same models over the same quotes, in the same chunks, can be resumed
+        if (run['old']['name'], run['new']['name'], run['fingerprint'], run['chunk_rows']) != \
+                (old_model['name'], new_model['name'], manifest['fingerprint'], chunk_rows):
+            raise RuntimeError(f"{output_dir} holds a different re-rating run; pass --restart to overwrite it.")
+    if run is None:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        run = {
+            'old': old_model,
+            'new': new_model,
+            'fingerprint': manifest['fingerprint'],
+            # Quotes added after the run started are left for the next run
+            'rows_through': manifest['exported_through'],
+            'chunk_rows': chunk_rows,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }
+        for part in ('deltas', 'segments'):
+            os.makedirs(os.path.join(output_dir, part), exist_ok=True)
+        _write_run(output_dir, run)
+
+    n_rows = run['rows_through']
+    chunks = [(i, lo, min(lo + chunk_rows, n_rows + 1)) for i, lo in enumerate(range(1, n_rows + 1, chunk_rows))]
+    pending = [c for c in chunks if not _chunk_done(output_dir, c[0])]
+    if len(pending) < len(chunks):
+        print(f"Resuming: {len(chunks) - len(pending)}/{len(chunks)} chunks already re-rated")
+
+    workers = workers or os.cpu_count() or 1
+    # LightGBM threads are split between the workers so the pool never oversubscribes the cores
+    initargs = (old_model, new_model, dataset_dir, output_dir, max(1, (os.cpu_count() or 1) // workers))
+    print(f"Re-rating {n_rows:,} quotes: {old_model['name']} -> {new_model['name']} "
+          f"({len(pending)} chunks of {chunk_rows:,}, {workers} workers)")
+    start = time.time()
+    rows_done = 0
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+            futures = [pool.submit(_rerate_chunk, *chunk) for chunk in pending]
+            try:
+                for done, future in enumerate(as_completed(futures), 1):
+                    rows_done += future.result()
+                    elapsed = time.time() - start
+                    rate = rows_done / elapsed if elapsed > 0 else 0.0
+                    remaining = (len(pending) - done) * (rows_done / done) / rate if rate else 0.0
+                    print(f"  chunk {done}/{len(pending)}: {rows_done:,} quotes, {rate:,.0f} quotes/s, ETA {remaining:.0f}s")
+            except BaseException:
+                # Finished chunks are already on disk; rerun the same command to resume
+                for future in futures:
+                    future.cancel()
+                print(f"Interrupted after {rows_done:,} quotes; rerun to resume from {output_dir}")
+                raise
+    wall_s = time.time() - start
+
+    segments = combine_segments(output_dir)
+    pq.write_table(segments, os.path.join(output_dir, SEGMENTS_FILE))
+    run['summary'] = overall_impact(segments)
+    run['throughput'] = {'quotes': rows_done, 'wall_s': wall_s, 'quotes_per_s': rows_done / wall_s if wall_s > 0 else None}
+    run['completed_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    _write_run(output_dir, run)
+    run['output_dir'] = output_dir
+    return run
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-rate every stored quote under two models and report the impact.")
+    parser.add_argument('--old', default='LATEST', help="Current model: registry version, LATEST, or a model.pkl/model.txt path")
+    parser.add_argument('--new', required=True, help="Candidate model, same forms as --old")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database with the quotes table")
+    parser.add_argument('--output-dir', default=None, help=f"Default: {RERATE_OUTPUT_DIR}/<old>__<new>")
+    parser.add_argument('--chunk-rows', type=int, default=RERATE_CHUNK_ROWS, help="Quotes per chunk")
+    parser.add_argument('--workers', type=int, default=None, help="Processes (default: one per core)")
+    parser.add_argument('--restart', action='store_true', help="Discard a previous run in the output directory")
+    args = parser.parse_args()
+
+    run = rerate_portfolio(args.old, args.new, args.db, output_dir=args.output_dir, chunk_rows=args.chunk_rows,
+                           workers=args.workers, restart=args.restart)
+    if run:
+        summary, throughput = run['summary'], run['throughput']
+        segments = pq.read_table(os.path.join(run['output_dir'], SEGMENTS_FILE)).to_pandas()
+        print("\n" + "="*78)
+        print("                     PORTFOLIO RE-RATING IMPACT")
+        print("="*78)
+        print(f"{run['old']['name']} -> {run['new']['name']}")
+        print(f"Quotes: {summary['quotes']:,}   total premium £{summary['old_premium_total']:,.2f} -> "
+              f"£{summary['new_premium_total']:,.2f} ({summary['premium_change_pct']:+.2f}%)")
+        print(f"Moves over {MATERIAL_MOVE_PCT:g}%: {summary['material_increase_share']:.1%} up, "
+              f"{summary['material_decrease_share']:.1%} down; largest £{summary['min_delta']:+.2f} / £{summary['max_delta']:+.2f}")
+        if throughput['quotes']:
+            print(f"Throughput: {throughput['quotes']:,} quotes in {throughput['wall_s']:.1f}s "
+                  f"({throughput['quotes_per_s']:,.0f} quotes/s)")
+        print(f"{'age':<8} {'vehicle':<8} {'claims':>6} {'quotes':>10} {'mean old':>10} {'mean new':>10} {'change':>8}")
+        movers = segments.reindex(segments['premium_change_pct'].abs().sort_values(ascending=False).index).head(10)
+        for row in movers.itertuples():
+            print(f"{row.age_band:<8} {row.vehicle_group_band:<8} {row.claims_count:>6} {row.quotes:>10,} "
+                  f"£{row.mean_old_premium:>9.2f} £{row.mean_new_premium:>9.2f} {row.premium_change_pct:>+7.2f}%")
+        print("="*78)
+        print(f"Per-quote deltas and impact_by_segment.parquet in {run['output_dir']}")
@@ -1,21 +1,25 @@
-import sqlite3
 import pandas as pd
 import lightgbm as lgb
 import pickle
 import os
+import sys
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import numpy as np
 
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from pricing_model.registry import publish_model
+from database.quotes_dataset import read_quotes
+
 def train_model():
     # Load data
     if not os.path.exists('database/quotes.db'):
         print("Database not found. Please run data_generation/generate_quotes.py first.")
         return
 
-    conn = sqlite3.connect('database/quotes.db')
-    df = pd.read_sql_query("SELECT * FROM quotes", conn)
-    conn.close()
+    # Columnar read from the Parquet copy of the quotes table (synced from SQLite first)
+    df = read_quotes(db_path='database/quotes.db').to_pandas()
     
     # Prepare features and target
     X = df.drop('premium', axis=1)
@@ -60,10 +64,15 @@ def train_model():
         }
     }
     
+    # Publish an immutable version; serving processes pick it up and swap to it without a restart
+    version = publish_model(model_data)
+    
+    # Keep the unversioned copy for tools that read model.pkl directly
     with open('pricing_model/model.pkl', 'wb') as f:
         pickle.dump(model_data, f)
     
-    print("Model trained and saved to pricing_model/model.pkl")
+    print(f"Model trained and published as version {version}")
+    print("Model also saved to pricing_model/model.pkl")
     print(f"Features used: {X.columns.tolist()}")
 
 if __name__ == "__main__":
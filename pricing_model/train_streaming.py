@@ -0,0 +1,285 @@
+"""
+Out-of-core training: streams the quotes table from SQLite into LightGBM in chunks.
+
+Rows with rowid % 5 == 0 are held out for validation (the streaming analogue of
+train_model.py's 80/20 split); everything else is training data. The feature matrix
+is never materialized: LightGBM samples rows for binning and then pulls fixed-size
+rowid ranges through `QuoteSequence`. Only the label column (8 bytes/row) and the
+binned dataset live in memory. Binned datasets are cached as LightGBM binary files
+keyed by the rowid range they cover, and `--continue` adds trees to the latest
+published version using only quotes that arrived since it was trained.
+
+Usage:
+    python pricing_model/train_streaming.py                  # fit from scratch
+    python pricing_model/train_streaming.py --continue       # train on new quotes only
+"""
+import os
+import re
+import sys
+import json
+import time
+import pickle
+import hashlib
+import argparse
+import resource
+import numbers
+import numpy as np
+import lightgbm as lgb
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from pricing_model.registry import publish_model, BoosterModel, ModelRegistry, METADATA_FILE, BOOSTER_FILE
+from database.store import get_store, DB_PATH
+
+CACHE_DIR = 'pricing_model/cache'
+FEATURES = ['age', 'postcode_risk', 'vehicle_group', 'claims_count', 'ncb_years']
+TARGET = 'premium'
+HOLDOUT_MODULUS = 5
+
+# Same model as train_model.py, expressed as lgb.train parameters
+PARAMS = {
+    'objective': 'regression',
+    'learning_rate': 0.1,
+    'max_depth': 5,
+    'num_leaves': 31,
+    'seed': 42,
+    'verbose': -1
+}
+NUM_BOOST_ROUND = 100
+
+def _train_rowid_count(lo: int, hi: int) -> int:
+    """Number of non-holdout rowids in [lo, hi]."""
+    below = lambda r: r - r // HOLDOUT_MODULUS
+    return below(hi) - below(lo - 1)
+
+class QuoteSequence(lgb.Sequence):
+    """
+    Training rows of the quotes table within a rowid range, read on demand.
+
+    The quotes table is append-only, so rowids are normally dense; then the
+    position -> rowid mapping is arithmetic. If rows were ever deleted the
+    training rowids are materialized once (8 bytes/row) instead.
+    """
+
+    def __init__(self, db_path: str, lo: int, hi: int, features: list = FEATURES, batch_size: int = 100_000):
+        self.db_path = db_path
+        self.lo, self.hi = lo, hi
+        self.features = features
+        self.batch_size = batch_size
+        self._store = get_store(db_path)
+        self._columns = ", ".join(features)
+
+        n_rows = self._store.scalar("SELECT COUNT(*) FROM quotes WHERE rowid BETWEEN ? AND ?", (lo, hi))
+        self.dense = n_rows == hi - lo + 1
+        self._rowids = None
+        if self.dense:
+            self._offset = lo - 1 - (lo - 1) // HOLDOUT_MODULUS
+            self._length = _train_rowid_count(lo, hi)
+        else:
+            self._rowids = self._fetch_column("rowid", np.int64, train=True)
+            self._length = len(self._rowids)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def rowid_at(self, position: int) -> int:
+        if self._rowids is not None:
+            return int(self._rowids[position])
+        # Invert "count of non-holdout rowids <= r": each block of 5 rowids holds 4 training rows.
+        # Plain int: sqlite3 can't bind NumPy integers (LightGBM samples with them).
+        target = int(position) + 1 + self._offset
+        return target + (target - 1) // (HOLDOUT_MODULUS - 1)
+
+    def _fetch_column(self, column: str, dtype, train: bool) -> np.ndarray:
+        """Streams one column for the range in rowid order, train rows or holdout rows."""
+        predicate = "!=" if train else "="
+        batches = self._store.iter_batches(
+            f"SELECT {column} FROM quotes WHERE rowid BETWEEN ? AND ? AND rowid % {HOLDOUT_MODULUS} {predicate} 0 ORDER BY rowid",
+            (self.lo, self.hi),
+            self.batch_size
+        )
+        chunks = [np.fromiter((r[0] for r in rows), dtype=dtype, count=len(rows)) for rows in batches]
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
+
+    def labels(self) -> np.ndarray:
+        return self._fetch_column(TARGET, np.float64, train=True)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, numbers.Integral):
+            row = self._store.fetch_one(f"SELECT {self._columns} FROM quotes WHERE rowid = ?", (self.rowid_at(idx),))
+            return np.asarray(row, dtype=np.float64)
+        if isinstance(idx, slice):
+            start, stop, _ = idx.indices(len(self))
+            if start >= stop:
+                return np.empty((0, len(self.features)))
+            return self._store.fetch_array(
+                f"SELECT {self._columns} FROM quotes WHERE rowid BETWEEN ? AND ? AND rowid % {HOLDOUT_MODULUS} != 0 ORDER BY rowid",
+                (self.rowid_at(start), self.rowid_at(stop - 1)),
+                n_columns=len(self.features)
+            )
+        if isinstance(idx, list):
+            return np.vstack([self[i] for i in idx])
+        raise TypeError(f"Sequence index must be integer, slice or list, got {type(idx).__name__}")
+
+def rowid_bounds(db_path: str, after: int = 0) -> tuple:
+    return get_store(db_path).fetch_one("SELECT MIN(rowid), MAX(rowid) FROM quotes WHERE rowid > ?", (after,))
+
+def append_trees(base: lgb.Booster, extra: lgb.Booster) -> lgb.Booster:
+    """
+    One booster with base's trees followed by extra's, built from LightGBM's model text
+    (extra's header and parameters, trees renumbered). Continued training fits extra on
+    a Dataset whose init_score is base's raw prediction, so the sum is the continued
+    model; lgb.train(init_model=...) would instead re-predict over the raw data, which a
+    Sequence-backed Dataset has freed.
+    """
+    def parts(booster):
+        head, rest = booster.model_to_string().split("\n\nTree=", 1)
+        trees, tail = ("Tree=" + rest).split("end of trees", 1)
+        return head, [t for t in re.split(r"(?=^Tree=\d+$)", trees, flags=re.M) if t], tail
+
+    _, base_trees, _ = parts(base)
+    head, extra_trees, tail = parts(extra)
+    blocks = [re.sub(r"^Tree=\d+", f"Tree={i}", block, count=1) for i, block in enumerate(base_trees + extra_trees)]
+    head = re.sub(r"(?m)^tree_sizes=.*$", "tree_sizes=" + " ".join(str(len(b.encode())) for b in blocks), head)
+    return lgb.Booster(model_str=head + "\n\n" + "".join(blocks) + "end of trees" + tail)
+
+def build_dataset(db_path: str, lo: int, hi: int, batch_size: int, cache_dir: str = CACHE_DIR,
+                  params: dict = PARAMS, init_booster: lgb.Booster = None) -> lgb.Dataset:
+    """Binned training Dataset for rowids [lo, hi], from the binary cache when one exists."""
+    key = hashlib.sha256(json.dumps([os.path.abspath(db_path), lo, hi, FEATURES, params['max_depth']]).encode()).hexdigest()[:12]
+    # LightGBM doesn't store init_score in binary files, so only from-scratch datasets are cached
+    cache_path = os.path.join(cache_dir, f"quotes_{lo}_{hi}_{key}.bin") if cache_dir and init_booster is None else None
+    if cache_path and os.path.exists(cache_path):
+        print(f"Using cached binary dataset {cache_path}")
+        return lgb.Dataset(cache_path, params=params)
+
+    seq = QuoteSequence(db_path, lo, hi, batch_size=batch_size)
+    init_score = None
+    if init_booster is not None:
+        init_score = np.concatenate([
+            init_booster.predict(seq[start:start + batch_size], raw_score=True)
+            for start in range(0, len(seq), batch_size)
+        ])
+    dataset = lgb.Dataset(seq, label=seq.labels(), init_score=init_score, feature_name=FEATURES, params=params, free_raw_data=True)
+    dataset.construct()
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        dataset.save_binary(cache_path)
+    return dataset
+
+def evaluate_streaming(booster: lgb.Booster, db_path: str, lo: int, hi: int, batch_size: int) -> dict:
+    """MAE/RMSE/R² on the holdout rows of [lo, hi], accumulated chunk by chunk."""
+    batches = get_store(db_path).iter_batches(
+        f"SELECT {', '.join(FEATURES)}, {TARGET} FROM quotes WHERE rowid BETWEEN ? AND ? AND rowid % {HOLDOUT_MODULUS} = 0",
+        (lo, hi),
+        batch_size
+    )
+    n = 0
+    abs_err = sq_err = y_sum = y_sq_sum = 0.0
+    for rows in batches:
+        block = np.asarray(rows, dtype=np.float64)
+        y = block[:, -1]
+        residual = y - booster.predict(block[:, :-1])
+        n += len(y)
+        abs_err += np.abs(residual).sum()
+        sq_err += (residual ** 2).sum()
+        y_sum += y.sum()
+        y_sq_sum += (y ** 2).sum()
+    if n == 0:
+        return {}
+    total_ss = y_sq_sum - y_sum ** 2 / n
+    return {
+        'mae': abs_err / n,
+        'rmse': float(np.sqrt(sq_err / n)),
+        'r2': 1.0 - sq_err / total_ss if total_ss > 0 else 0.0
+    }
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def train_streaming(db_path: str = DB_PATH, batch_size: int = 100_000, num_boost_round: int = NUM_BOOST_ROUND,
+                    continue_training: bool = False, cache_dir: str = CACHE_DIR, publish: bool = True) -> dict:
+    if not os.path.exists(db_path):
+        print("Database not found. Please run data_generation/generate_quotes.py first.")
+        return {}
+
+    start = time.time()
+    init_model = None
+    after = 0
+    if continue_training:
+        registry = ModelRegistry(poll_interval=0)
+        version = registry.latest_version()
+        if version is None:
+            raise RuntimeError("No published model to continue from; run a full training first.")
+        with open(os.path.join(registry.registry_dir, version, METADATA_FILE), 'r') as f:
+            after = json.load(f).get('training', {}).get('trained_through_rowid')
+        if after is None:
+            raise RuntimeError(f"Version {version} does not record which quotes it was trained on.")
+        init_model = lgb.Booster(model_file=os.path.join(registry.registry_dir, version, BOOSTER_FILE))
+        print(f"Continuing from version {version} (trained through rowid {after})")
+
+    lo, hi = rowid_bounds(db_path, after)
+    if lo is None:
+        print("No new quotes since the last training run.")
+        return {}
+
+    dataset = build_dataset(db_path, lo, hi, batch_size, cache_dir, init_booster=init_model)
+    load_time = time.time() - start
+    booster = lgb.train(PARAMS, dataset, num_boost_round=num_boost_round, keep_training_booster=False)
+    if init_model is not None:
+        # The new trees were fitted to init_model's residuals (init_score); put them behind its trees
+        booster = append_trees(init_model, booster)
+    train_time = time.time() - start - load_time
+
+    # Validation always covers every holdout quote seen so far, not just the new ones
+    metrics = evaluate_streaming(booster, db_path, 1, hi, batch_size)
+    report = {
+        'rows': dataset.num_data(),
+        'rowid_range': [lo, hi],
+        'load_s': load_time,
+        'train_s': train_time,
+        'wall_s': time.time() - start,
+        'peak_rss_mb': peak_rss_mb(),
+        'metrics': metrics
+    }
+
+    print("--- Streaming Training ---")
+    print(f"Rows:      {report['rows']:,} (rowids {lo}..{hi})")
+    print(f"Trees:     {booster.num_trees()}")
+    print(f"Load:      {load_time:.1f}s  Train: {train_time:.1f}s  Wall: {report['wall_s']:.1f}s")
+    print(f"Peak RSS:  {report['peak_rss_mb']:.0f}MB")
+    if metrics:
+        print(f"MAE:  £{metrics['mae']:.2f}")
+        print(f"RMSE: £{metrics['rmse']:.2f}")
+        print(f"R2:   {metrics['r2']:.4f}")
+    print("--------------------------")
+
+    if publish:
+        model_data = {
+            'model': BoosterModel(booster),
+            'features': FEATURES,
+            'metrics': metrics,
+            'training': {'mode': 'streaming', 'trained_through_rowid': hi, 'continued': continue_training}
+        }
+        version = publish_model(model_data)
+        with open('pricing_model/model.pkl', 'wb') as f:
+            pickle.dump(model_data, f)
+        print(f"Model published as version {version}")
+        report['version'] = version
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the pricing model by streaming quotes.db in chunks.")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database with the quotes table")
+    parser.add_argument('--batch-size', type=int, default=100_000, help="Rows per chunk read from SQLite")
+    parser.add_argument('--rounds', type=int, default=NUM_BOOST_ROUND, help="Boosting rounds (trees added)")
+    parser.add_argument('--continue', dest='continue_training', action='store_true', help="Add trees for quotes newer than the latest version")
+    parser.add_argument('--no-cache', action='store_true', help="Don't read or write the binary dataset cache")
+    parser.add_argument('--no-publish', action='store_true', help="Train and report only")
+    parser.add_argument('--json', action='store_true', help="Print the report as one JSON line (for benchmarks)")
+    args = parser.parse_args()
+    report = train_streaming(args.db, args.batch_size, args.rounds, args.continue_training,
+                             cache_dir=None if args.no_cache else CACHE_DIR, publish=not args.no_publish)
+    if args.json:
+        print(json.dumps(report))
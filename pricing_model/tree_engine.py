@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import numpy as np
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# LightGBM missing-value handling modes (see LightGBM's Tree::NumericalDecision)
+MISSING_NONE = 0
+MISSING_ZERO = 1
+MISSING_NAN = 2
+_MISSING_TYPES = {'None': MISSING_NONE, 'Zero': MISSING_ZERO, 'NaN': MISSING_NAN}
+
+# LightGBM treats |x| <= kZeroThreshold as zero
+K_ZERO_THRESHOLD = 1e-35
+
+# Arrays persisted by TreeEnsemble.save, one .npy each
+ARRAY_FIELDS = ('split_feature', 'threshold', 'left_child', 'right_child', 'default_left',
+                'missing_type', 'is_leaf', 'value', 'count', 'roots')
+
+# Objectives whose predict() output is the raw score (no link function)
+_IDENTITY_OBJECTIVES = ('regression', 'regression_l1', 'huber', 'fair', 'quantile', 'mape')
+
+class TreeEnsemble:
+    """
+    Flat-array export of a LightGBM booster, evaluated for all trees at once in NumPy.
+
+    Every node (internal or leaf) of every tree lives in one set of parallel arrays.
+    Leaves point to themselves as both children, so walking `max_depth` steps from
+    the roots lands every (row, tree) pair on its leaf without per-tree branching.
+    """
+
+    def __init__(self, split_feature, threshold, left_child, right_child, default_left,
+                 missing_type, is_leaf, value, count, roots, max_depth, feature_names):
+        self.split_feature = split_feature
+        self.threshold = threshold
+        self.left_child = left_child
+        self.right_child = right_child
+        self.default_left = default_left
+        self.missing_type = missing_type
+        self.is_leaf = is_leaf
+        self.value = value
+        self.count = count
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.feature_names = list(feature_names)
+        self._has_missing_handling = bool(np.any(missing_type[~is_leaf] != MISSING_NONE))
+        # Interleaved [left, right] children so one step is children[2 * node + go_right]
+        self._children = np.empty(2 * len(value), dtype=np.intp)
+        self._children[0::2] = left_child
+        self._children[1::2] = right_child
+        self._split_feature = split_feature.astype(np.intp)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.value)
+
+    @classmethod
+    def from_booster(cls, booster):
+        """Flattens a trained `lightgbm.Booster` (or LGBMRegressor.booster_)."""
+        return cls.from_dump(booster.dump_model())
+
+    @classmethod
+    def from_dump(cls, dump: dict):
+        """Flattens the dict produced by `Booster.dump_model()`."""
+        if dump.get('num_tree_per_iteration', 1) != 1:
+            raise NotImplementedError("Only single-output boosters are supported.")
+        if dump.get('average_output'):
+            raise NotImplementedError("Random-forest (average_output) boosters are not supported.")
+        objective = dump.get('objective', '').split(' ')[0]
+        if objective not in _IDENTITY_OBJECTIVES:
+            raise NotImplementedError(f"Objective '{objective}' applies an output transform; only raw-score objectives are supported.")
+
+        columns = {key: [] for key in ('split_feature', 'threshold', 'left_child', 'right_child',
+                                       'default_left', 'missing_type', 'is_leaf', 'value', 'count')}
+        roots = []
+        max_depth = 0
+
+        def add_node(node, depth):
+            nonlocal max_depth
+            idx = len(columns['value'])
+            for key in columns:
+                columns[key].append(None)
+
+            if 'leaf_value' in node or 'split_index' not in node:
+                # Leaf (a single-leaf tree dumps as just {'leaf_value': ...})
+                max_depth = max(max_depth, depth)
+                columns['split_feature'][idx] = 0
+                columns['threshold'][idx] = 0.0
+                columns['left_child'][idx] = idx
+                columns['right_child'][idx] = idx
+                columns['default_left'][idx] = False
+                columns['missing_type'][idx] = MISSING_NONE
+                columns['is_leaf'][idx] = True
+                columns['value'][idx] = node['leaf_value']
+                columns['count'][idx] = node.get('leaf_count', 0)
+                return idx
+
+            if node['decision_type'] != '<=':
+                raise NotImplementedError(f"Decision type '{node['decision_type']}' (categorical splits) is not supported.")
+
+            columns['split_feature'][idx] = node['split_feature']
+            columns['threshold'][idx] = node['threshold']
+            columns['default_left'][idx] = node['default_left']
+            columns['missing_type'][idx] = _MISSING_TYPES[node['missing_type']]
+            columns['is_leaf'][idx] = False
+            columns['value'][idx] = 0.0
+            columns['count'][idx] = node.get('internal_count', 0)
+            columns['left_child'][idx] = add_node(node['left_child'], depth + 1)
+            columns['right_child'][idx] = add_node(node['right_child'], depth + 1)
+            return idx
+
+        for tree in dump['tree_info']:
+            roots.append(add_node(tree['tree_structure'], 0))
+
+        return cls(
+            split_feature=np.asarray(columns['split_feature'], dtype=np.int32),
+            threshold=np.asarray(columns['threshold'], dtype=np.float64),
+            left_child=np.asarray(columns['left_child'], dtype=np.int32),
+            right_child=np.asarray(columns['right_child'], dtype=np.int32),
+            default_left=np.asarray(columns['default_left'], dtype=bool),
+            missing_type=np.asarray(columns['missing_type'], dtype=np.int8),
+            is_leaf=np.asarray(columns['is_leaf'], dtype=bool),
+            value=np.asarray(columns['value'], dtype=np.float64),
+            count=np.asarray(columns['count'], dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth,
+            feature_names=dump['feature_names']
+        )
+
+    def save(self, directory: str):
+        """Writes each array as .npy plus an ensemble.json header, loadable without lightgbm."""
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAY_FIELDS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, 'ensemble.json'), 'w') as f:
+            json.dump({'max_depth': self.max_depth, 'feature_names': self.feature_names}, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: str = 'r'):
+        """Maps arrays written by `save`; pages are shared between processes via the page cache."""
+        with open(os.path.join(directory, 'ensemble.json'), 'r') as f:
+            header = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAY_FIELDS}
+        return cls(max_depth=header['max_depth'], feature_names=header['feature_names'], **arrays)
+
+    def _prepare(self, X) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != len(self.feature_names):
+            raise ValueError(f"Expected {len(self.feature_names)} features, got {X.shape[1]}.")
+        if not self._has_missing_handling and np.isnan(X).any():
+            # With missing_type 'None' everywhere LightGBM maps NaN to 0.0 at every split
+            X = np.where(np.isnan(X), 0.0, X)
+        return X
+
+    def _go_right(self, x: np.ndarray, node: np.ndarray) -> np.ndarray:
+        """Mirrors LightGBM's numerical decision for feature values `x` at `node`."""
+        if not self._has_missing_handling:
+            return x > self.threshold[node]
+
+        missing_type = self.missing_type[node]
+        is_nan = np.isnan(x)
+        x = np.where(is_nan & (missing_type != MISSING_NAN), 0.0, x)
+        is_missing = (
+            ((missing_type == MISSING_ZERO) & (np.abs(x) <= K_ZERO_THRESHOLD)) |
+            ((missing_type == MISSING_NAN) & is_nan)
+        )
+        return np.where(is_missing, ~self.default_left[node], ~(x <= self.threshold[node]))
+
+    def leaf_indices(self, X) -> np.ndarray:
+        """Returns the global leaf node index reached by each (row, tree): shape (n_rows, n_trees)."""
+        X = self._prepare(X)
+        n_rows, n_features = X.shape
+        # Work on flat (row, tree) pairs: the feature value of pair i at `node`
+        # is X_flat[row_offset[i] + split_feature[node]].
+        X_flat = X.ravel()
+        row_offset = np.repeat(np.arange(n_rows, dtype=np.intp) * n_features, self.n_trees)
+        node = np.tile(self.roots.astype(np.intp), n_rows)
+
+        for _ in range(self.max_depth):
+            x = X_flat[row_offset + self._split_feature[node]]
+            node = self._children[2 * node + self._go_right(x, node)]
+        return node.reshape(n_rows, self.n_trees)
+
+    def predict(self, X) -> np.ndarray:
+        """Raw-score prediction, bit-identical to `Booster.predict` for supported objectives."""
+        leaf_values = self.value[self.leaf_indices(X)]
+        # LightGBM accumulates trees one after another from 0.0; cumsum keeps that
+        # exact order (a plain sum may use pairwise summation and drift in the last ulp).
+        return np.cumsum(leaf_values, axis=1)[:, -1]
+
+def verify_parity(booster, X) -> int:
+    """Compares the NumPy engine against a LightGBM booster on X; returns the number of mismatching rows."""
+    engine = TreeEnsemble.from_booster(booster)
+    expected = booster.predict(X)
+    actual = engine.predict(X)
+    return int(np.count_nonzero(expected != actual))
+
+if __name__ == "__main__":
+    # Parity check: every stored quote plus random profiles must price bit-identically
+    from database.store import get_store
+    from pricing_model.predict import get_model_data, get_booster
+
+    model_data = get_model_data()
+    booster = get_booster(model_data)
+    features = model_data['features']
+
+    X_quotes = get_store('database/quotes.db').fetch_array(f"SELECT {', '.join(features)} FROM quotes", n_columns=len(features))
+
+    rng = np.random.default_rng(0)
+    X_random = np.column_stack([
+        rng.integers(18, 81, 10000),
+        rng.uniform(0, 1, 10000),
+        rng.integers(1, 51, 10000),
+        rng.integers(0, 6, 10000),
+        rng.integers(0, 11, 10000)
+    ]).astype(np.float64)
+
+    X = np.vstack([X_quotes, X_random])
+    mismatches = verify_parity(booster, X)
+    print(f"NumPy tree engine parity: {len(X) - mismatches}/{len(X)} rows bit-identical")
+    if mismatches:
+        sys.exit(1)
@@ -0,0 +1,218 @@
+import os
+import sys
+import numpy as np
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pricing_model.tree_engine import TreeEnsemble
+
+# The contribution table holds 2**depth split-outcome patterns per path; past this
+# depth it grows too large to be cheaper than shap's recursion.
+MAX_PATH_DEPTH = 8
+# Float64 entries allowed in the table, and in the per-slot-pattern intermediate it is
+# built from (2**24 entries = 128 MiB). Larger ensembles fall back to shap.TreeExplainer.
+MAX_TABLE_ENTRIES = int(os.getenv("TREE_SHAP_MAX_TABLE_ENTRIES", str(1 << 24)))
+
+def _leaf_paths(ensemble: TreeEnsemble):
+    """Root-to-leaf paths as (edges, leaf value, {feature: cover fraction}), plus the expected value."""
+    paths = []
+    expected_value = 0.0
+
+    def walk(node, edges, root_count):
+        nonlocal expected_value
+        if ensemble.is_leaf[node]:
+            weight = ensemble.count[node] / root_count if root_count else 1.0
+            expected_value += ensemble.value[node] * weight
+            if not edges:
+                return
+            cover = {}
+            for parent, went_right in edges:
+                child = ensemble.right_child[parent] if went_right else ensemble.left_child[parent]
+                feature = int(ensemble.split_feature[parent])
+                cover[feature] = cover.get(feature, 1.0) * ensemble.count[child] / ensemble.count[parent]
+            paths.append((edges, ensemble.value[node], cover))
+            return
+        walk(ensemble.left_child[node], edges + [(node, False)], root_count)
+        walk(ensemble.right_child[node], edges + [(node, True)], root_count)
+
+    for root in ensemble.roots:
+        walk(root, [], ensemble.count[root])
+    return paths, expected_value
+
+def _table_limit(paths: list):
+    """Why the native explainer can't tabulate these paths, or None if it can."""
+    n_paths = len(paths)
+    depth = max((len(edges) for edges, _, _ in paths), default=1)
+    n_slots = max((len(cover) for _, _, cover in paths), default=1)
+    if depth > MAX_PATH_DEPTH:
+        return f"Trees are {depth} levels deep; the native explainer supports up to {MAX_PATH_DEPTH}."
+    n_points = max(1, (n_slots + 1) // 2)
+    entries = max(n_paths << depth, (n_paths << n_slots) * n_points) * n_slots
+    if entries > MAX_TABLE_ENTRIES:
+        return (f"{n_paths} paths of depth {depth} need a {entries:,}-entry contribution table; "
+                f"the native explainer supports up to {MAX_TABLE_ENTRIES:,} (TREE_SHAP_MAX_TABLE_ENTRIES).")
+    return None
+
+def native_explainer_limit(ensemble: TreeEnsemble):
+    """None if TreeShapExplainer can be built for the ensemble, else the reason it can't."""
+    return _table_limit(_leaf_paths(ensemble)[0])
+
+class TreeShapExplainer:
+    """
+    Exact path-dependent TreeSHAP for a flattened TreeEnsemble, vectorized over rows in NumPy.
+
+    Every root-to-leaf path is precomputed once. Each distinct feature on a path gets a
+    slot with a cover fraction z_s (product of child/parent counts over its splits) and a
+    row-dependent indicator o_s (the row follows all of those splits). The leaf's
+    contribution is the product game v * prod_s (o_s if s in S else z_s), whose Shapley
+    value for slot i is
+
+        v * (o_i - z_i) * integral_0^1 prod_{s != i} (z_s + (o_s - z_s) u) du
+
+    i.e. the quantity shap's EXTEND/UNWIND recursion computes for
+    feature_perturbation='tree_path_dependent'. The integrand is a low-degree polynomial,
+    so a short Gauss-Legendre rule is exact. Because o is binary, a path with d slots has
+    only 2**d possible indicator patterns, so the contributions for every (path, pattern)
+    are tabulated at load time and explaining a row reduces to evaluating each split
+    once, keying every path by which of its splits the row fails, and gathering from
+    the table.
+
+    Exposes `expected_value` and `shap_values(X)` like shap.TreeExplainer.
+    """
+
+    def __init__(self, ensemble: TreeEnsemble, chunk_size: int = 256):
+        self.ensemble = ensemble
+        self.chunk_size = chunk_size
+        n_features = len(ensemble.feature_names)
+
+        paths, expected_value = _leaf_paths(ensemble)
+        limit = _table_limit(paths)
+        if limit is not None:
+            raise NotImplementedError(limit)
+        n_paths = len(paths)
+        depth = max((len(edges) for edges, _, _ in paths), default=1)
+        n_slots = max((len(cover) for _, _, cover in paths), default=1)
+
+        # Split decisions are only ever needed at internal nodes
+        self._internal_nodes = np.flatnonzero(~ensemble.is_leaf)
+        self._internal_feature = ensemble._split_feature[self._internal_nodes]
+        internal_position = np.zeros(ensemble.n_nodes, dtype=np.intp)
+        internal_position[self._internal_nodes] = np.arange(len(self._internal_nodes))
+
+        # Edges padded to a common depth; padded edges carry no slot bit, so whatever
+        # their outcome they never clear a slot.
+        edge_node = np.zeros((n_paths, depth), dtype=np.intp)
+        edge_right = np.zeros((n_paths, depth), dtype=bool)
+        edge_bit = np.zeros((n_paths, depth), dtype=np.int64)
+        # Unused slots keep z = 1 and never lose their bit, so they contribute nothing.
+        slot_cover = np.ones((n_paths, n_slots))
+        slot_feature = np.zeros((n_paths, n_slots), dtype=np.intp)
+        for p, (edges, _, cover) in enumerate(paths):
+            slots = {feature: s for s, feature in enumerate(cover)}
+            for s, feature in enumerate(cover):
+                slot_cover[p, s] = cover[feature]
+                slot_feature[p, s] = feature
+            for d, (node, went_right) in enumerate(edges):
+                edge_node[p, d] = internal_position[node]
+                edge_right[p, d] = went_right
+                edge_bit[p, d] = 1 << slots[int(ensemble.split_feature[node])]
+        # Depth-major copies so each depth's edges are one contiguous gather
+        self._edge_node_by_depth = np.ascontiguousarray(edge_node.T)
+        self._edge_right_by_depth = np.ascontiguousarray(edge_right.T)
+        self._path_offset = np.arange(n_paths, dtype=np.intp) << depth
+
+        # Slot table: (path, slot pattern, slot) -> Shapley value of the slot's feature
+        patterns = np.arange(1 << n_slots)
+        o = ((patterns[:, None] >> np.arange(n_slots)) & 1).astype(np.float64)    # (b, s)
+        n_points = max(1, (n_slots + 1) // 2)
+        points, weights = np.polynomial.legendre.leggauss(n_points)
+        u = (points + 1.0) / 2.0
+        z = slot_cover[:, None, :]                                                  # (p, 1, s)
+        factors = z[..., None] + (o[None, :, :] - z)[..., None] * u                 # (p, b, s, k)
+        # Leave-one-out products over slots; factors are strictly positive for u < 1
+        # (counts are never zero), so dividing out the slot's own factor is safe.
+        loo = np.prod(factors, axis=2, keepdims=True) / factors
+        integral = loo @ (weights / 2.0)                                            # (p, b, s)
+        values = np.asarray([value for _, value, _ in paths], dtype=np.float64)
+        slot_table = values[:, None, None] * (o[None, :, :] - z) * integral
+
+        # Re-key by which edges the row fails: a slot keeps its bit only if none of
+        # the edges on its feature fail. Indexing by edge outcomes lets a row's key be
+        # built with shifts and adds instead of a bitwise OR reduction per slot.
+        edge_patterns = np.arange(1 << depth)
+        cleared = np.zeros((n_paths, len(edge_patterns)), dtype=np.int64)
+        for d in range(depth):
+            failed = ((edge_patterns >> d) & 1).astype(bool)
+            cleared |= np.where(failed[None, :], edge_bit[:, d:d + 1], 0)
+        slot_pattern = ((1 << n_slots) - 1) ^ cleared
+        table = np.take_along_axis(slot_table, slot_pattern[:, :, None], axis=1)
+        self._table = table.reshape(n_paths * len(edge_patterns), n_slots)
+
+        # Slot-to-feature scatter as a dense (path * slot, feature) matrix
+        self._slot_to_feature = np.zeros((n_paths * n_slots, n_features))
+        self._slot_to_feature[np.arange(n_paths * n_slots), slot_feature.ravel()] = 1.0
+
+        self.expected_value = float(expected_value)
+
+    @classmethod
+    def from_booster(cls, booster, **kwargs):
+        return cls(TreeEnsemble.from_booster(booster), **kwargs)
+
+    def _shap_chunk(self, X: np.ndarray) -> np.ndarray:
+        x = X[:, self._internal_feature]
+        go_right = self.ensemble._go_right(x, self._internal_nodes)                # (n, internal)
+
+        # Key each path by the bit pattern of the splits the row fails along it
+        pattern = (go_right[:, self._edge_node_by_depth[0]] != self._edge_right_by_depth[0]).view(np.uint8).astype(np.intp)
+        for d in range(1, len(self._edge_node_by_depth)):
+            fails = go_right[:, self._edge_node_by_depth[d]] != self._edge_right_by_depth[d]
+            pattern += fails.view(np.uint8).astype(np.intp) << d                   # (n, p)
+
+        contributions = np.take(self._table, self._path_offset + pattern, axis=0)  # (n, p, s)
+        return contributions.reshape(X.shape[0], -1) @ self._slot_to_feature
+
+    def shap_values(self, X) -> np.ndarray:
+        """SHAP values with shape (n_rows, n_features); rows sum to prediction - expected_value."""
+        X = self.ensemble._prepare(X)
+        if self._table.shape[0] == 0:
+            return np.zeros(X.shape)
+        return np.vstack([
+            self._shap_chunk(X[start:start + self.chunk_size])
+            for start in range(0, X.shape[0], self.chunk_size)
+        ])
+
+def verify_against_shap(booster, X, tolerance: float = 1e-6) -> float:
+    """Returns the max absolute difference from shap.TreeExplainer on a LightGBM booster; raises if above tolerance."""
+    import shap
+    reference = shap.TreeExplainer(booster)
+    native = TreeShapExplainer.from_booster(booster)
+    max_diff = float(np.max(np.abs(reference.shap_values(X) - native.shap_values(X))))
+    base_diff = abs(float(reference.expected_value) - native.expected_value)
+    if max_diff > tolerance or base_diff > tolerance:
+        raise AssertionError(f"Native TreeSHAP deviates from shap: max |diff| {max_diff:.3e}, base value diff {base_diff:.3e}")
+    return max(max_diff, base_diff)
+
+if __name__ == "__main__":
+    # Parity check against shap on stored quotes plus random profiles
+    from database.store import get_store
+    from pricing_model.predict import get_model_data, get_booster
+
+    model_data = get_model_data()
+    booster = get_booster(model_data)
+    features = model_data['features']
+
+    X_quotes = get_store('database/quotes.db').fetch_array(f"SELECT {', '.join(features)} FROM quotes", n_columns=len(features))
+
+    rng = np.random.default_rng(0)
+    X_random = np.column_stack([
+        rng.integers(18, 81, 2000),
+        rng.uniform(0, 1, 2000),
+        rng.integers(1, 51, 2000),
+        rng.integers(0, 6, 2000),
+        rng.integers(0, 11, 2000)
+    ]).astype(np.float64)
+
+    X = np.vstack([X_quotes, X_random])
+    max_diff = verify_against_shap(booster, X)
+    print(f"Native TreeSHAP parity: {len(X)} rows, max |diff| vs shap = {max_diff:.2e}")
@@ -0,0 +1,98 @@
+import os
+import sys
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Pricing worker processes (0 disables the pool and prices on a thread in the calling process)
+PRICING_WORKERS = int(os.getenv("PRICING_WORKERS", "0"))
+# Seconds a caller waits for a pricing task before giving up
+PRICING_TASK_TIMEOUT = float(os.getenv("PRICING_TASK_TIMEOUT", "10"))
+# Tasks a worker serves before it is replaced (bounds leaks and heap fragmentation; 0 disables)
+PRICING_WORKER_MAX_TASKS = int(os.getenv("PRICING_WORKER_MAX_TASKS", "10000"))
+
+def _init_worker():
+    # Load and warm the active model once per process. With MODEL_FORMAT=arrays the
+    # tree arrays and pricing grid are mmap'd, so every worker shares the same pages.
+    from pricing_model.predict import get_model_data, warm_model
+    warm_model(get_model_data())
+
+def _price_task(profiles: list, engine: str = None) -> list:
+    from pricing_model.predict import price_profiles
+    return price_profiles(profiles, engine)
+
+class PricingWorkerPool:
+    """
+    Process pool for CPU-bound pricing + SHAP, awaitable from asyncio code.
+
+    Workers are started from a forkserver that has already imported the pricing
+    modules, so a new or recycled worker only forks and warms the model instead of
+    re-importing numpy/lightgbm. Each worker runs its own registry watcher and
+    follows hot model swaps independently. Audit logging stays in the calling
+    process so a single writer owns the log file.
+    """
+
+    def __init__(self, workers: int = None, timeout: float = PRICING_TASK_TIMEOUT,
+                 max_tasks_per_child: int = PRICING_WORKER_MAX_TASKS):
+        self.workers = workers or os.cpu_count()
+        self.timeout = timeout
+        self.max_tasks_per_child = max_tasks_per_child or None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    context = multiprocessing.get_context("forkserver")
+                    context.set_forkserver_preload(["pricing_model.predict"])
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=context,
+                        initializer=_init_worker,
+                        max_tasks_per_child=self.max_tasks_per_child
+                    )
+        return self._executor
+
+    def start(self):
+        """Spawns and warms every worker up front so the first requests don't pay for it."""
+        executor = self._get_executor()
+        for future in [executor.submit(_price_task, []) for _ in range(self.workers)]:
+            future.result()
+
+    async def price(self, profiles: list, engine: str = None) -> list:
+        """Prices profiles in a worker; raises asyncio.TimeoutError after `timeout` seconds."""
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._get_executor(), _price_task, profiles, engine)
+            # The worker itself can't be interrupted; a timed-out task finishes and is discarded
+            return await asyncio.wait_for(future, self.timeout)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); replace the pool so later requests recover
+            self.shutdown(wait=False)
+            raise
+
+    async def price_one(self, profile: dict, engine: str = None) -> dict:
+        return (await self.price([profile], engine))[0]
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+_POOL = None
+
+def get_pricing_pool():
+    """The process-wide pool, or None when PRICING_WORKERS is 0."""
+    global _POOL
+    if PRICING_WORKERS <= 0:
+        return None
+    if _POOL is None:
+        _POOL = PricingWorkerPool(PRICING_WORKERS)
+    return _POOL
@@ -1,113 +1,238 @@
+"""
+Builds the guideline collections in ChromaDB from data/guidelines, incrementally.
+
+A manifest (database/chroma_db/build_manifest.json) records, for each collection and
+each guideline file, the file's size, mtime and content hash, plus the hash of every
+chunk it produced. A rebuild re-reads only files whose size or mtime moved and
+re-chunks only those whose content changed. Only chunks whose text changed are
+upserted (and so embedded), in batches of UPSERT_BATCH. Chunk ids that an edited or
+removed file no longer produces are deleted, from the chunked and the baseline
+collection alike.
+
+Only the Chroma collections are updated incrementally. The derived artifacts (feature
+map, BM25 index and numpy export) are rebuilt over the whole corpus whenever any chunk
+was embedded or deleted; that reads the stored vectors back and re-ranks every
+chunk, but calls no model. When nothing changed they are kept as they are.
+
+The manifest is written last, after the derived artifacts, so an interrupted run is
+picked up again by the next one. It is trusted only while it matches the collection's
+chunk count, the embedding model and the chunking parameters. Otherwise (or with
+--full) every chunk is upserted and any id not produced by the guidelines is deleted;
+the embedding cache still spares the model calls for known texts.
+
+Usage: python rag/build_vector_store.py [--full]
+"""
 import os
+import sys
+import json
+import time
+import hashlib
+import argparse
 import chromadb
-from chromadb.utils import embedding_functions
 
-def build_vector_store():
-    data_dir = "data/guidelines"
-    persist_directory = "database/chroma_db"
-    
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from rag.embedding_cache import get_embedding_function, EMBEDDING_MODEL_ID
+from rag.feature_map import build_feature_map, invalidate_feature_map, FEATURE_MAP_PATH
+from rag.lexical_index import build_lexical_index, invalidate_lexical_index, LEXICAL_INDEX_PATH
+from rag.vector_backend import export_collection, VECTOR_INDEX_DIR
+
+DATA_DIR = "data/guidelines"
+PERSIST_DIRECTORY = "database/chroma_db"
+BUILD_MANIFEST_PATH = os.getenv("BUILD_MANIFEST_PATH", "database/chroma_db/build_manifest.json")
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+# Chunks per upsert, i.e. per embedding batch
+UPSERT_BATCH = 256
+
+# Simple recursive chunking function
+def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        if end >= len(text):
+            chunks.append(text[start:])
+            break
+
+        # Try to find a natural break point (newline, period, space)
+        # Look back from 'end'
+        for split_char in ["\n\n", "\n", ". ", " "]:
+            split_idx = text.rfind(split_char, start, end)
+            if split_idx != -1 and split_idx > start + chunk_size // 2: # Ensure chunk isn't too small
+                end = split_idx + len(split_char) # Include the split char
+                break
+
+        chunks.append(text[start:end])
+        start = end - overlap # Move efficient overlap
+    return chunks
+
+def chunk_records(filename: str, content: str) -> list:
+    return [(f"{filename}_{i}", chunk, {"source": filename, "chunk_index": i})
+            for i, chunk in enumerate(chunk_text(content))]
+
+def whole_doc_records(filename: str, content: str) -> list:
+    # NAIVE: Index entire file as one document
+    return [(filename, content, {"source": filename, "type": "whole_doc"})]
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def read_manifest(path: str = BUILD_MANIFEST_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def write_manifest_entry(collection_name: str, entry: dict, path: str = BUILD_MANIFEST_PATH):
+    manifest = {**read_manifest(path), collection_name: entry}
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, path)
+
+def sync_collection(collection, to_records, params: dict, full: bool = False, data_dir: str = DATA_DIR,
+                    on_change=None, manifest_path: str = BUILD_MANIFEST_PATH) -> dict:
+    """
+    Brings the collection up to date with the guideline files.
+
+    to_records(filename, content) -> [(id, document, metadata)] for one file; params
+    describes how it splits files (a change re-embeds everything). on_change() runs
+    once, before the first write. Returns the work done and skipped, with the new
+    manifest entry under 'entry' for write_manifest_entry once the derived artifacts
+    are rebuilt.
+    """
+    previous = read_manifest(manifest_path).get(collection.name, {})
+    old_files = previous.get('files', {})
+    trusted = (not full and previous.get('model_id') == EMBEDDING_MODEL_ID and previous.get('params') == params
+               and collection.count() == sum(len(f['chunks']) for f in old_files.values()))
+    if not trusted:
+        old_files = {}
+
+    report = {"files": 0, "files_unchanged": 0, "files_changed": 0, "files_new": 0, "files_removed": 0,
+              "chunks_skipped": 0, "embedded": 0, "deleted": 0}
+    files, upserts, stale = {}, [], set()
+    for filename in sorted(f for f in os.listdir(data_dir) if f.endswith(".txt")):
+        path = os.path.join(data_dir, filename)
+        info = os.stat(path)
+        signature = {"size": info.st_size, "mtime_ns": info.st_mtime_ns}
+        old = old_files.get(filename)
+        report["files"] += 1
+        if old and old["size"] == info.st_size and old["mtime_ns"] == info.st_mtime_ns:
+            files[filename] = old
+            report["files_unchanged"] += 1
+            report["chunks_skipped"] += len(old["chunks"])
+            continue
+        with open(path, "r") as f:
+            content = f.read()
+        digest = content_hash(content)
+        if old and old["hash"] == digest:
+            # Touched, not edited
+            files[filename] = {**old, **signature}
+            report["files_unchanged"] += 1
+            report["chunks_skipped"] += len(old["chunks"])
+            continue
+        report["files_changed" if old else "files_new"] += 1
+        old_chunks = old["chunks"] if old else {}
+        chunks = {}
+        for chunk_id, document, metadata in to_records(filename, content):
+            chunks[chunk_id] = content_hash(document)
+            if old_chunks.get(chunk_id) == chunks[chunk_id]:
+                report["chunks_skipped"] += 1
+            else:
+                upserts.append((chunk_id, document, metadata))
+        stale.update(set(old_chunks) - set(chunks))
+        files[filename] = {**signature, "hash": digest, "chunks": chunks}
+
+    for filename in set(old_files) - set(files):
+        report["files_removed"] += 1
+        stale.update(old_files[filename]["chunks"])
+    if not trusted:
+        # No usable manifest: whatever the collection holds beyond the guidelines is stale
+        expected = {chunk_id for entry in files.values() for chunk_id in entry["chunks"]}
+        stale = set(collection.get(include=[])["ids"]) - expected
+
+    if (upserts or stale) and on_change is not None:
+        on_change()
+    stale = sorted(stale)
+    for lo in range(0, len(stale), UPSERT_BATCH):
+        collection.delete(ids=stale[lo:lo + UPSERT_BATCH])
+    for lo in range(0, len(upserts), UPSERT_BATCH):
+        ids, documents, metadatas = zip(*upserts[lo:lo + UPSERT_BATCH])
+        collection.upsert(ids=list(ids), documents=list(documents), metadatas=list(metadatas))
+
+    report["embedded"], report["deleted"] = len(upserts), len(stale)
+    report["entry"] = {"model_id": EMBEDDING_MODEL_ID, "params": params, "files": files}
+    return report
+
+def print_report(label: str, report: dict, seconds: float):
+    print(f"{label}: {report['files']} files ({report['files_unchanged']} unchanged, {report['files_changed']} changed, "
+          f"{report['files_new']} new, {report['files_removed']} removed); embedded {report['embedded']} chunks, "
+          f"skipped {report['chunks_skipped']} unchanged, deleted {report['deleted']} stale in {seconds:.2f}s")
+
+def build_vector_store(full: bool = False):
     # Initialize Chroma Client
-    client = chromadb.PersistentClient(path=persist_directory)
-    
-    # Use default embedding function
-    embedding_func = embedding_functions.DefaultEmbeddingFunction()
-    
+    client = chromadb.PersistentClient(path=PERSIST_DIRECTORY)
+
+    # Default model behind the embedding cache: unchanged chunks are not re-embedded on a rebuild
+    embedding_func = get_embedding_function()
+
     # Create or get collection
     collection = client.get_or_create_collection(
         name="underwriting_guidelines",
         embedding_function=embedding_func
     )
-    
-    # Load guidelines with chunking
-    ids = []
-    documents = []
-    metadatas = []
-    
-    # Simple recursive chunking function
-    def chunk_text(text, chunk_size=500, overlap=50):
-        chunks = []
-        start = 0
-        while start < len(text):
-            end = start + chunk_size
-            if end >= len(text):
-                chunks.append(text[start:])
-                break
-            
-            # Try to find a natural break point (newline, period, space)
-            # Look back from 'end'
-            break_found = False
-            for split_char in ["\n\n", "\n", ". ", " "]:
-                split_idx = text.rfind(split_char, start, end)
-                if split_idx != -1 and split_idx > start + chunk_size // 2: # Ensure chunk isn't too small
-                    end = split_idx + len(split_char) # Include the split char
-                    break_found = True
-                    break
-            
-            chunks.append(text[start:end])
-            start = end - overlap # Move efficient overlap
-        return chunks
-
-    for filename in os.listdir(data_dir):
-        if filename.endswith(".txt"):
-            path = os.path.join(data_dir, filename)
-            with open(path, "r") as f:
-                content = f.read()
-            
-            # Create chunks
-            chunks = chunk_text(content)
-            
-            for i, chunk in enumerate(chunks):
-                ids.append(f"{filename}_{i}")
-                documents.append(chunk)
-                metadatas.append({"source": filename, "chunk_index": i})
-    
-    # Upsert to collection
-    # Chroma handles batching, but let's be safe if it's huge (it's not)
-    collection.upsert(
-        ids=ids,
-        documents=documents,
-        metadatas=metadatas
-    )
-    
-    print(f"Indexed {len(documents)} chunks from guidelines into ChromaDB at {persist_directory}")
 
-def build_baseline_vector_store():
-    data_dir = "data/guidelines"
-    persist_directory = "database/chroma_db"
-    
+    def invalidate():
+        invalidate_feature_map()
+        invalidate_lexical_index()
+
+    start = time.time()
+    report = sync_collection(collection, chunk_records, {"chunk_size": CHUNK_SIZE, "overlap": CHUNK_OVERLAP},
+                             full=full, on_change=invalidate)
+    print_report(f"Indexed guidelines into ChromaDB at {PERSIST_DIRECTORY}", report, time.time() - start)
+
+    export_dir = os.path.join(VECTOR_INDEX_DIR, collection.name)
+    if (report["embedded"] or report["deleted"] or not os.path.exists(FEATURE_MAP_PATH)
+            or not os.path.exists(LEXICAL_INDEX_PATH) or not os.path.exists(os.path.join(export_dir, "index.json"))):
+        # Per-feature retrieval is deterministic for this index: rank it once here
+        feature_map = build_feature_map(collection)
+        print(f"Precomputed guideline chunks for {len(feature_map['features'])} feature keywords (index {feature_map['index_version']})")
+        vocabulary = build_lexical_index(collection, feature_map['index_version'])
+        print(f"Built BM25 index over all chunks ({vocabulary} terms)")
+        # In-process copy for VECTOR_BACKEND=numpy
+        manifest = export_collection(collection, export_dir)
+        print(f"Exported {manifest['count']} chunks to the numpy index at {VECTOR_INDEX_DIR}")
+    else:
+        print("No chunk changed: kept the feature map, BM25 index and numpy export")
+    write_manifest_entry(collection.name, report["entry"])
+
+def build_baseline_vector_store(full: bool = False):
     # Initialize Chroma Client
-    client = chromadb.PersistentClient(path=persist_directory)
-    embedding_func = embedding_functions.DefaultEmbeddingFunction()
-    
+    client = chromadb.PersistentClient(path=PERSIST_DIRECTORY)
+    embedding_func = get_embedding_function()
+
     # Create distinct baseline collection
     collection = client.get_or_create_collection(
         name="underwriting_guidelines_baseline",
         embedding_function=embedding_func
     )
-    
-    ids = []
-    documents = []
-    metadatas = []
-    
-    for filename in os.listdir(data_dir):
-        if filename.endswith(".txt"):
-            path = os.path.join(data_dir, filename)
-            with open(path, "r") as f:
-                content = f.read()
-            
-            # NAIVE: Index entire file as one document
-            ids.append(filename)
-            documents.append(content)
-            metadatas.append({"source": filename, "type": "whole_doc"})
-    
-    collection.upsert(
-        ids=ids,
-        documents=documents,
-        metadatas=metadatas
-    )
-    
-    print(f"Indexed {len(documents)} whole documents into Baseline Collection at {persist_directory}")
+
+    start = time.time()
+    report = sync_collection(collection, whole_doc_records, {"chunking": "whole_doc"}, full=full)
+    print_report(f"Indexed whole documents into Baseline Collection at {PERSIST_DIRECTORY}", report, time.time() - start)
+    export_dir = os.path.join(VECTOR_INDEX_DIR, collection.name)
+    if report["embedded"] or report["deleted"] or not os.path.exists(os.path.join(export_dir, "index.json")):
+        export_collection(collection, export_dir)
+    write_manifest_entry(collection.name, report["entry"])
 
 if __name__ == "__main__":
-    build_vector_store()
-    build_baseline_vector_store()
+    parser = argparse.ArgumentParser(description="Build or update the guideline collections from data/guidelines.")
+    parser.add_argument('--full', action='store_true', help="Ignore the build manifest and re-upsert every chunk")
+    args = parser.parse_args()
+
+    build_vector_store(full=args.full)
+    build_baseline_vector_store(full=args.full)
+    stats = get_embedding_function().stats()
+    print(f"Embedding cache: {stats['lookups']} lookups, {stats['misses']} embedded, hit rate {stats['hit_rate']:.0%}")
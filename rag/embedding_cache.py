@@ -0,0 +1,240 @@
+"""
+Content-addressed cache in front of the guideline embedding model.
+
+A text's key is the first 16 bytes of sha256(model id, whitespace-normalized text).
+The MiniLM tokenizer splits on whitespace, so normalizing never changes the vector a
+hit returns. Lookups try an in-memory LRU (EMBEDDING_CACHE_SIZE vectors), then an
+append-only record file, database/embedding_cache/<model id>.bin, which is
+memory-mapped. Warm restarts, and other processes sharing the directory, therefore
+reuse embeddings instead of re-running the model. Misses are embedded in one batch
+and appended under an exclusive file lock.
+
+The file is a 16-byte header (magic, vector dimension) followed by fixed-size
+records (key, float32 vector). A partial record left at the tail by a crash is
+ignored on read and truncated before the next append.
+
+chromadb's DefaultEmbeddingFunction builds a new ONNX session on every call; the
+cache keeps a single ONNXMiniLM_L6_V2 instance for misses.
+
+Usage: python rag/embedding_cache.py [--clear]
+"""
+import os
+import sys
+import fcntl
+import struct
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Directory of the memory-mapped store ("" keeps the cache in memory only)
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "database/embedding_cache")
+# Vectors held in the in-memory LRU
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+# Part of every key: bump it when the model or its preprocessing changes
+EMBEDDING_MODEL_ID = "onnx-all-MiniLM-L6-v2"
+
+HEADER = struct.Struct("<8sII")
+MAGIC = b"EMBCACHE"
+KEY_BYTES = 16
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+def cache_key(text: str, model_id: str = EMBEDDING_MODEL_ID) -> bytes:
+    return hashlib.sha256(f"{model_id}\0{normalize_text(text)}".encode("utf-8")).digest()[:KEY_BYTES]
+
+class EmbeddingStore:
+    """The on-disk tier: key -> row of a memory-mapped record file, shared across processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.dim = None
+        self._records = None
+        self._rows = {}
+        self._size = 0
+
+    def _dtype(self):
+        return np.dtype([('key', f'V{KEY_BYTES}'), ('vector', '<f4', (self.dim,))])
+
+    def sync(self):
+        """Maps records appended since the last sync (by this or any other process)."""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if size <= self._size:
+            return
+        if self.dim is None:
+            with open(self.path, 'rb') as f:
+                magic, dim, _ = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not an embedding cache file.")
+            self.dim = dim
+        n = (size - HEADER.size) // self._dtype().itemsize
+        if n == len(self._rows):
+            return
+        records = np.memmap(self.path, dtype=self._dtype(), mode='r', offset=HEADER.size, shape=(n,))
+        keys = records['key'].tobytes()
+        for row in range(len(self._rows), n):
+            self._rows.setdefault(keys[row * KEY_BYTES:(row + 1) * KEY_BYTES], row)
+        self._records = records
+        self._size = HEADER.size + n * self._dtype().itemsize
+
+    def get(self, key: bytes):
+        row = self._rows.get(key)
+        return None if row is None else np.array(self._records[row]['vector'])
+
+    def append(self, keys: list, vectors: np.ndarray):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                size = os.fstat(f.fileno()).st_size
+                if size == 0:
+                    f.write(HEADER.pack(MAGIC, vectors.shape[1], 0))
+                    f.flush()
+                    size = HEADER.size
+                    self.dim = vectors.shape[1]
+                self.sync()
+                if vectors.shape[1] != self.dim:
+                    raise ValueError(f"{self.path} holds {self.dim}-d vectors, got {vectors.shape[1]}-d.")
+                record_bytes = self._dtype().itemsize
+                torn = (size - HEADER.size) % record_bytes
+                if torn:
+                    f.truncate(size - torn)
+                # Another process may have stored some of them since our lookup
+                fresh = [i for i, key in enumerate(keys) if key not in self._rows]
+                if fresh:
+                    records = np.empty(len(fresh), dtype=self._dtype())
+                    records['key'] = [keys[i] for i in fresh]
+                    records['vector'] = vectors[fresh]
+                    f.write(records.tobytes())
+                    f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        self.sync()
+
+    def __len__(self):
+        return len(self._rows)
+
+class CachedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Chroma embedding function that embeds each distinct text once (see module docstring)."""
+
+    def __init__(self, embedding_function=None, model_id: str = EMBEDDING_MODEL_ID,
+                 cache_dir: str = EMBEDDING_CACHE_DIR, max_entries: int = EMBEDDING_CACHE_SIZE):
+        if embedding_function is None:
+            from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import ONNXMiniLM_L6_V2
+            embedding_function = ONNXMiniLM_L6_V2()
+        self._embed = embedding_function
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._store = EmbeddingStore(os.path.join(cache_dir, f"{model_id}.bin")) if cache_dir else None
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __call__(self, input: Documents) -> Embeddings:
+        texts = [input] if isinstance(input, str) else list(input)
+        keys = [cache_key(text, self.model_id) for text in texts]
+        vectors = [None] * len(texts)
+        with self._lock:
+            self.lookups += len(texts)
+            if self._store is not None and any(key not in self._memory for key in keys):
+                self._store.sync()
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                elif self._store is not None and (vector := self._store.get(key)) is not None:
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                vectors[i] = vector
+
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], []).append(i)
+        if missing:
+            # One model call for the distinct misses, outside the lock
+            first = [positions[0] for positions in missing.values()]
+            embedded = np.asarray(self._embed([texts[i] for i in first]), dtype=np.float32)
+            with self._lock:
+                self.misses += len(first)
+                for key, vector, positions in zip(missing, embedded, missing.values()):
+                    self._remember(key, vector)
+                    for i in positions:
+                        vectors[i] = vector
+                if self._store is not None:
+                    self._store.append(list(missing), embedded)
+        return vectors
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "lookups": self.lookups,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / self.lookups if self.lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._store) if self._store is not None else 0
+        }
+
+    # --- Chroma embedding function protocol ---
+    # A transparent cache over the default model, so it reports the default function's
+    # name: collections persisted with "default" accept it, and vice versa
+
+    @staticmethod
+    def name() -> str:
+        return "default"
+
+    def get_config(self) -> dict:
+        return {}
+
+    @staticmethod
+    def build_from_config(config: dict) -> "CachedEmbeddingFunction":
+        return get_embedding_function()
+
+_EMBEDDING_FUNCTION = None
+_EMBEDDING_FUNCTION_LOCK = threading.Lock()
+
+def get_embedding_function() -> CachedEmbeddingFunction:
+    """The process-wide cached embedding function (one model, one LRU, one store)."""
+    global _EMBEDDING_FUNCTION
+    if _EMBEDDING_FUNCTION is None:
+        with _EMBEDDING_FUNCTION_LOCK:
+            if _EMBEDDING_FUNCTION is None:
+                _EMBEDDING_FUNCTION = CachedEmbeddingFunction()
+    return _EMBEDDING_FUNCTION
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or clear the embedding cache.")
+    parser.add_argument('--clear', action='store_true', help=f"Delete the stored vectors for {EMBEDDING_MODEL_ID}")
+    args = parser.parse_args()
+
+    path = os.path.join(EMBEDDING_CACHE_DIR, f"{EMBEDDING_MODEL_ID}.bin")
+    if args.clear:
+        if os.path.exists(path):
+            os.remove(path)
+        print(f"Cleared {path}")
+    else:
+        store = EmbeddingStore(path)
+        store.sync()
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        print(f"{path}: {len(store):,} vectors ({store.dim or '-'}-d), {size / 1024:.0f}KB")
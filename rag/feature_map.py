@@ -0,0 +1,142 @@
+"""
+Precomputed guideline retrieval for the rating factors.
+
+The optimized pipeline always searches the same feature keywords, and the agent
+searches on the name of the top SHAP feature. For a given index those results
+never change. build_vector_store.py therefore ranks the guideline chunks for
+every keyword once and writes them to database/chroma_db/feature_map.json. The
+file is stamped with an index version: a hash of the collection's ids and chunk
+texts plus the embedding model id. The same version is stored in the collection's
+metadata.
+
+Serving processes load the map once and reload it when the file changes. Before
+using it, they check its stamp against the collection's current version. A map
+from an older index is ignored, and those lookups fall back to a live vector
+search, so re-indexing never serves stale chunks.
+
+Usage: python rag/feature_map.py   (rebuilds the map for the current index)
+"""
+import os
+import sys
+import json
+import hashlib
+import threading
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from rag.embedding_cache import EMBEDDING_MODEL_ID
+
+CHROMA_PATH = "database/chroma_db"
+GUIDELINES_COLLECTION = "underwriting_guidelines"
+FEATURE_MAP_PATH = os.getenv("FEATURE_MAP_PATH", "database/chroma_db/feature_map.json")
+# Ranked chunks stored per keyword (lookups may ask for fewer)
+FEATURE_MAP_RESULTS = 5
+# Searched alongside every user query by the optimized pipeline; the first five are
+# the model's rating factors (the agent's top_feature is one of them)
+FEATURE_KEYWORDS = ["age", "postcode_risk", "vehicle_group", "claims_count", "ncb_years", "years_experience"]
+
+def index_version(ids: list, documents: list) -> str:
+    digest = hashlib.sha256(EMBEDDING_MODEL_ID.encode("utf-8"))
+    for chunk_id, document in sorted(zip(ids, documents)):
+        digest.update(f"\0{chunk_id}\0{document}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def build_feature_map(collection, output_path: str = FEATURE_MAP_PATH, keywords: list = FEATURE_KEYWORDS,
+                      n_results: int = FEATURE_MAP_RESULTS) -> dict:
+    """Ranks the collection's chunks for every keyword and stamps map and collection with the index version."""
+    contents = collection.get(include=['documents'])
+    version = index_version(contents['ids'], contents['documents'])
+    results = collection.query(query_texts=keywords, n_results=n_results,
+                               include=['documents', 'metadatas', 'distances'])
+    feature_map = {
+        "index_version": version,
+        "n_results": n_results,
+        "features": {
+            keyword: [
+                {"id": chunk_id, "document": doc, "metadata": meta, "distance": distance}
+                for chunk_id, doc, meta, distance in zip(results['ids'][i], results['documents'][i],
+                                                         results['metadatas'][i], results['distances'][i])
+            ]
+            for i, keyword in enumerate(keywords)
+        }
+    }
+    # Stamp the collection first: a process that sees the new file must find it current
+    collection.modify(metadata={**(collection.metadata or {}), "index_version": version})
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(feature_map, f, indent=1)
+    os.replace(tmp_path, output_path)
+    return feature_map
+
+def invalidate_feature_map(path: str = FEATURE_MAP_PATH):
+    """Called before re-indexing: until the new map is written, every lookup searches live."""
+    if os.path.exists(path):
+        os.remove(path)
+
+class FeatureMap:
+    """Loaded feature map, valid only while it matches the collection's index version."""
+
+    def __init__(self, path: str = FEATURE_MAP_PATH):
+        self.path = path
+        self._features = None
+        self._n_results = 0
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            features, n_results = None, 0
+            if mtime is not None:
+                with open(self.path, 'r') as f:
+                    feature_map = json.load(f)
+                current = current_index_version()
+                if feature_map.get("index_version") == current:
+                    features, n_results = feature_map["features"], feature_map["n_results"]
+                else:
+                    print(f"Ignoring {self.path}: built for index {feature_map.get('index_version')}, "
+                          f"collection is at {current}. Rebuild with rag/build_vector_store.py.")
+            self._features, self._n_results, self._mtime = features, n_results, mtime
+
+    def lookup(self, feature: str, n_results: int):
+        """Ranked chunks for a feature keyword, or None when it has to be searched live."""
+        self._refresh()
+        if self._features is None or n_results > self._n_results:
+            return None
+        hits = self._features.get(feature)
+        return None if hits is None else hits[:n_results]
+
+def guidelines_collection():
+    import chromadb
+    from rag.embedding_cache import get_embedding_function
+    client = chromadb.PersistentClient(path=CHROMA_PATH)
+    return client.get_collection(name=GUIDELINES_COLLECTION, embedding_function=get_embedding_function())
+
+def current_index_version() -> str:
+    """The version build_feature_map stamped on the collection (None if never stamped)."""
+    # A freshly fetched collection: cached handles keep the metadata they were opened with
+    return (guidelines_collection().metadata or {}).get("index_version")
+
+_FEATURE_MAP = None
+_FEATURE_MAP_LOCK = threading.Lock()
+
+def get_feature_map() -> FeatureMap:
+    global _FEATURE_MAP
+    if _FEATURE_MAP is None:
+        with _FEATURE_MAP_LOCK:
+            if _FEATURE_MAP is None:
+                _FEATURE_MAP = FeatureMap()
+    return _FEATURE_MAP
+
+if __name__ == "__main__":
+    feature_map = build_feature_map(guidelines_collection())
+    print(f"Feature map for index {feature_map['index_version']}: {len(feature_map['features'])} keywords "
+          f"x {feature_map['n_results']} chunks -> {FEATURE_MAP_PATH}")
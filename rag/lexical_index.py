@@ -0,0 +1,222 @@
+"""
+Corpus-wide BM25 index over the guideline chunks, built with the vector store.
+
+The hybrid search used to build a BM25Okapi over the few vector-search candidates
+on every request, with split(" ") tokens. That meant IDF came from a handful of
+documents, and "Claims," never matched "claims". Now build_vector_store.py builds
+this index once over every chunk in the collection:
+  * tokens are lowercased alphanumeric runs (underscores split, so "postcode_risk"
+    matches "postcode risk"), minus stopwords, with a light suffix-stripping stemmer;
+  * BM25 weights (Lucene's non-negative IDF, k1/b as BM25Okapi) are precomputed per
+    (chunk, term) into a CSC matrix, whose columns are the postings lists.
+Scoring the whole corpus selects the query terms' columns and multiplies them by the
+query term counts. Reranking a candidate set (the hybrid search) reads only those
+chunks' rows from a CSR copy, gathered and reduced in a few vectorized calls.
+
+The index is saved to database/chroma_db/lexical_index.npz with the index version
+that rag/feature_map.py stamps on the collection. Serving processes reload it when
+the file changes and ignore it while the versions differ.
+
+Usage: python rag/lexical_index.py "query"   (scores every chunk for a query)
+"""
+import os
+import re
+import sys
+import threading
+import numpy as np
+import scipy.sparse as sp
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from rag.feature_map import current_index_version
+
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "database/chroma_db/lexical_index.npz")
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from had has have how i if in is it its me my of on or "
+    "so such that the their them there these this to was we what when where which who why will with you your".split()
+)
+# (suffix, replacement), longest first; a stem keeps at least 3 characters
+SUFFIXES = (
+    ("ational", "ate"), ("ization", "ize"), ("fulness", "ful"), ("ousness", "ous"), ("iveness", "ive"),
+    ("ations", "ate"), ("ation", "ate"), ("ments", ""), ("ment", ""), ("ness", ""), ("ities", ""), ("ity", ""),
+    ("ings", ""), ("ing", ""), ("edly", ""), ("ied", "y"), ("ies", "y"), ("ed", ""), ("ly", ""),
+    ("sses", "ss"), ("xes", "x"), ("ches", "ch"), ("shes", "sh"), ("s", "")
+)
+
+def stem(token: str) -> str:
+    if len(token) <= 3 or token[0].isdigit():
+        return token
+    for suffix, replacement in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) + len(replacement) >= 3:
+            if suffix == "s" and token.endswith(("ss", "us", "is")):
+                break
+            token = token[:len(token) - len(suffix)] + replacement
+            break
+    # "increase", "increased", "increasing" -> "increas"
+    if len(token) > 3 and token.endswith("e"):
+        token = token[:-1]
+    return token
+
+def tokenize(text: str) -> list:
+    return [stem(t) for t in TOKEN_PATTERN.findall(text.lower().replace("_", " ")) if t not in STOPWORDS]
+
+def bm25_weights(documents: list, k1: float = BM25_K1, b: float = BM25_B) -> tuple:
+    """(CSC weights n_docs x n_terms, vocabulary list)."""
+    vocabulary, rows, cols = {}, [], []
+    for row, document in enumerate(documents):
+        for token in tokenize(document):
+            rows.append(row)
+            cols.append(vocabulary.setdefault(token, len(vocabulary)))
+    shape = (len(documents), len(vocabulary))
+    tf = sp.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=shape)  # duplicates sum
+    tf.sum_duplicates()
+    doc_len = np.asarray(tf.sum(axis=1)).ravel()
+    avgdl = doc_len.mean() if len(doc_len) and doc_len.mean() > 0 else 1.0
+    df = np.bincount(tf.indices, minlength=len(vocabulary))
+    idf = np.log1p((len(documents) - df + 0.5) / (df + 0.5)).astype(np.float32)
+    norm = np.repeat(k1 * (1 - b + b * doc_len / avgdl), np.diff(tf.indptr)).astype(np.float32)
+    tf.data = idf[tf.indices] * tf.data * (k1 + 1) / (tf.data + norm)
+    return tf.tocsc(), list(vocabulary)
+
+def build_lexical_index(collection, version: str, output_path: str = LEXICAL_INDEX_PATH) -> int:
+    """Indexes every chunk in the collection under the given index version. Returns the vocabulary size."""
+    contents = collection.get(include=['documents'])
+    weights, vocabulary = bm25_weights(contents['documents'])
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    tmp_path = output_path + ".tmp.npz"
+    np.savez(tmp_path, data=weights.data, indices=weights.indices, indptr=weights.indptr,
+             shape=np.array(weights.shape), vocabulary=np.array(vocabulary, dtype=str),
+             ids=np.array(contents['ids'], dtype=str), index_version=np.array(version))
+    os.replace(tmp_path, output_path)
+    return len(vocabulary)
+
+def invalidate_lexical_index(path: str = LEXICAL_INDEX_PATH):
+    if os.path.exists(path):
+        os.remove(path)
+
+class LexicalIndex:
+    """Loaded BM25 postings, valid only while they match the collection's index version."""
+
+    def __init__(self, path: str = LEXICAL_INDEX_PATH):
+        self.path = path
+        # (CSC weights, CSR weights, term -> column, chunk id -> row), swapped as one so
+        # readers never mix versions
+        self._state = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_documents(cls, ids: list, documents: list) -> "LexicalIndex":
+        """An in-memory index, not tied to a file or the collection (benchmarks, ad-hoc corpora)."""
+        index = cls(path=None)
+        weights, vocabulary = bm25_weights(documents)
+        index._state = (weights, weights.tocsr(), {t: i for i, t in enumerate(vocabulary)},
+                        {chunk_id: i for i, chunk_id in enumerate(ids)})
+        return index
+
+    def _refresh(self):
+        if self.path is None:
+            return
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            state = None
+            if mtime is not None:
+                with np.load(self.path) as f:
+                    version, current = str(f['index_version']), current_index_version()
+                    if version == current:
+                        weights = sp.csc_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+                        state = (
+                            weights, weights.tocsr(),
+                            {t: i for i, t in enumerate(f['vocabulary'].tolist())},
+                            {chunk_id: i for i, chunk_id in enumerate(f['ids'].tolist())}
+                        )
+                    else:
+                        print(f"Ignoring {self.path}: built for index {version}, collection is at {current}. "
+                              "Rebuild with rag/build_vector_store.py.")
+            self._state, self._mtime = state, mtime
+
+    @property
+    def available(self) -> bool:
+        self._refresh()
+        return self._state is not None
+
+    def score(self, query: str):
+        """BM25 score of every indexed chunk (in index order), or None without a current index."""
+        self._refresh()
+        state = self._state
+        return None if state is None else self._score(state, query)
+
+    @staticmethod
+    def _query_terms(terms: dict, query: str) -> dict:
+        counts = {}
+        for token in tokenize(query):
+            if token in terms:
+                counts[terms[token]] = counts.get(terms[token], 0) + 1
+        return counts
+
+    @classmethod
+    def _score(cls, state: tuple, query: str) -> np.ndarray:
+        weights, _, terms, _ = state
+        counts = cls._query_terms(terms, query)
+        if not counts:
+            return np.zeros(weights.shape[0], dtype=np.float32)
+        return weights[:, list(counts)] @ np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+
+    def score_ids(self, query: str, ids: list):
+        """BM25 scores of the given chunk ids (0 for ids not in the index), or None without a current index."""
+        self._refresh()
+        state = self._state
+        if state is None:
+            return None
+        _, by_row, terms, rows = state
+        scores = np.zeros(len(ids), dtype=np.float32)
+        counts = self._query_terms(terms, query)
+        known = np.array([i for i, chunk_id in enumerate(ids) if chunk_id in rows], dtype=np.int64)
+        if not counts or not len(known):
+            return scores
+        query_vector = np.zeros(by_row.shape[1], dtype=np.float32)
+        query_vector[list(counts)] = list(counts.values())
+        # Gather the candidates' postings from the CSR copy and sum each row's matches
+        row_ids = np.array([rows[ids[i]] for i in known], dtype=np.int64)
+        starts, lengths = by_row.indptr[row_ids], np.diff(by_row.indptr)[row_ids]
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        positions = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+        contributions = by_row.data[positions] * query_vector[by_row.indices[positions]]
+        # Summed per candidate; chunks without indexed tokens (e.g. only stopwords) get 0
+        scores[known] = np.bincount(np.repeat(np.arange(len(known)), lengths), weights=contributions,
+                                    minlength=len(known))
+        return scores
+
+_LEXICAL_INDEX = None
+_LEXICAL_INDEX_LOCK = threading.Lock()
+
+def get_lexical_index() -> LexicalIndex:
+    global _LEXICAL_INDEX
+    if _LEXICAL_INDEX is None:
+        with _LEXICAL_INDEX_LOCK:
+            if _LEXICAL_INDEX is None:
+                _LEXICAL_INDEX = LexicalIndex()
+    return _LEXICAL_INDEX
+
+if __name__ == "__main__":
+    query = " ".join(sys.argv[1:]) or "Why is my premium so high?"
+    index = get_lexical_index()
+    if not index.available:
+        sys.exit(f"No current lexical index at {LEXICAL_INDEX_PATH}; run rag/build_vector_store.py")
+    scores = index.score(query)
+    rows = index._state[3]
+    ids = sorted(rows, key=rows.get)
+    print(f"Tokens: {tokenize(query)}")
+    for row in np.argsort(-scores)[:5]:
+        print(f"{scores[row]:8.3f}  {ids[row]}")
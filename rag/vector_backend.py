@@ -0,0 +1,226 @@
+"""
+Retrieval backends for the guideline collections, selected with VECTOR_BACKEND.
+
+Both backends answer query(query_texts, n_results) with Chroma's result shape (ids,
+documents, metadatas, distances per query), so callers don't care which one is
+behind it:
+  * chroma: the persistent Chroma collection, opened once per process;
+  * numpy: an in-process exact index that build_vector_store.py exports next to
+    Chroma. It holds L2-normalized embeddings in a memory-mapped .npy matrix.
+    Records (id, document, metadata) are JSON lines in a sidecar file, with their
+    byte offsets in a second .npy array, so only the top-k records are ever decoded.
+    A query is one matrix-vector product plus argpartition. Distances are
+    squared L2 (2 - 2 cos), the same scale Chroma reports for normalized vectors.
+
+An export writes version-named files (under temporary names, then renamed, so even a
+re-export of the same version gets new inodes), then atomically replaces index.json
+to point at them. Serving processes reload when index.json changes; mappings that
+are already open stay valid. Without an export, the numpy backend falls back to Chroma.
+
+Usage: python rag/vector_backend.py [--export]   (shows, or re-exports, the numpy indexes)
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import numpy as np
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from rag.embedding_cache import get_embedding_function, EMBEDDING_MODEL_ID
+from rag.feature_map import CHROMA_PATH, index_version
+
+# 'chroma' or 'numpy'
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "database/vector_index")
+COLLECTIONS = ("underwriting_guidelines", "underwriting_guidelines_baseline")
+# Chunks read from Chroma per get() call during an export
+EXPORT_BATCH = 10_000
+
+class VectorBackend:
+    """Top-k retrieval over one guideline collection."""
+
+    name = None
+
+    def query(self, query_texts: list, n_results: int) -> dict:
+        raise NotImplementedError
+
+class ChromaBackend(VectorBackend):
+    name = "chroma"
+
+    def __init__(self, collection_name: str, persist_directory: str = CHROMA_PATH):
+        self.collection_name = collection_name
+        self.persist_directory = persist_directory
+        self._collection = None
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            import chromadb
+            client = chromadb.PersistentClient(path=self.persist_directory)
+            self._collection = client.get_collection(name=self.collection_name,
+                                                     embedding_function=get_embedding_function())
+        return self._collection
+
+    def query(self, query_texts: list, n_results: int) -> dict:
+        return self.collection.query(query_texts=query_texts, n_results=n_results,
+                                     include=['documents', 'metadatas', 'distances'])
+
+def export_collection(collection, index_dir: str) -> dict:
+    """Writes the collection's embeddings (normalized) and records as a numpy index; returns its manifest."""
+    ids, documents, metadatas, batches = [], [], [], []
+    total = collection.count()
+    for offset in range(0, total, EXPORT_BATCH):
+        batch = collection.get(include=['embeddings', 'documents', 'metadatas'], limit=EXPORT_BATCH, offset=offset)
+        ids += batch['ids']
+        documents += batch['documents']
+        metadatas += batch['metadatas']
+        batches.append(np.asarray(batch['embeddings'], dtype=np.float32))
+    embeddings = np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+    return write_index(index_dir, ids, documents, metadatas, embeddings)
+
+def write_index(index_dir: str, ids: list, documents: list, metadatas: list, embeddings: np.ndarray) -> dict:
+    version = index_version(ids, documents)
+    os.makedirs(index_dir, exist_ok=True)
+    dim = embeddings.shape[1] if len(ids) else 0
+    # Written under temporary names and renamed into place: re-exporting the same version
+    # must not truncate the files serving processes have mapped
+    paths = {name: os.path.join(index_dir, f"{name}-{version}.{ext}") for name, ext in
+             (("embeddings", "npy"), ("records", "jsonl"), ("offsets", "npy"))}
+    tmp_paths = {name: f"{path}.tmp.{os.getpid()}" for name, path in paths.items()}
+    # Normalized block by block straight into the mapped file, never a second full copy
+    matrix = np.lib.format.open_memmap(tmp_paths["embeddings"], mode='w+', dtype=np.float32, shape=(len(ids), dim))
+    for lo in range(0, len(ids), EXPORT_BATCH):
+        block = np.asarray(embeddings[lo:lo + EXPORT_BATCH], dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        matrix[lo:lo + EXPORT_BATCH] = block / np.where(norms > 0, norms, 1)
+    matrix.flush()
+    del matrix
+    offsets = [0]
+    with open(tmp_paths["records"], 'wb') as f:
+        for record in zip(ids, documents, metadatas):
+            line = (json.dumps(record) + "\n").encode("utf-8")
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    with open(tmp_paths["offsets"], 'wb') as f:
+        np.save(f, np.asarray(offsets, dtype=np.int64))
+    for name, path in paths.items():
+        os.replace(tmp_paths[name], path)
+
+    manifest = {"version": version, "count": len(ids), "dim": int(dim), "model_id": EMBEDDING_MODEL_ID}
+    tmp_path = os.path.join(index_dir, "index.json.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(index_dir, "index.json"))
+    # Earlier versions: processes that still map them keep their (unlinked) files
+    for filename in os.listdir(index_dir):
+        if filename.startswith(("embeddings-", "records-", "offsets-")) and version not in filename:
+            os.remove(os.path.join(index_dir, filename))
+    return manifest
+
+class NumpyBackend(VectorBackend):
+    name = "numpy"
+
+    def __init__(self, collection_name: str, index_root: str = VECTOR_INDEX_DIR):
+        self.collection_name = collection_name
+        self.index_dir = os.path.join(index_root, collection_name)
+        self._state = None  # (embeddings, records mmap, offsets), swapped as one
+        self._mtime = None
+        self._fallback = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        manifest_path = os.path.join(self.index_dir, "index.json")
+        try:
+            mtime = os.stat(manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            state = None
+            if mtime is not None:
+                with open(manifest_path, 'r') as f:
+                    manifest = json.load(f)
+                if manifest["model_id"] != EMBEDDING_MODEL_ID:
+                    print(f"Ignoring {self.index_dir}: embedded with {manifest['model_id']}, "
+                          f"queries use {EMBEDDING_MODEL_ID}.")
+                elif manifest["count"]:
+                    version = manifest["version"]
+                    state = (
+                        np.load(os.path.join(self.index_dir, f"embeddings-{version}.npy"), mmap_mode='r'),
+                        np.memmap(os.path.join(self.index_dir, f"records-{version}.jsonl"), dtype=np.uint8, mode='r'),
+                        np.load(os.path.join(self.index_dir, f"offsets-{version}.npy"), mmap_mode='r')
+                    )
+            if state is None and self._fallback is None:
+                print(f"No numpy index for {self.collection_name}; using Chroma. Run rag/build_vector_store.py.")
+                self._fallback = ChromaBackend(self.collection_name)
+            self._state, self._mtime = state, mtime
+
+    def query(self, query_texts: list, n_results: int) -> dict:
+        self._refresh()
+        state = self._state
+        if state is None:
+            return self._fallback.query(query_texts, n_results)
+        return self._search(state, np.asarray(get_embedding_function()(list(query_texts)), dtype=np.float32), n_results)
+
+    def search(self, queries: np.ndarray, n_results: int) -> dict:
+        """query() for already-embedded queries (n_queries x dim)."""
+        self._refresh()
+        state = self._state
+        if state is None:
+            return self._fallback.collection.query(query_embeddings=queries, n_results=n_results,
+                                                   include=['documents', 'metadatas', 'distances'])
+        return self._search(state, queries, n_results)
+
+    @staticmethod
+    def _search(state: tuple, queries: np.ndarray, n_results: int) -> dict:
+        embeddings, records, offsets = state
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        k = min(n_results, len(embeddings))
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for similarities in (embeddings @ queries.T).T:
+            top = np.argpartition(-similarities, k - 1)[:k] if k < len(similarities) else np.arange(k)
+            top = top[np.argsort(-similarities[top], kind='stable')]
+            rows = [json.loads(records[offsets[i]:offsets[i + 1]].tobytes()) for i in top]
+            result["ids"].append([r[0] for r in rows])
+            result["documents"].append([r[1] for r in rows])
+            result["metadatas"].append([r[2] for r in rows])
+            result["distances"].append((2 - 2 * similarities[top]).clip(min=0).tolist())
+        return result
+
+BACKENDS = {"chroma": ChromaBackend, "numpy": NumpyBackend}
+
+_BACKENDS = {}
+_BACKENDS_LOCK = threading.Lock()
+
+def get_vector_backend(collection_name: str = COLLECTIONS[0]) -> VectorBackend:
+    """The process-wide VECTOR_BACKEND backend for a collection."""
+    backend = _BACKENDS.get(collection_name)
+    if backend is None:
+        if VECTOR_BACKEND not in BACKENDS:
+            raise ValueError(f"VECTOR_BACKEND must be one of {list(BACKENDS)}, got '{VECTOR_BACKEND}'.")
+        with _BACKENDS_LOCK:
+            backend = _BACKENDS.setdefault(collection_name, BACKENDS[VECTOR_BACKEND](collection_name))
+    return backend
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or re-export the numpy vector indexes.")
+    parser.add_argument('--export', action='store_true', help="Re-export every collection from Chroma")
+    args = parser.parse_args()
+
+    for name in COLLECTIONS:
+        index_dir = os.path.join(VECTOR_INDEX_DIR, name)
+        if args.export:
+            start = time.time()
+            manifest = export_collection(ChromaBackend(name).collection, index_dir)
+            print(f"Exported {name}: {manifest['count']:,} chunks x {manifest['dim']} in {time.time() - start:.2f}s")
+        elif os.path.exists(os.path.join(index_dir, "index.json")):
+            with open(os.path.join(index_dir, "index.json"), 'r') as f:
+                print(f"{name}: {json.load(f)}")
+        else:
+            print(f"{name}: not exported")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Add root directory to python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
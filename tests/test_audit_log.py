@@ -0,0 +1,63 @@
+import json
+import time
+import threading
+
+import pytest
+
+from observability.audit_log import AuditLogWriter
+
+def read_lines(path) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_failed_idle_rotation_keeps_the_writer_alive(tmp_path):
+    path = tmp_path / "audit.jsonl"
+    writer = AuditLogWriter(str(path), flush_interval=0.01, rotate_seconds=0.01, compress=False)
+
+    def fail():
+        raise OSError("disk full")
+    writer._rotate = fail
+    writer.write([{"quote": 1}])
+    writer.flush()
+    deadline = time.time() + 2
+    while writer.errors == 0 and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert writer.errors > 0
+    assert writer._thread.is_alive()
+    writer.write([{"quote": 2}])
+    writer.close()
+    assert read_lines(path) == [{"quote": 1}, {"quote": 2}]
+    assert writer.stats()["dropped"] == 0
+
+@pytest.mark.parametrize("policy, accepted, kept", [
+    ("block", [True, True, False], [0, 1]),
+    ("drop", [True, True, False], [0, 1]),
+    ("drop_oldest", [True, True, True], [0, 2]),
+])
+def test_full_queue_policies(tmp_path, policy, accepted, kept):
+    path = tmp_path / "audit.jsonl"
+    writer = AuditLogWriter(str(path), max_queue=1, policy=policy, block_timeout=0.01, compress=False)
+    writing, release = threading.Event(), threading.Event()
+    write_batch = writer._write_batch
+
+    def held_write(batch):
+        writing.set()
+        release.wait(5)
+        write_batch(batch)
+    writer._write_batch = held_write
+
+    # The first record occupies the writer thread, the second fills the one-slot queue
+    results = [writer.write([{"quote": 0}])]
+    assert writing.wait(5)
+    results += [writer.write([{"quote": i}]) for i in (1, 2)]
+    release.set()
+    writer.close()
+
+    assert results == accepted
+    assert [r["quote"] for r in read_lines(path)] == kept
+    assert writer.stats()["dropped"] == 1 and writer.stats()["written"] == 2
+
+def test_unknown_policy_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        AuditLogWriter(str(tmp_path / "audit.jsonl"), policy="spill")
@@ -0,0 +1,94 @@
+import hashlib
+import os
+
+import chromadb
+import numpy as np
+import pytest
+
+from rag.build_vector_store import chunk_records, sync_collection, write_manifest_entry
+from rag.embedding_cache import CachedEmbeddingFunction
+
+PARAMS = {"chunk_size": 500, "overlap": 50}
+
+class FakeEmbedder:
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, texts):
+        self.texts += texts
+        return [np.frombuffer(hashlib.sha256(t.encode()).digest() * 12, dtype=np.uint8).astype(np.float32) for t in texts]
+
+def paragraph(topic: str, n: int) -> str:
+    return "\n\n".join(f"{topic} rule {i}: " + " ".join(f"{topic}{i}w{j}" for j in range(40)) for i in range(n))
+
+@pytest.fixture
+def build(tmp_path):
+    data_dir = tmp_path / "guidelines"
+    data_dir.mkdir()
+    (data_dir / "age.txt").write_text(paragraph("age", 6))
+    (data_dir / "claims.txt").write_text(paragraph("claims", 4))
+    embedder = FakeEmbedder()
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+    collection = client.get_or_create_collection(
+        name="guidelines", embedding_function=CachedEmbeddingFunction(embedder, cache_dir=""))
+    manifest_path = str(tmp_path / "build_manifest.json")
+
+    def run(**kwargs):
+        embedder.texts.clear()
+        report = sync_collection(collection, chunk_records, PARAMS, data_dir=str(data_dir),
+                                 manifest_path=manifest_path, **kwargs)
+        write_manifest_entry(collection.name, report.pop("entry"), manifest_path)
+        return report, list(embedder.texts)
+
+    first, _ = run()
+    assert first["files_new"] == 2 and first["embedded"] == collection.count() > 2
+    return run, data_dir, collection
+
+def test_unchanged_and_touched_files_are_skipped(build):
+    run, data_dir, collection = build
+    report, embedded = run()
+    assert report["files_unchanged"] == 2 and report["embedded"] == 0 and not embedded
+
+    stat = os.stat(data_dir / "age.txt")
+    os.utime(data_dir / "age.txt", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    report, embedded = run()
+    assert report["files_unchanged"] == 2 and report["embedded"] == report["deleted"] == 0 and not embedded
+    # The new mtime is recorded, so the next run doesn't even re-read the file
+    report, _ = run()
+    assert report["chunks_skipped"] == collection.count()
+
+def test_edited_file_upserts_only_changed_chunks(build):
+    run, data_dir, collection = build
+    before = collection.count()
+    text = (data_dir / "age.txt").read_text()
+    (data_dir / "age.txt").write_text(text.replace("age5w3 ", "age5w3 edited "))
+    report, embedded = run()
+    assert report["files_changed"] == 1 and report["files_unchanged"] == 1
+    assert 1 <= report["embedded"] < before and report["deleted"] == 0
+    assert all("edited" in text for text in embedded)
+    assert collection.count() == before
+
+    # Shortening the file leaves chunk ids it no longer produces; they are deleted
+    (data_dir / "age.txt").write_text(paragraph("age", 2))
+    report, _ = run()
+    assert report["deleted"] > 0
+    ids = set(collection.get(include=[])["ids"])
+    assert ids == {chunk_id for name in ("age.txt", "claims.txt")
+                   for chunk_id, _, _ in chunk_records(name, (data_dir / name).read_text())}
+
+def test_removed_file_deletes_its_chunks(build):
+    run, data_dir, collection = build
+    (data_dir / "claims.txt").unlink()
+    report, embedded = run()
+    assert report["files_removed"] == 1 and report["deleted"] > 0 and not embedded
+    assert all(chunk_id.startswith("age.txt_") for chunk_id in collection.get(include=[])["ids"])
+
+def test_untrusted_manifest_reupserts_and_drops_foreign_ids(build):
+    run, data_dir, collection = build
+    collection.upsert(ids=["stray"], documents=["not from the guidelines"])
+    count = collection.count() - 1
+    report, _ = run()
+    # The manifest no longer matches the collection's chunk count
+    assert report["embedded"] == count and report["deleted"] == 1
+    report, _ = run(full=True)
+    assert report["embedded"] == count and report["deleted"] == 0
@@ -0,0 +1,33 @@
+from data_generation.generate_quotes import generate_quotes
+from database.store import get_store, INSERT_QUOTE
+from mcp_server.cohort_stats import CohortStats, cohort_label, profile_key
+
+PROFILE = {'age': 30, 'postcode_risk': 0.4, 'vehicle_group': 12, 'claims_count': 1, 'ncb_years': 3}
+
+def test_profile_key_and_label():
+    assert profile_key(PROFILE) == (1, 1, 1, 2)
+    assert cohort_label((1, 1, 1, 2)) == "age 25-34, vehicle group 11-20, 1 claim, NCB 3-5 years"
+    assert cohort_label(()) == "all quotes"
+
+def test_appended_quotes_are_folded(tmp_path):
+    db_path = str(tmp_path / "quotes.db")
+    generate_quotes(2000, seed=1, db_path=db_path)
+    stats = CohortStats(db_path, refresh_seconds=0, min_quotes=1)
+    assert stats.refresh(force=True) == 2000
+    before = stats.summary(PROFILE)
+
+    get_store(db_path).executemany(INSERT_QUOTE, [tuple(PROFILE.values()) + (123.0,)] * 3)
+    assert stats.refresh(force=True) == 2003
+    assert stats.summary(PROFILE) != before
+    assert stats._summaries[()][0] == 2003
+
+def test_regenerated_table_with_same_row_count_is_reloaded(tmp_path):
+    db_path = str(tmp_path / "quotes.db")
+    generate_quotes(2000, seed=1, db_path=db_path)
+    stats = CohortStats(db_path, refresh_seconds=0)
+    stale = stats.summary(PROFILE)
+
+    generate_quotes(2000, seed=2, db_path=db_path)
+    current = stats.summary(PROFILE)
+    assert current != stale
+    assert current == CohortStats(db_path).summary(PROFILE)
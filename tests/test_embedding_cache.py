@@ -0,0 +1,59 @@
+import hashlib
+import os
+
+import numpy as np
+
+from rag.embedding_cache import CachedEmbeddingFunction, EmbeddingStore, HEADER, EMBEDDING_MODEL_ID
+
+class FakeEmbedder:
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, texts):
+        self.texts += texts
+        return [np.frombuffer(hashlib.sha256(t.encode()).digest() * 12, dtype=np.uint8).astype(np.float32) for t in texts]
+
+def cache_file(cache_dir) -> str:
+    return os.path.join(str(cache_dir), f"{EMBEDDING_MODEL_ID}.bin")
+
+def test_each_distinct_text_is_embedded_once(tmp_path):
+    fake = FakeEmbedder()
+    embed = CachedEmbeddingFunction(fake, cache_dir=str(tmp_path), max_entries=2)
+    vectors = embed(["young driver", "young   driver", "high mileage"])
+    assert fake.texts == ["young driver", "high mileage"]
+    assert np.array_equal(vectors[0], vectors[1])
+
+    # The LRU holds two vectors: this evicts the oldest, which then comes back from the record file
+    embed(["no claims bonus"])
+    embed(["young driver"])
+    assert fake.texts == ["young driver", "high mileage", "no claims bonus"]
+    assert embed.stats()["disk_hits"] == 1
+
+    # A warm restart embeds nothing it has seen
+    restarted = FakeEmbedder()
+    again = CachedEmbeddingFunction(restarted, cache_dir=str(tmp_path))
+    assert all(np.array_equal(a, b) for a, b in zip(again(["high mileage", "young driver"]), vectors[1:][::-1]))
+    assert restarted.texts == []
+    assert again.stats()["disk_entries"] == 3
+
+def test_torn_tail_is_ignored_then_truncated(tmp_path):
+    fake = FakeEmbedder()
+    CachedEmbeddingFunction(fake, cache_dir=str(tmp_path))(["a", "b"])
+    path = cache_file(tmp_path)
+    record_bytes = (os.path.getsize(path) - HEADER.size) // 2
+    # A crash mid-append leaves part of a record behind
+    with open(path, 'ab') as f:
+        f.write(b"\x01" * (record_bytes // 3))
+
+    store = EmbeddingStore(path)
+    store.sync()
+    assert len(store) == 2
+
+    reader = CachedEmbeddingFunction(fake, cache_dir=str(tmp_path))
+    vectors = reader(["a", "b", "c"])
+    assert fake.texts == ["a", "b", "c"]
+    assert os.path.getsize(path) == HEADER.size + 3 * record_bytes
+    # Records after the truncation line up again for a fresh reader
+    fresh = FakeEmbedder()
+    assert all(np.array_equal(a, b) for a, b in zip(CachedEmbeddingFunction(fresh, cache_dir=str(tmp_path))(["a", "b", "c"]), vectors))
+    assert fresh.texts == []
@@ -0,0 +1,89 @@
+import pickle
+
+import lightgbm as lgb
+import numpy as np
+import pytest
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+from database.quotes_dataset import read_quotes, sync_quotes
+from database.store import get_store
+from pricing_model.evaluate_model import RunningMetrics, evaluate_streaming, HIST_BINS
+from pricing_model.registry import BoosterModel
+
+FEATURES = ['age', 'postcode_risk', 'vehicle_group', 'claims_count', 'ncb_years']
+
+def reference(y: np.ndarray, y_pred: np.ndarray) -> dict:
+    return {"mae": mean_absolute_error(y, y_pred), "rmse": float(np.sqrt(mean_squared_error(y, y_pred))),
+            "r2": r2_score(y, y_pred)}
+
+def assert_metrics(actual: dict, expected: dict, rtol: float = 1e-12):
+    assert actual.keys() == expected.keys()
+    for name in expected:
+        assert actual[name] == pytest.approx(expected[name], rel=rtol), name
+
+@pytest.mark.parametrize("offset", [0.0, 1e8])
+def test_merged_chunks_match_the_whole_array(offset):
+    rng = np.random.default_rng(0)
+    # A large offset with a small spread is where a naive sum-of-squares merge loses R²
+    y = offset + rng.gamma(2.0, 300.0, 10_007)
+    y_pred = y + rng.normal(0, 40.0, len(y))
+    bounds = [0, 1, 2, 500, 501, 4096, 9000, len(y)]
+
+    metrics = RunningMetrics()
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        metrics.merge(RunningMetrics.from_chunk(y[lo:hi], y_pred[lo:hi]))
+    metrics.merge(RunningMetrics.from_chunk(y[:0], y_pred[:0]))
+
+    assert metrics.n == len(y)
+    assert metrics.y_mean == pytest.approx(y.mean(), rel=1e-14)
+    assert metrics.y_m2 == pytest.approx(((y - y.mean()) ** 2).sum(), rel=1e-9)
+    assert_metrics(metrics.result(), reference(y, y_pred), rtol=1e-9)
+    assert RunningMetrics().result() == {}
+
+@pytest.fixture(scope="module")
+def evaluation_inputs(tmp_path_factory):
+    root = tmp_path_factory.mktemp("evaluate")
+    rng = np.random.default_rng(1)
+    n = 3000
+    X = np.column_stack([rng.integers(18, 81, n), rng.uniform(0, 1, n), rng.integers(1, 51, n),
+                         rng.integers(0, 6, n), rng.integers(0, 11, n)]).astype(np.float64)
+    y = np.round(450 + 7 * np.abs(X[:, 0] - 45) + 300 * X[:, 1] + 60 * X[:, 3] + rng.normal(0, 30, n), 2)
+    db_path = str(root / "quotes.db")
+    get_store(db_path).replace_quotes([[(*row, premium) for row, premium in zip(X.tolist(), y.tolist())]])
+    dataset_dir = str(root / "parquet")
+    sync_quotes(db_path, dataset_dir, verbose=False)
+
+    booster = lgb.train({'objective': 'regression', 'max_depth': 4, 'verbose': -1},
+                        lgb.Dataset(X, y, feature_name=FEATURES), num_boost_round=20)
+    model_path = str(root / "pricing_model.pkl")
+    with open(model_path, 'wb') as f:
+        pickle.dump({'model': BoosterModel(booster), 'features': FEATURES}, f)
+    return model_path, dataset_dir, booster, n
+
+def test_streaming_evaluation_matches_in_memory(evaluation_inputs):
+    model_path, dataset_dir, booster, n = evaluation_inputs
+    table = read_quotes(dataset_dir=dataset_dir, sync=False)
+    X = np.column_stack([table.column(f).to_numpy() for f in FEATURES]).astype(np.float64)
+    y = table.column('premium').to_numpy()
+    y_pred = booster.predict(X)
+
+    metrics, hist, edges, sample = evaluate_streaming(model_path, dataset_dir, n, chunk_rows=700, workers=1,
+                                                      sample_size=500)
+    assert metrics.n == n
+    assert_metrics(metrics.result(), reference(y, y_pred), rtol=1e-9)
+    assert hist.shape == (HIST_BINS, HIST_BINS) and hist.sum() == n
+    assert edges[0] == y.min() and edges[-1] == y.max()
+    keys, y_sample, pred_sample = sample
+    assert len(keys) == 500
+    # Sampled pairs are real (actual, predicted) quotes
+    pairs = set(zip(y.tolist(), y_pred.tolist()))
+    assert set(zip(y_sample.tolist(), pred_sample.tolist())) <= pairs
+
+def test_worker_count_does_not_change_the_result(evaluation_inputs):
+    model_path, dataset_dir, _, n = evaluation_inputs
+    single = evaluate_streaming(model_path, dataset_dir, n, chunk_rows=700, workers=1, sample_size=500)
+    pooled = evaluate_streaming(model_path, dataset_dir, n, chunk_rows=700, workers=2, sample_size=500)
+    assert pooled[0].result() == single[0].result()
+    assert np.array_equal(pooled[1], single[1])
+    for pooled_column, single_column in zip(pooled[3], single[3]):
+        assert np.array_equal(np.sort(pooled_column), np.sort(single_column))
@@ -0,0 +1,66 @@
+import hashlib
+import os
+
+import chromadb
+import numpy as np
+import pytest
+
+from rag import feature_map
+from rag.embedding_cache import CachedEmbeddingFunction
+from rag.feature_map import FeatureMap, build_feature_map, invalidate_feature_map
+
+KEYWORDS = ["age", "claims_count", "ncb_years"]
+
+class FakeEmbedder:
+    def __call__(self, texts):
+        return [np.frombuffer(hashlib.sha256(t.encode()).digest() * 12, dtype=np.uint8).astype(np.float32) for t in texts]
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+    embed = CachedEmbeddingFunction(FakeEmbedder(), cache_dir="")
+
+    def collection():
+        return client.get_or_create_collection(name="guidelines", embedding_function=embed)
+    # Serving processes read the index version from a freshly fetched collection
+    monkeypatch.setattr(feature_map, "guidelines_collection", collection)
+    collection().add(ids=[f"chunk_{i}" for i in range(12)],
+                     documents=[f"guideline {i}: " + " ".join(KEYWORDS[i % 3] for _ in range(i + 1)) for i in range(12)],
+                     metadatas=[{"source": f"doc{i % 4}.txt"} for i in range(12)])
+    return collection, str(tmp_path / "feature_map.json")
+
+def test_lookups_match_a_live_search(index):
+    collection, path = index
+    built = build_feature_map(collection(), path, keywords=KEYWORDS, n_results=4)
+    assert collection().metadata["index_version"] == built["index_version"]
+
+    loaded = FeatureMap(path)
+    live = collection().query(query_texts=KEYWORDS, n_results=3, include=['documents', 'distances'])
+    for i, keyword in enumerate(KEYWORDS):
+        hits = loaded.lookup(keyword, 3)
+        assert [hit["id"] for hit in hits] == live["ids"][i]
+        assert [hit["document"] for hit in hits] == live["documents"][i]
+        assert [hit["distance"] for hit in hits] == pytest.approx(live["distances"][i])
+    # More results than were precomputed, or an unknown keyword, are searched live
+    assert loaded.lookup("age", 5) is None
+    assert loaded.lookup("postcode_risk", 1) is None
+
+def test_map_from_an_older_index_is_ignored(index):
+    collection, path = index
+    build_feature_map(collection(), path, keywords=KEYWORDS, n_results=4)
+    with open(path) as f:
+        stale = f.read()
+    collection().upsert(ids=["chunk_0"], documents=["guideline 0: rewritten"], metadatas=[{"source": "doc0.txt"}])
+    build_feature_map(collection(), path, keywords=KEYWORDS, n_results=4)
+
+    loaded = FeatureMap(path)
+    assert loaded.lookup("age", 1) is not None
+    # The previous index's map, e.g. restored from a backup
+    with open(path, 'w') as f:
+        f.write(stale)
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10 ** 9))
+    assert loaded.lookup("age", 1) is None
+
+    invalidate_feature_map(path)
+    assert not os.path.exists(path)
+    assert loaded.lookup("age", 1) is None
@@ -0,0 +1,23 @@
+import numpy as np
+
+from data_generation.generate_quotes import generate_quotes, iter_chunks, verify_reference
+from database.store import get_store, SELECT_QUOTES
+
+def test_matches_the_reference_generator():
+    assert verify_reference(5000) == 0
+    assert verify_reference(2000, seed=7) == 0
+
+def test_output_is_independent_of_worker_count():
+    serial = [np.column_stack(c) for c in iter_chunks(2500, seed=3, chunk_size=1000, workers=1)]
+    parallel = [np.column_stack(c) for c in iter_chunks(2500, seed=3, chunk_size=1000, workers=2)]
+    assert [len(c) for c in serial] == [1000, 1000, 500]
+    assert all(np.array_equal(a, b) for a, b in zip(serial, parallel))
+    # Later chunks draw from their own streams rather than repeating chunk 0
+    assert not np.array_equal(serial[0][:500], serial[2])
+
+def test_generated_table_holds_every_chunk_in_order(tmp_path):
+    db_path = str(tmp_path / "quotes.db")
+    generate_quotes(2500, seed=3, db_path=db_path, chunk_size=1000)
+    stored = get_store(db_path).fetch_array(SELECT_QUOTES + " ORDER BY rowid")
+    expected = np.vstack([np.column_stack(c) for c in iter_chunks(2500, seed=3, chunk_size=1000)])
+    assert np.array_equal(stored, expected)
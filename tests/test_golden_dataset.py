@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+import data_generation.generate_golden_dataset as golden
+from data_generation.generate_golden_dataset import GUIDELINE_BANDS, band_of, generate_golden_dataset
+
+def fake_prices(shap_order):
+    """price_profiles stand-in whose SHAP magnitudes rank the features in shap_order."""
+    def price_profiles(profiles):
+        return [{'predicted_premium': 500.0 + i,
+                 'shap_values': {f: float(len(shap_order) - rank) for rank, f in enumerate(shap_order)},
+                 'model_version': 'test'} for i, _ in enumerate(profiles)]
+    return price_profiles
+
+def test_bands_cover_the_rating_space():
+    assert band_of('ncb_years', 4) == 2 and GUIDELINE_BANDS['ncb_years'][1][2][3] is None
+    assert GUIDELINE_BANDS['ncb_years'][1][band_of('ncb_years', 3)][3] == "10-20% discount"
+    assert GUIDELINE_BANDS['postcode_risk'][1][band_of('postcode_risk', 0.5)][3] is None
+    for feature, (_, bands) in GUIDELINE_BANDS.items():
+        assert all(prev[1] + 1 == band[0] for prev, band in zip(bands, bands[1:])), feature
+
+def test_concepts_are_quoted_from_rules(tmp_path, monkeypatch):
+    monkeypatch.setattr(golden, "price_profiles", fake_prices(['ncb_years', 'postcode_risk', 'age', 'claims_count']))
+    output = tmp_path / "golden.json"
+    cases = generate_golden_dataset(400, output_path=str(output))
+    assert json.loads(output.read_text()) == cases
+
+    rules = {}
+    for filename in {filename for filename, _ in GUIDELINE_BANDS.values()}:
+        with open(f"data/guidelines/{filename}") as f:
+            rules.update({f"{filename}#{line.strip().split('.', 1)[0]}": line for line in f if line.strip()[:1].isdigit()})
+    for case in cases:
+        assert len(case['required_concepts']) == len(case['guideline_sources'])
+        for concept, source in zip(case['required_concepts'], case['guideline_sources']):
+            assert concept in rules[source]
+        uncovered = (case['profile']['ncb_years'] == 4) + (0.2 <= case['profile']['postcode_risk'] <= 0.8)
+        assert len(case['required_concepts']) == 3 - uncovered
+
+def test_edited_rule_fails_generation(tmp_path):
+    for filename, _ in GUIDELINE_BANDS.values():
+        with open(f"data/guidelines/{filename}") as f:
+            (tmp_path / filename).write_text(f.read().replace("Family cars", "Family saloons"))
+    with pytest.raises(ValueError, match="Family cars"):
+        golden.load_guideline_rules(str(tmp_path))
@@ -0,0 +1,55 @@
+from database.store import get_store
+from observability.latency_rollups import LatencyRollups
+
+DAY = 86400
+NOW = 1_800_000_000  # on an hour boundary
+
+def bucket_counts(db_path: str) -> dict:
+    rows = get_store(db_path).fetch_all("SELECT resolution, COUNT(*) FROM latency_rollups GROUP BY resolution")
+    return dict(rows)
+
+def test_each_resolution_is_purged_on_its_own_horizon(tmp_path):
+    db_path = str(tmp_path / "quotes.db")
+    rollups = LatencyRollups(db_path, retention_days={60: 1, 300: 10, 3600: 100})
+    ages_days = [0, 5, 50, 500]
+    with get_store(db_path).transaction() as conn:
+        rollups.update(conn, [(NOW - age * DAY, "/explain", (100.0, None, None, None, None)) for age in ages_days])
+    assert bucket_counts(db_path) == {60: 4, 300: 4, 3600: 4}
+
+    with get_store(db_path).transaction() as conn:
+        deleted = rollups.apply_retention(conn, now=NOW)
+    # Minute buckets keep 1 day, 5-minute buckets 10 days, hourly buckets 100 days
+    assert bucket_counts(db_path) == {60: 1, 300: 2, 3600: 3}
+    assert deleted == 3 + 2 + 1
+
+def test_resolutions_without_a_horizon_are_kept(tmp_path):
+    db_path = str(tmp_path / "quotes.db")
+    rollups = LatencyRollups(db_path, retention_days={60: 1})
+    with get_store(db_path).transaction() as conn:
+        rollups.update(conn, [(NOW - 365 * DAY, "/explain", (100.0, None, None, None, None))])
+        rollups.apply_retention(conn, now=NOW)
+    assert bucket_counts(db_path) == {300: 1, 3600: 1}
+
+def test_cover_uses_coarse_buckets_inside_and_fine_ones_at_the_edges():
+    rollups = LatencyRollups(":memory:", retention_days={60: 7, 300: 90, 3600: 730})
+    start, end = NOW - 2 * 3600 - 90, NOW + 330
+    pieces = rollups.cover(start, end, now=end)
+    assert (3600, NOW - 7200, NOW) in pieces
+    assert sum(hi - lo for _, lo, hi in pieces) == end - start
+    assert {r for r, _, _ in pieces} == {60, 300, 3600}
+    # Past the minute retention the old edge falls back to 5-minute buckets
+    old = rollups.cover(NOW - 30 * DAY - 90, NOW, now=NOW)
+    assert min(old, key=lambda piece: piece[1])[0] == 300
+
+def test_unaligned_summary_covers_windows_longer_than_minute_retention(tmp_path):
+    db_path = str(tmp_path / "quotes.db")
+    rollups = LatencyRollups(db_path, retention_days={60: 7, 300: 90, 3600: 730})
+    times = [NOW - 30 * DAY + i * 1800 for i in range(1, 29 * 48)]
+    with get_store(db_path).transaction() as conn:
+        rollups.update(conn, [(ts, "/explain", (float(i), None, None, None, None)) for i, ts in enumerate(times)])
+        rollups.apply_retention(conn, now=NOW)
+    end = NOW + 17.5
+    summary = rollups.summary('total', end - 31 * DAY, end)
+    assert summary['count'] == len(times)
+    series = rollups.series('total', end - 31 * DAY, end, interval=3600)
+    assert sum(row['count'] for row in series) == summary['count']
@@ -0,0 +1,41 @@
+import numpy as np
+
+from rag.lexical_index import LexicalIndex, stem, tokenize
+
+def test_stem_merges_inflections():
+    assert stem("increase") == stem("increased") == stem("increasing") == "increas"
+    assert stem("claims") == stem("claim") == "claim"
+    assert stem("policies") == "policy"
+    # Short tokens, numbers and -ss/-us/-is endings are left alone
+    assert [stem(t) for t in ("ncb", "21", "class", "bonus", "basis")] == ["ncb", "21", "class", "bonus", "basis"]
+
+def test_tokenize_lowercases_splits_and_drops_stopwords():
+    assert tokenize("Claims, claims_count and the Postcode_Risk of 0.75!") == \
+        ["claim", "claim", "count", "postcod", "risk", "0.75"]
+    assert tokenize("the of and") == []
+
+def bm25_reference(documents: list, query: str, k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    tokens = [tokenize(d) for d in documents]
+    avgdl = np.mean([len(t) for t in tokens])
+    scores = np.zeros(len(documents))
+    for term in tokenize(query):
+        df = sum(term in t for t in tokens)
+        idf = np.log1p((len(tokens) - df + 0.5) / (df + 0.5))
+        for i, t in enumerate(tokens):
+            tf = t.count(term)
+            scores[i] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(t) / avgdl))
+    return scores
+
+def test_scores_match_bm25_with_lucene_idf():
+    documents = ["young drivers pay a surcharge", "claims raise the premium", "premium discount for no claims bonus claims"]
+    index = LexicalIndex.from_documents(["a", "b", "c"], documents)
+    for query in ("claims premium", "young claims", "premium premium", "nothing matches"):
+        np.testing.assert_allclose(index.score(query), bm25_reference(documents, query), rtol=1e-5)
+
+def test_score_ids_matches_score_and_handles_empty_chunks():
+    index = LexicalIndex.from_documents(['a', 'b', 'c'], ['claims surcharge young', 'postcode risk high', 'the of and'])
+    full = index.score('claims risk')
+    np.testing.assert_allclose(index.score_ids('claims risk', ['a', 'b', 'c']), full)
+    # Reordered, unknown and token-less candidates
+    np.testing.assert_allclose(index.score_ids('claims risk', ['c', 'x', 'b', 'a']), [0, 0, full[1], full[0]])
+    np.testing.assert_array_equal(index.score_ids('the', ['a', 'b']), [0, 0])
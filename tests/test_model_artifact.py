@@ -0,0 +1,70 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import lightgbm as lgb
+import numpy as np
+import pytest
+
+from pricing_model.predict import get_booster, price_matrix
+from pricing_model.registry import BoosterModel, ModelRegistry, publish_model, TREES_DIR
+
+FEATURES = ['age', 'postcode_risk', 'vehicle_group', 'claims_count', 'ncb_years']
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def profiles(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.integers(18, 81, n), rng.uniform(0, 1, n), rng.integers(1, 51, n),
+        rng.integers(0, 6, n), rng.integers(0, 11, n)
+    ]).astype(np.float64)
+
+@pytest.fixture(scope="module")
+def published(tmp_path_factory):
+    registry_dir = str(tmp_path_factory.mktemp("registry"))
+    X = profiles(2000)
+    y = 450 + 7 * np.abs(X[:, 0] - 45) + 300 * X[:, 1] + 60 * X[:, 3] - 12 * X[:, 4]
+    booster = lgb.train({'objective': 'regression', 'max_depth': 5, 'verbose': -1},
+                        lgb.Dataset(X, y, feature_name=FEATURES), num_boost_round=30)
+    version = publish_model({'model': BoosterModel(booster), 'features': FEATURES, 'metrics': {'rmse': 1.5}}, registry_dir)
+    return registry_dir, version
+
+def test_arrays_artifact_prices_like_the_pickle(published):
+    registry_dir, version = published
+    pickled = ModelRegistry(registry_dir, poll_interval=0, model_format="pickle").load_version(version)
+    arrays = ModelRegistry(registry_dir, poll_interval=0, model_format="arrays").load_version(version)
+    assert 'model' not in arrays and isinstance(arrays['tree_engine'].value, np.memmap)
+    assert arrays['features'] == FEATURES and arrays['metrics'] == {'rmse': 1.5}
+
+    X = profiles(300, seed=1)
+    expected = price_matrix(pickled, X, engine="lightgbm", shap_backend="native")
+    actual = price_matrix(arrays, X, engine="numpy", shap_backend="native")
+    assert np.array_equal(actual[0], expected[0])
+    np.testing.assert_allclose(actual[1], expected[1], atol=1e-9)
+    assert actual[2] == pytest.approx(expected[2])
+    # The booster is still available on demand, read from model.txt
+    assert np.array_equal(get_booster(arrays).predict(X), expected[0])
+
+def test_version_without_tree_arrays_falls_back_to_the_pickle(published, tmp_path):
+    registry_dir, version = published
+    copy_dir = str(tmp_path / "registry")
+    shutil.copytree(registry_dir, copy_dir)
+    shutil.rmtree(os.path.join(copy_dir, version, TREES_DIR))
+    model_data = ModelRegistry(copy_dir, poll_interval=0, model_format="arrays").load_version(version)
+    assert 'model' in model_data
+
+def test_arrays_load_without_lightgbm_or_unpickling(published):
+    registry_dir, version = published
+    script = (
+        "import sys, pickle, numpy as np\n"
+        "pickle.load = pickle.loads = None\n"
+        "from pricing_model.registry import load_arrays_artifact\n"
+        f"data = load_arrays_artifact({os.path.join(registry_dir, version)!r})\n"
+        "print(data['tree_engine'].predict(np.array([[30, 0.5, 10, 1, 3]], dtype=float))[0])\n"
+        "assert 'lightgbm' not in sys.modules\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    booster = lgb.Booster(model_file=os.path.join(registry_dir, version, "model.txt"))
+    assert float(result.stdout) == pytest.approx(booster.predict(np.array([[30, 0.5, 10, 1, 3]], dtype=float))[0])
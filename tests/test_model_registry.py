@@ -0,0 +1,74 @@
+import threading
+import time
+
+import lightgbm as lgb
+import numpy as np
+import pytest
+
+from pricing_model.registry import BoosterModel, ModelRegistry, publish_model
+
+FEATURES = ['age', 'postcode_risk', 'vehicle_group', 'claims_count', 'ncb_years']
+
+def model_data(rounds: int) -> dict:
+    rng = np.random.default_rng(rounds)
+    X = rng.uniform(0, 50, (300, len(FEATURES)))
+    booster = lgb.train({'objective': 'regression', 'num_leaves': 4, 'verbose': -1},
+                        lgb.Dataset(X, X[:, 0] * 10, feature_name=FEATURES), num_boost_round=rounds)
+    return {'model': BoosterModel(booster), 'features': FEATURES}
+
+@pytest.fixture
+def registry_dir(tmp_path):
+    return str(tmp_path / "versions")
+
+def test_active_reads_latest_once(registry_dir, monkeypatch):
+    registry = ModelRegistry(registry_dir, poll_interval=0)
+    reads = []
+    latest_version = registry.latest_version
+    monkeypatch.setattr(registry, "latest_version", lambda: reads.append(1) or latest_version())
+    assert [registry.active() for _ in range(5)] == [None] * 5
+    assert len(reads) == 1
+
+    # With polling disabled a later version is only picked up by an explicit refresh
+    version = publish_model(model_data(3), registry_dir)
+    assert registry.active() is None
+    assert registry.refresh() and registry.active()['version'] == version
+
+def watchers() -> int:
+    return sum(t.name == "model-registry-watcher" and t.is_alive() for t in threading.enumerate())
+
+def test_concurrent_first_use_loads_and_watches_once(registry_dir, n_threads=8):
+    version = publish_model(model_data(3), registry_dir)
+    warmed = []
+    registry = ModelRegistry(registry_dir, warmup=lambda data: (time.sleep(0.05), warmed.append(data['version'])),
+                             poll_interval=60)
+    barrier = threading.Barrier(n_threads)
+    running = watchers()
+    seen = []
+
+    def first_request():
+        barrier.wait()
+        seen.append(registry.active()['version'])
+
+    threads = [threading.Thread(target=first_request) for _ in range(n_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert watchers() == running + 1
+    registry.stop_watching()
+    assert seen == [version] * n_threads
+    assert warmed == [version]
+
+def test_watcher_swaps_to_new_version(registry_dir):
+    first = publish_model(model_data(3), registry_dir)
+    registry = ModelRegistry(registry_dir, poll_interval=0.02)
+    held = registry.active()
+    assert held['version'] == first
+    second = publish_model(model_data(5), registry_dir)
+    deadline = time.time() + 5
+    while registry.active_version != second and time.time() < deadline:
+        time.sleep(0.02)
+    registry.stop_watching()
+    assert registry.active()['version'] == second
+    # Requests already holding the old model_data keep it
+    assert held['version'] == first and held['model'].booster_.num_trees() == 3
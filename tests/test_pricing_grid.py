@@ -0,0 +1,32 @@
+import numpy as np
+
+from pricing_model.build_pricing_grid import PricingGrid, grid_spec
+
+FEATURES = ['age', 'postcode_risk', 'claims_count']
+
+def make_grid() -> PricingGrid:
+    axes = grid_spec(FEATURES, postcode_step=0.25)
+    n_cells = int(np.prod([axis['size'] for axis in axes]))
+    meta = {'model_version': 'test', 'features': FEATURES, 'base_value': 0.0, 'axes': axes}
+    premiums = np.arange(n_cells, dtype=np.float64)
+    return PricingGrid(meta, premiums, np.zeros((n_cells, len(FEATURES))))
+
+def test_locate_round_trips_grid_points():
+    grid = make_grid()
+    cells = np.array([0, 7, grid.n_cells - 1])
+    on_grid, flat_index = grid.locate(grid.cell_profiles(cells))
+    assert on_grid.all()
+    np.testing.assert_array_equal(flat_index, cells)
+
+def test_non_finite_rows_are_off_grid():
+    grid = make_grid()
+    X = np.array([
+        [30, 0.5, 1],
+        [np.nan, 0.5, 1],
+        [30, np.inf, 1],
+        [30, 0.5, -np.inf],
+        [30, 0.3, 1]
+    ])
+    on_grid, premiums, _ = grid.lookup(X)
+    np.testing.assert_array_equal(on_grid, [True, False, False, False, False])
+    assert len(premiums) == 1
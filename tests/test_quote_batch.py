@@ -0,0 +1,26 @@
+import pytest
+from pydantic import ValidationError
+
+from api.main import QuoteBatchRequest, MAX_BATCH_SIZE
+
+PROFILE = {"age": 30, "postcode_risk": 1.0, "vehicle_group": 5, "claims_count": 0, "ncb_years": 2}
+
+def test_batch_limit_is_enforced_by_validation():
+    QuoteBatchRequest.model_validate({"profiles": [PROFILE] * MAX_BATCH_SIZE})
+    with pytest.raises(ValidationError) as info:
+        QuoteBatchRequest.model_validate({"profiles": [PROFILE] * (MAX_BATCH_SIZE + 1)})
+    assert info.value.errors()[0]["type"] == "too_long"
+
+def test_oversized_batch_is_rejected_without_validating_profiles():
+    # Malformed profiles past the limit would add one error each if they were validated
+    with pytest.raises(ValidationError) as info:
+        QuoteBatchRequest.model_validate({"profiles": [PROFILE] * MAX_BATCH_SIZE + [{"age": "x"}] * 1000})
+    assert [e["type"] for e in info.value.errors()] == ["too_long"]
+
+def test_oversized_batch_gets_a_422():
+    from fastapi.testclient import TestClient
+    from api.main import app
+
+    response = TestClient(app).post("/quote/batch", json={"profiles": [PROFILE] * (MAX_BATCH_SIZE + 1)})
+    assert response.status_code == 422
+    assert [e["type"] for e in response.json()["detail"]] == ["too_long"]
@@ -0,0 +1,51 @@
+import numpy as np
+
+from data_generation.generate_quotes import generate_quotes
+from database.store import get_store, INSERT_QUOTE, QUOTE_COLUMNS
+from mcp_server.quote_index import QuoteIndex
+
+PROFILE = {'age': 30, 'postcode_risk': 0.4, 'vehicle_group': 12, 'claims_count': 1, 'ncb_years': 3}
+
+def table_rows(db_path: str) -> dict:
+    rows = get_store(db_path).fetch_all(f"SELECT rowid, {', '.join(QUOTE_COLUMNS)} FROM quotes")
+    return {row[0]: row[1:] for row in rows}
+
+def assert_results_match_table(results: list, db_path: str):
+    table = table_rows(db_path)
+    for result in results:
+        assert tuple(result[c] for c in QUOTE_COLUMNS) == tuple(table[result['rowid']])
+
+def test_appended_quotes_are_added_incrementally(tmp_path):
+    db_path = str(tmp_path / "quotes.db")
+    generate_quotes(2000, seed=1, db_path=db_path)
+    index = QuoteIndex(db_path, refresh_seconds=0)
+    assert index.refresh(force=True) == 2000
+
+    get_store(db_path).executemany(INSERT_QUOTE, [tuple(PROFILE.values()) + (123.0,)] * 3)
+    assert index.refresh(force=True) == 3
+    assert index._snapshot.size == 2003
+    assert index.query(PROFILE, k=3)[0]['distance'] == 0.0
+
+def test_regenerated_table_with_more_rows_is_rebuilt(tmp_path):
+    db_path = str(tmp_path / "quotes.db")
+    generate_quotes(2000, seed=1, db_path=db_path)
+    index = QuoteIndex(db_path, refresh_seconds=0)
+    index.query(PROFILE)
+
+    generate_quotes(3000, seed=2, db_path=db_path)
+    assert index.refresh(force=True) == 3000
+    snapshot = index._snapshot
+    assert snapshot.size == 3000 and len(snapshot.delta_rowid) == 0
+    assert_results_match_table(index.query(PROFILE, k=20), db_path)
+
+def test_regenerated_table_with_as_many_rows_is_rebuilt(tmp_path):
+    db_path = str(tmp_path / "quotes.db")
+    generate_quotes(2000, seed=1, db_path=db_path)
+    index = QuoteIndex(db_path, refresh_seconds=0)
+    index.query(PROFILE)
+    before = index._snapshot.base_premium.copy()
+
+    generate_quotes(2000, seed=2, db_path=db_path)
+    assert index.refresh(force=True) == 2000
+    assert not np.array_equal(index._snapshot.base_premium, before)
+    assert_results_match_table(index.query(PROFILE, k=20), db_path)
@@ -0,0 +1,44 @@
+import pytest
+
+from database.store import QuoteStore
+
+def quote(i: int) -> tuple:
+    return (18 + i % 60, 0.5, 1 + i % 50, i % 3, i % 10, 100.0 + i)
+
+@pytest.fixture
+def store(tmp_path):
+    store = QuoteStore(str(tmp_path / "quotes.db"))
+    store.replace_quotes([[quote(i) for i in range(100)]])
+    store.execute("INSERT INTO quote_cohorts_state (id, through_rowid) VALUES (1, 100)")
+    yield store
+    store.close()
+
+def test_readers_see_old_quotes_until_the_swap(store):
+    seen = []
+
+    def batches():
+        for lo in range(0, 300, 100):
+            seen.append(store.scalar("SELECT COUNT(*) FROM quotes"))
+            yield [quote(i) for i in range(lo, lo + 100)]
+
+    store.replace_quotes(batches())
+    assert seen == [100, 100, 100]
+    assert store.scalar("SELECT COUNT(*) FROM quotes") == 300
+    assert store.scalar("SELECT MIN(rowid) FROM quotes") == 1
+    assert store.scalar("SELECT COUNT(*) FROM quote_cohorts_state") == 0
+    names = {row[0] for row in store.fetch_all("SELECT name FROM sqlite_master")}
+    assert {"idx_quotes_age_cover", "idx_quotes_vehicle_cover", "quote_cohorts"} <= names
+    assert "quotes_staging" not in names
+
+def test_failed_load_keeps_the_old_quotes(store):
+    def batches():
+        yield [quote(i) for i in range(50)]
+        raise RuntimeError("generator failed")
+
+    with pytest.raises(RuntimeError):
+        store.replace_quotes(batches())
+    assert store.scalar("SELECT COUNT(*) FROM quotes") == 100
+    assert store.scalar("SELECT through_rowid FROM quote_cohorts_state") == 100
+    # The next replace starts from a fresh staging table
+    store.replace_quotes([[quote(i) for i in range(10)]])
+    assert store.scalar("SELECT COUNT(*) FROM quotes") == 10
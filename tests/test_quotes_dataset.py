@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pyarrow.dataset as ds
+import pytest
+
+from database import quotes_dataset
+from database.quotes_dataset import sync_quotes, read_quotes, column_range, read_manifest
+from database.store import get_store, INSERT_QUOTE, SELECT_QUOTES
+
+def quote(i: int) -> tuple:
+    return (18 + i % 60, 0.5 + (i % 7) / 10, 1 + i % 50, i % 3, i % 10, 100.0 + i)
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Small blocks so a few hundred rows span several partitions
+    monkeypatch.setattr(quotes_dataset, "PARTITION_ROWS", 100)
+    monkeypatch.setattr(quotes_dataset, "FINGERPRINT_ROWS", 20)
+    db_path = str(tmp_path / "quotes.db")
+    get_store(db_path).replace_quotes([[quote(i) for i in range(250)]])
+    return db_path
+
+def as_array(table) -> np.ndarray:
+    return np.column_stack([table.column(name).to_numpy().astype(np.float64) for name in table.column_names])
+
+def sqlite_quotes(db_path: str) -> np.ndarray:
+    return get_store(db_path).fetch_array(SELECT_QUOTES + " ORDER BY rowid")
+
+def blocks(dataset_dir: str) -> set:
+    return {name for name in os.listdir(dataset_dir) if name.startswith("block=")}
+
+def test_export_matches_sqlite(db, tmp_path):
+    dataset_dir = str(tmp_path / "parquet")
+    manifest = sync_quotes(db, dataset_dir, verbose=False)
+    assert manifest["exported_through"] == 250
+    assert blocks(dataset_dir) == {"block=00000", "block=00001", "block=00002"}
+    np.testing.assert_array_equal(as_array(read_quotes(dataset_dir=dataset_dir, sync=False)), sqlite_quotes(db))
+
+    young = read_quotes(["age", "premium"], filter=ds.field("age") < 25, dataset_dir=dataset_dir, sync=False)
+    expected = sqlite_quotes(db)
+    expected = expected[expected[:, 0] < 25][:, [0, 5]]
+    np.testing.assert_array_equal(as_array(young), expected)
+    assert column_range("age", dataset_dir) == (18, 77)
+
+def test_sync_appends_only_the_new_rows(db, tmp_path):
+    dataset_dir = str(tmp_path / "parquet")
+    sync_quotes(db, dataset_dir, verbose=False)
+    first = os.path.join(dataset_dir, "block=00000", "part-0.parquet")
+    mtime = os.stat(first).st_mtime_ns
+
+    get_store(db).executemany(INSERT_QUOTE, [quote(i) for i in range(250, 320)])
+    manifest = sync_quotes(db, dataset_dir, verbose=False)
+    assert manifest["exported_through"] == 320
+    # Full blocks are left alone; the partial one is rewritten and a new one added
+    assert os.stat(first).st_mtime_ns == mtime
+    assert blocks(dataset_dir) == {"block=00000", "block=00001", "block=00002", "block=00003"}
+    np.testing.assert_array_equal(as_array(read_quotes(dataset_dir=dataset_dir, sync=False)), sqlite_quotes(db))
+    # Nothing new: the manifest comes back as it was
+    assert sync_quotes(db, dataset_dir, verbose=False) == manifest
+
+def test_regenerated_table_is_exported_again(db, tmp_path):
+    dataset_dir = str(tmp_path / "parquet")
+    sync_quotes(db, dataset_dir, verbose=False)
+    fingerprint = read_manifest(dataset_dir)["fingerprint"]
+
+    # Same row count, different quotes: only the fingerprint tells them apart
+    get_store(db).replace_quotes([[quote(i + 1) for i in range(250)]])
+    manifest = sync_quotes(db, dataset_dir, verbose=False)
+    assert manifest["fingerprint"] != fingerprint
+    np.testing.assert_array_equal(as_array(read_quotes(dataset_dir=dataset_dir, sync=False)), sqlite_quotes(db))
+
+    # A shorter table drops the blocks past its end
+    get_store(db).replace_quotes([[quote(i + 1) for i in range(150)]])
+    manifest = sync_quotes(db, dataset_dir, verbose=False)
+    assert manifest["exported_through"] == 150
+    assert blocks(dataset_dir) == {"block=00000", "block=00001"}
+    np.testing.assert_array_equal(as_array(read_quotes(dataset_dir=dataset_dir, db_path=db)), sqlite_quotes(db))
@@ -0,0 +1,65 @@
+import pickle
+
+import lightgbm as lgb
+import numpy as np
+import pyarrow.dataset as ds
+import pytest
+
+from data_generation.generate_quotes import generate_quotes
+from database.store import get_store, SELECT_QUOTES, RATING_FACTORS
+from mcp_server.cohort_stats import AGE_BANDS, VEHICLE_GROUP_BANDS
+from pricing_model.registry import BoosterModel, publish_model
+from pricing_model.rerate_portfolio import rerate_portfolio, segment_ids, CLAIMS_MAX
+
+def train(X: np.ndarray, y: np.ndarray, rounds: int):
+    params = {'objective': 'regression', 'max_depth': 4, 'num_leaves': 15, 'verbose': -1}
+    return lgb.train(params, lgb.Dataset(X, y, feature_name=RATING_FACTORS), num_boost_round=rounds)
+
+@pytest.fixture
+def portfolio(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "quotes.db")
+    generate_quotes(3000, db_path=db_path)
+    data = get_store(db_path).fetch_array(SELECT_QUOTES)
+    X, y = data[:, :-1], data[:, -1]
+    # rerate_portfolio resolves LATEST in the working directory's registry
+    monkeypatch.chdir(tmp_path)
+    model_data = {'model': BoosterModel(train(X, y, 10)), 'features': RATING_FACTORS}
+    publish_model(model_data)
+    with open("model.pkl", "wb") as f:
+        pickle.dump(model_data, f)
+    train(X, y, 30).save_model("candidate.txt")
+    return db_path, X
+
+def test_same_model_is_rejected(portfolio):
+    db_path, _ = portfolio
+    with pytest.raises(ValueError, match="same model"):
+        rerate_portfolio('LATEST', 'model.pkl', db_path, dataset_dir="parquet", output_dir="out")
+    version = open("pricing_model/versions/LATEST").read()
+    with pytest.raises(ValueError, match="same model"):
+        rerate_portfolio(version, f"pricing_model/versions/{version}/model.txt", db_path, dataset_dir="parquet")
+
+def test_rerating_matches_direct_scoring(portfolio):
+    db_path, X = portfolio
+    run = rerate_portfolio('LATEST', 'candidate.txt', db_path, dataset_dir="parquet", output_dir="out",
+                           chunk_rows=700, workers=1)
+    deltas = ds.dataset("out/deltas", format='parquet').to_table().sort_by('rowid')
+    old = np.round(pickle.load(open("model.pkl", "rb"))['model'].predict(X), 2)
+    new = np.round(lgb.Booster(model_file="candidate.txt").predict(X), 2)
+    assert deltas.column('rowid').to_numpy().tolist() == list(range(1, len(X) + 1))
+    np.testing.assert_allclose(deltas.column('delta').to_numpy(), new - old)
+    assert run['summary']['quotes'] == len(X)
+    assert run['summary']['new_premium_total'] == pytest.approx(new.sum())
+
+    # Resuming a finished run re-rates nothing
+    again = rerate_portfolio('LATEST', 'candidate.txt', db_path, dataset_dir="parquet", output_dir="out",
+                             chunk_rows=700, workers=1)
+    assert again['throughput']['quotes'] == 0 and again['summary'] == run['summary']
+
+def test_segments_use_cohort_bands():
+    age = np.array([AGE_BANDS[0], AGE_BANDS[1] - 1, AGE_BANDS[1], 99])
+    vehicle = np.array([VEHICLE_GROUP_BANDS[0], VEHICLE_GROUP_BANDS[1], 50, 50])
+    claims = np.array([0, 1, 2, 9])
+    n_vehicle, n_claims = len(VEHICLE_GROUP_BANDS), CLAIMS_MAX + 1
+    expected = [0, 1 * n_claims + 1, (1 * n_vehicle + n_vehicle - 1) * n_claims + 2,
+                ((len(AGE_BANDS) - 1) * n_vehicle + n_vehicle - 1) * n_claims + CLAIMS_MAX]
+    assert segment_ids(age, vehicle, claims).tolist() == expected
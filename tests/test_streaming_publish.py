@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from data_generation.generate_quotes import generate_quotes
+from pricing_model.predict import get_booster
+from pricing_model.registry import ModelRegistry
+from pricing_model.train_streaming import train_streaming, FEATURES
+from pricing_model.tree_engine import verify_parity
+from pricing_model.tree_shap import verify_against_shap
+
+@pytest.fixture(scope="module")
+def published(tmp_path_factory):
+    # train_streaming publishes into the working directory's pricing_model/
+    root = tmp_path_factory.mktemp("streaming")
+    db_path = str(root / "quotes.db")
+    generate_quotes(5000, db_path=db_path)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(root)
+        report = train_streaming(db_path, batch_size=1000, num_boost_round=20, cache_dir=str(root / "cache"))
+    return str(root / "pricing_model" / "versions"), report['version']
+
+@pytest.mark.parametrize("model_format", ["pickle", "arrays"])
+def test_streaming_publish_passes_parity_checks(published, model_format):
+    registry_dir, version = published
+    model_data = ModelRegistry(registry_dir, poll_interval=0, model_format=model_format).load_version(version)
+    booster = get_booster(model_data)
+
+    rng = np.random.default_rng(0)
+    X = np.column_stack([
+        rng.integers(18, 81, 500),
+        rng.uniform(0, 1, 500),
+        rng.integers(1, 51, 500),
+        rng.integers(0, 6, 500),
+        rng.integers(0, 11, 500)
+    ]).astype(np.float64)
+    assert model_data['features'] == FEATURES
+    assert verify_parity(booster, X) == 0
+    assert verify_against_shap(booster, X) < 1e-6
+
+def test_continued_training_appends_trees_fitted_to_residuals(tmp_path, monkeypatch):
+    import lightgbm as lgb
+    from data_generation.generate_quotes import iter_chunks, _chunk_rows
+    from database.store import get_store, INSERT_QUOTE, SELECT_QUOTES
+    from pricing_model.train_streaming import PARAMS, HOLDOUT_MODULUS
+
+    db_path = str(tmp_path / "quotes.db")
+    generate_quotes(3000, db_path=db_path)
+    monkeypatch.chdir(tmp_path)
+    first = train_streaming(db_path, batch_size=1000, num_boost_round=10, cache_dir=None)
+    store = get_store(db_path)
+    store.executemany(INSERT_QUOTE, list(_chunk_rows(next(iter_chunks(2000, seed=7)))))
+    second = train_streaming(db_path, batch_size=1000, num_boost_round=5, continue_training=True, cache_dir=None)
+    assert second['rowid_range'] == [3001, 5000]
+
+    versions = tmp_path / "pricing_model" / "versions"
+    base = lgb.Booster(model_file=str(versions / first['version'] / "model.txt"))
+    continued = lgb.Booster(model_file=str(versions / second['version'] / "model.txt"))
+    assert continued.num_trees() == 15
+
+    # Same as lgb.train(init_model=...) over the new training rows held in memory
+    rows = store.fetch_array(SELECT_QUOTES + f" WHERE rowid > 3000 AND rowid % {HOLDOUT_MODULUS} != 0")
+    reference = lgb.train(PARAMS, lgb.Dataset(rows[:, :-1], rows[:, -1], feature_name=FEATURES),
+                          num_boost_round=5, init_model=base)
+    X = store.fetch_array(SELECT_QUOTES)[:, :-1]
+    np.testing.assert_allclose(continued.predict(X), reference.predict(X), rtol=1e-9)
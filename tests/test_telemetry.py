@@ -0,0 +1,39 @@
+from database.store import get_store
+from observability.telemetry import TelemetrySink
+
+def make_sink(tmp_path, buffer_size: int) -> TelemetrySink:
+    # Flushed by hand only; no retention pass
+    return TelemetrySink(str(tmp_path / "quotes.db"), buffer_size=buffer_size, flush_interval=3600,
+                         retention_interval=0)
+
+def request_ids(db_path) -> list:
+    return [row[0] for row in get_store(db_path).fetch_all("SELECT request_id FROM telemetry ORDER BY id")]
+
+def test_full_buffer_overwrites_the_oldest_records(tmp_path):
+    sink = make_sink(tmp_path, buffer_size=4)
+    for i in range(10):
+        sink.record(f"req-{i}", "/quote", "ok", total_ms=1.0 + i)
+
+    assert sink.stats() == {"buffered": 4, "recorded": 10, "flushed": 0, "dropped": 6, "flush_errors": 0, "purged": 0}
+    assert sink.flush() == 4
+    assert request_ids(sink.db_path) == ["req-6", "req-7", "req-8", "req-9"]
+    # Every recorded request is either flushed or counted as dropped
+    stats = sink.stats()
+    assert stats["flushed"] + stats["dropped"] == stats["recorded"]
+
+    # Room again after the flush: nothing more is dropped
+    for i in range(10, 14):
+        sink.record(f"req-{i}", "/quote", "ok", total_ms=1.0)
+    sink.close()
+    assert sink.stats()["dropped"] == 6
+    assert request_ids(sink.db_path)[-4:] == ["req-10", "req-11", "req-12", "req-13"]
+
+def test_records_after_close_are_dropped(tmp_path):
+    sink = make_sink(tmp_path, buffer_size=4)
+    sink.record("req-0", "/quote", "ok", total_ms=1.0)
+    sink.close()
+    sink.record("req-1", "/quote", "ok", total_ms=1.0)
+
+    assert sink.stats()["flushed"] == 1
+    assert sink.stats()["dropped"] == 1
+    assert request_ids(sink.db_path) == ["req-0"]
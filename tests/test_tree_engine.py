@@ -0,0 +1,62 @@
+import lightgbm as lgb
+import numpy as np
+import pytest
+
+from pricing_model.tree_engine import TreeEnsemble, verify_parity
+
+FEATURES = ['age', 'postcode_risk', 'vehicle_group', 'claims_count', 'ncb_years']
+
+def profiles(n: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.integers(18, 81, n),
+        rng.uniform(0, 1, n),
+        rng.integers(1, 51, n),
+        rng.integers(0, 6, n),
+        rng.integers(0, 11, n)
+    ]).astype(np.float64)
+
+def premiums(X: np.ndarray) -> np.ndarray:
+    return 400 + 6 * np.abs(np.nan_to_num(X[:, 0], nan=40) - 45) + 250 * np.nan_to_num(X[:, 1]) + 90 * np.nan_to_num(X[:, 3])
+
+def train(X: np.ndarray, **params) -> lgb.Booster:
+    params = {'objective': 'regression', 'max_depth': 6, 'num_leaves': 31, 'verbose': -1, **params}
+    return lgb.train(params, lgb.Dataset(X, premiums(X), feature_name=FEATURES), num_boost_round=40)
+
+def probe_rows(booster: lgb.Booster, n: int = 2000) -> np.ndarray:
+    """Random profiles plus rows sitting exactly on split thresholds, at zero and NaN."""
+    X = profiles(n, seed=1)
+    engine = TreeEnsemble.from_booster(booster)
+    internal = np.flatnonzero(~engine.is_leaf)
+    on_threshold = X[:len(internal)].copy()
+    on_threshold[np.arange(len(internal)), engine.split_feature[internal]] = engine.threshold[internal]
+    special = X[:200].copy()
+    special[::2, 1] = np.nan
+    special[1::2, 3] = 0.0
+    return np.vstack([X, on_threshold, special])
+
+@pytest.mark.parametrize("missing", ["none", "nan", "zero"])
+def test_predictions_are_bit_identical(missing):
+    X = profiles(3000, seed=0)
+    params = {}
+    if missing == "nan":
+        X[::7, 1] = np.nan
+    elif missing == "zero":
+        params['zero_as_missing'] = True
+    booster = train(X, **params)
+    assert verify_parity(booster, probe_rows(booster)) == 0
+
+def test_saved_arrays_predict_the_same(tmp_path):
+    booster = train(profiles(3000, seed=0))
+    X = probe_rows(booster)
+    TreeEnsemble.from_booster(booster).save(str(tmp_path / "trees"))
+    loaded = TreeEnsemble.load(str(tmp_path / "trees"))
+    assert np.array_equal(loaded.predict(X), booster.predict(X))
+    with pytest.raises(ValueError):
+        loaded.predict(X[:, :4])
+
+def test_transformed_objectives_are_rejected():
+    X = profiles(500, seed=0)
+    booster = lgb.train({'objective': 'poisson', 'verbose': -1}, lgb.Dataset(X, premiums(X)), num_boost_round=5)
+    with pytest.raises(NotImplementedError):
+        TreeEnsemble.from_booster(booster)
@@ -0,0 +1,67 @@
+import numpy as np
+import lightgbm as lgb
+import pytest
+
+import pricing_model.tree_shap as tree_shap
+from pricing_model.predict import build_explainer
+from pricing_model.registry import BoosterModel, publish_model
+from pricing_model.tree_engine import TreeEnsemble
+from pricing_model.tree_shap import TreeShapExplainer, native_explainer_limit
+
+FEATURES = ['driver_age', 'credit_score', 'vehicle_age', 'previous_claims', 'years_no_claims']
+
+def random_profiles(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.integers(18, 81, n),
+        rng.uniform(0, 1, n),
+        rng.integers(1, 51, n),
+        rng.integers(0, 6, n),
+        rng.integers(0, 11, n)
+    ]).astype(np.float64)
+
+@pytest.fixture(scope="module")
+def booster():
+    X = random_profiles(2000)
+    y = 500 + 8 * np.abs(X[:, 0] - 45) - 300 * X[:, 1] + 120 * X[:, 3] - 15 * X[:, 4]
+    params = {'objective': 'regression', 'max_depth': 5, 'num_leaves': 31, 'verbose': -1}
+    return lgb.train(params, lgb.Dataset(X, y, feature_name=FEATURES), num_boost_round=30)
+
+def test_oversized_table_falls_back_to_shap(booster, monkeypatch, tmp_path, capsys):
+    ensemble = TreeEnsemble.from_booster(booster)
+    assert native_explainer_limit(ensemble) is None
+    monkeypatch.setattr(tree_shap, "MAX_TABLE_ENTRIES", 1000)
+    assert "contribution table" in native_explainer_limit(ensemble)
+    with pytest.raises(NotImplementedError):
+        TreeShapExplainer(ensemble)
+
+    model_data = {'model': BoosterModel(booster), 'features': FEATURES}
+    explainer = build_explainer(model_data, ensemble, "native")
+    assert not isinstance(explainer, TreeShapExplainer)
+    publish_model(model_data, registry_dir=str(tmp_path))
+    assert "will be explained by shap.TreeExplainer" in capsys.readouterr().out
+
+@pytest.mark.parametrize("max_depth, num_leaves", [(3, 7), (5, 31), (8, 63)])
+def test_matches_shap_tree_explainer(max_depth, num_leaves):
+    import shap
+    X = random_profiles(2000)
+    y = 500 + 8 * np.abs(X[:, 0] - 45) * (1 + X[:, 3]) - 300 * X[:, 1] * X[:, 4] + 5 * X[:, 2]
+    params = {'objective': 'regression', 'max_depth': max_depth, 'num_leaves': num_leaves, 'verbose': -1}
+    booster = lgb.train(params, lgb.Dataset(X, y, feature_name=FEATURES), num_boost_round=40)
+
+    rows = random_profiles(500, seed=1)
+    native = TreeShapExplainer.from_booster(booster, chunk_size=64)
+    reference = shap.TreeExplainer(booster)
+    np.testing.assert_allclose(native.shap_values(rows), reference.shap_values(rows), atol=1e-6)
+    assert native.expected_value == pytest.approx(float(reference.expected_value), abs=1e-6)
+    # Local accuracy: attributions sum to the prediction minus the base value
+    np.testing.assert_allclose(native.shap_values(rows).sum(axis=1) + native.expected_value,
+                               booster.predict(rows), atol=1e-6)
+
+def test_stump_only_ensemble_has_zero_attributions():
+    X = random_profiles(50)
+    booster = lgb.train({'objective': 'regression', 'min_data_in_leaf': 100, 'verbose': -1},
+                        lgb.Dataset(X, np.full(len(X), 300.0), feature_name=FEATURES), num_boost_round=3)
+    explainer = TreeShapExplainer.from_booster(booster)
+    assert np.array_equal(explainer.shap_values(X[:5]), np.zeros((5, len(FEATURES))))
+    assert explainer.expected_value == pytest.approx(booster.predict(X[:1])[0])
@@ -0,0 +1,28 @@
+import json
+
+from data_generation.generate_quotes import generate_quotes
+from pricing_model.tune_model import rank_trials, rung_folds, sample_trials, tune_model
+
+def trial(trial_id: int, cv_rmse: float, predict_us: float) -> dict:
+    return {'trial_id': trial_id, 'cv_rmse': cv_rmse, 'predict_us': predict_us}
+
+def test_rungs_and_trial_sampling():
+    assert rung_folds(5) == [1, 3, 5]
+    assert rung_folds(1) == [1]
+    trials = sample_trials(10)
+    assert len(trials) == 10 and all(t['num_leaves'] <= 2 ** t['max_depth'] for t in trials)
+
+def test_trials_within_budget_rank_first():
+    trials = [trial(0, 10.0, 500.0), trial(1, 11.0, 50.0), trial(2, 12.0, 400.0), trial(3, 13.0, 80.0)]
+    assert [t['trial_id'] for t in rank_trials(trials)] == [0, 1, 2, 3]
+    assert [t['trial_id'] for t in rank_trials(trials, latency_budget_us=100)] == [1, 3, 0, 2]
+
+def test_over_budget_refit_is_not_published(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "quotes.db")
+    generate_quotes(600, db_path=db_path)
+    monkeypatch.chdir(tmp_path)
+    report = tune_model(n_trials=2, n_folds=2, workers=1, latency_budget_us=1e-6, db_path=db_path)
+    assert not report['within_budget']
+    assert 'version' not in report
+    with open(next((tmp_path / "logs" / "tuning").iterdir())) as f:
+        assert json.load(f)['best_trial'] == report['best_trial']
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+
+from rag.vector_backend import NumpyBackend, write_index
+
+def make_corpus(n: int = 200, dim: int = 16, seed: int = 0) -> tuple:
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((n, dim)).astype(np.float32)
+    ids = [f"doc.txt_{i}" for i in range(n)]
+    documents = [f"chunk {i}" for i in range(n)]
+    metadatas = [{"source": "doc.txt", "chunk_index": i} for i in range(n)]
+    return ids, documents, metadatas, embeddings
+
+def test_search_is_exact_top_k_by_cosine(tmp_path):
+    ids, documents, metadatas, embeddings = make_corpus()
+    write_index(str(tmp_path / "index" / "test"), ids, documents, metadatas, embeddings)
+    backend = NumpyBackend("test", index_root=str(tmp_path / "index"))
+    queries = np.random.default_rng(1).standard_normal((3, embeddings.shape[1])).astype(np.float32)
+    result = backend.search(queries, 5)
+
+    unit = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    for q, query in enumerate(queries):
+        similarities = unit @ (query / np.linalg.norm(query))
+        expected = np.argsort(-similarities, kind='stable')[:5]
+        assert result["ids"][q] == [ids[i] for i in expected]
+        assert result["documents"][q] == [documents[i] for i in expected]
+        assert result["metadatas"][q] == [metadatas[i] for i in expected]
+        np.testing.assert_allclose(result["distances"][q], 2 - 2 * similarities[expected], atol=1e-5)
+
+def test_reexporting_the_same_version_leaves_open_mappings_intact(tmp_path):
+    ids, documents, metadatas, embeddings = make_corpus()
+    index_dir = str(tmp_path / "index" / "test")
+    manifest = write_index(index_dir, ids, documents, metadatas, embeddings)
+    backend = NumpyBackend("test", index_root=str(tmp_path / "index"))
+    before = backend.search(embeddings[:2], 3)
+    mapped, records, offsets = backend._state
+    snapshot = np.array(mapped)
+    path = os.path.join(index_dir, f"embeddings-{manifest['version']}.npy")
+    inode = os.stat(path).st_ino
+
+    # Same ids and texts (same version), different vectors, as after a --full rebuild
+    assert write_index(index_dir, ids, documents, metadatas, embeddings[::-1].copy())["version"] == manifest["version"]
+    assert os.stat(path).st_ino != inode
+    np.testing.assert_array_equal(mapped, snapshot)
+    assert records[offsets[0]:offsets[1]].tobytes().startswith(b'["doc.txt_0"')
+    assert NumpyBackend._search((mapped, records, offsets), embeddings[:2], 3) == before
+    assert sorted(f for f in os.listdir(index_dir) if ".tmp" in f) == []
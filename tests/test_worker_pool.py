@@ -0,0 +1,63 @@
+import asyncio
+import os
+import signal
+import time
+
+import lightgbm as lgb
+import numpy as np
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+
+from pricing_model.registry import BoosterModel, publish_model
+from pricing_model.tree_shap import TreeShapExplainer
+from pricing_model.worker_pool import PricingWorkerPool
+
+FEATURES = ['age', 'postcode_risk', 'vehicle_group', 'claims_count', 'ncb_years']
+
+def profiles(n: int) -> list:
+    rng = np.random.default_rng(0)
+    return [{'age': int(rng.integers(18, 81)), 'postcode_risk': float(rng.uniform(0, 1)),
+             'vehicle_group': int(rng.integers(1, 51)), 'claims_count': int(rng.integers(0, 6)),
+             'ncb_years': int(rng.integers(0, 11))} for _ in range(n)]
+
+@pytest.fixture(scope="module")
+def pool(tmp_path_factory):
+    # Workers resolve the registry relative to the working directory they start in
+    root = tmp_path_factory.mktemp("workers")
+    rng = np.random.default_rng(1)
+    X = np.column_stack([rng.integers(18, 81, 1000), rng.uniform(0, 1, 1000), rng.integers(1, 51, 1000),
+                         rng.integers(0, 6, 1000), rng.integers(0, 11, 1000)]).astype(np.float64)
+    booster = lgb.train({'objective': 'regression', 'max_depth': 4, 'verbose': -1},
+                        lgb.Dataset(X, 400 + 5 * X[:, 0] + 200 * X[:, 1], feature_name=FEATURES), num_boost_round=20)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(root)
+        mp.setenv("PRICING_GRID", "off")
+        version = publish_model({'model': BoosterModel(booster), 'features': FEATURES}, str(root / "pricing_model" / "versions"))
+        pool = PricingWorkerPool(workers=2, timeout=30)
+        pool.start()
+    yield pool, booster, version
+    pool.shutdown()
+
+def test_workers_price_like_the_model(pool):
+    pool, booster, version = pool
+    batch = profiles(50)
+    results = asyncio.run(pool.price(batch))
+    X = np.array([[p[f] for f in FEATURES] for p in batch], dtype=np.float64)
+    shap_values = TreeShapExplainer.from_booster(booster).shap_values(X)
+    assert [r['profile'] for r in results] == batch
+    assert [r['predicted_premium'] for r in results] == [round(float(v), 2) for v in booster.predict(X)]
+    np.testing.assert_allclose([[r['shap_values'][f] for f in FEATURES] for r in results], shap_values, atol=1e-9)
+    assert {r['model_version'] for r in results} == {version}
+    assert asyncio.run(pool.price_one(batch[0]))['predicted_premium'] == results[0]['predicted_premium']
+
+def test_dead_workers_are_replaced_on_the_next_request(pool):
+    pool, _, _ = pool
+    executor = pool._get_executor()
+    for pid in list(executor._processes):
+        os.kill(pid, signal.SIGKILL)
+    deadline = time.time() + 10
+    while not executor._broken and time.time() < deadline:
+        time.sleep(0.01)
+    with pytest.raises(BrokenProcessPool):
+        asyncio.run(pool.price(profiles(5)))
+    assert len(asyncio.run(pool.price(profiles(5)))) == 5